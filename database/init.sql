@@ -8,3 +8,49 @@ USE health_bite_db;
 
 -- Note: Django will create tables via migrations
 -- This file can be used for any initial data or custom SQL needed
+-- Columns the FastAPI service needs on Django-created tables (restaurants)
+-- are added by it on startup, see fastapi_ai/schema.py
+
+-- Nutrition Lookup Cache
+-- Owned by the FastAPI service (durable tier of NutritionCache)
+CREATE TABLE IF NOT EXISTS nutrition_cache (
+    cache_key VARCHAR(255) PRIMARY KEY,
+    food_name VARCHAR(255) NOT NULL,
+    data JSON NOT NULL,
+    cached_at DOUBLE NOT NULL,
+    INDEX idx_cached_at (cached_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Diet Plan Generation Jobs
+-- Owned by the FastAPI service (backend of DietJobQueue)
+CREATE TABLE IF NOT EXISTS diet_jobs (
+    id CHAR(32) PRIMARY KEY,
+    user_id BIGINT NULL,
+    profile JSON NOT NULL,
+    include_workout BOOLEAN NOT NULL DEFAULT TRUE,
+    dedupe_key CHAR(64) NOT NULL,
+    user_tier VARCHAR(32) NULL,
+    status VARCHAR(16) NOT NULL,
+    result JSON NULL,
+    error TEXT NULL,
+    diet_plan_id BIGINT NULL,
+    created_at DOUBLE NOT NULL,
+    updated_at DOUBLE NOT NULL,
+    INDEX idx_dedupe_status (dedupe_key, status),
+    INDEX idx_status_created (status, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- OpenAI Token Usage
+-- Owned by the FastAPI service (batched flushes from UsageTracker)
+CREATE TABLE IF NOT EXISTS openai_usage (
+    day DATE NOT NULL,
+    user_id BIGINT NOT NULL DEFAULT 0,
+    endpoint VARCHAR(32) NOT NULL,
+    model VARCHAR(64) NOT NULL,
+    calls INT NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DECIMAL(12, 6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id, endpoint, model),
+    INDEX idx_user_day (user_id, day)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
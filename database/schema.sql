@@ -63,11 +63,82 @@ CREATE TABLE IF NOT EXISTS workouts (
 
 -- Restaurants Table
 -- Created by Django migration: core_app_restaurant
+-- place_id through details_cached_at are written by the FastAPI restaurant
+-- tile cache (durable tier of RestaurantCache); they and the indexes below
+-- are added to the Django-created table by the FastAPI service on startup
+-- (fastapi_ai/schema.py)
 CREATE TABLE IF NOT EXISTS restaurants (
     id BIGINT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
     location JSON NULL,
     healthy_options JSON NULL,
     created_at DATETIME NOT NULL,
-    INDEX idx_name (name)
+    place_id VARCHAR(255) NULL,
+    geohash CHAR(9) NULL,
+    data JSON NULL,
+    fetched_at DOUBLE NULL,
+    details JSON NULL,
+    details_cached_at DOUBLE NULL,
+    lat DOUBLE GENERATED ALWAYS AS (JSON_EXTRACT(location, '$.latitude')) STORED,
+    lng DOUBLE GENERATED ALWAYS AS (JSON_EXTRACT(location, '$.longitude')) STORED,
+    -- SRID 4326 axis order is (latitude, longitude); SPATIAL indexes need NOT NULL
+    coords POINT GENERATED ALWAYS AS (
+        ST_SRID(POINT(COALESCE(lat, 0), COALESCE(lng, 0)), 4326)
+    ) STORED NOT NULL SRID 4326,
+    UNIQUE KEY uniq_place_id (place_id),
+    INDEX idx_name (name),
+    INDEX idx_geohash_fetched (geohash, fetched_at),
+    INDEX idx_fetched_id (fetched_at, id),
+    SPATIAL INDEX idx_coords (coords)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Radius queries use idx_coords through a bounding-box filter refined by
+-- exact distance, e.g. within 2km of (40.7128, -74.0060):
+--   WHERE MBRContains(ST_GeomFromText(
+--           'POLYGON((40.6948 -74.0297, 40.7308 -74.0297, 40.7308 -73.9823,
+--                     40.6948 -73.9823, 40.6948 -74.0297))', 4326), coords)
+--     AND ST_Distance_Sphere(coords, ST_SRID(POINT(40.7128, -74.0060), 4326)) <= 2000
+
+-- Nutrition Lookup Cache
+-- Created by database/init.sql (owned by the FastAPI service)
+CREATE TABLE IF NOT EXISTS nutrition_cache (
+    cache_key VARCHAR(255) PRIMARY KEY,
+    food_name VARCHAR(255) NOT NULL,
+    data JSON NOT NULL,
+    cached_at DOUBLE NOT NULL,
+    INDEX idx_cached_at (cached_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Diet Plan Generation Jobs
+-- Created by database/init.sql (owned by the FastAPI service)
+CREATE TABLE IF NOT EXISTS diet_jobs (
+    id CHAR(32) PRIMARY KEY,
+    user_id BIGINT NULL,
+    profile JSON NOT NULL,
+    include_workout BOOLEAN NOT NULL DEFAULT TRUE,
+    dedupe_key CHAR(64) NOT NULL,
+    user_tier VARCHAR(32) NULL,
+    status VARCHAR(16) NOT NULL,
+    result JSON NULL,
+    error TEXT NULL,
+    diet_plan_id BIGINT NULL,
+    created_at DOUBLE NOT NULL,
+    updated_at DOUBLE NOT NULL,
+    INDEX idx_dedupe_status (dedupe_key, status),
+    INDEX idx_status_created (status, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- OpenAI Token Usage
+-- Created by database/init.sql (owned by the FastAPI service)
+CREATE TABLE IF NOT EXISTS openai_usage (
+    day DATE NOT NULL,
+    user_id BIGINT NOT NULL DEFAULT 0,
+    endpoint VARCHAR(32) NOT NULL,
+    model VARCHAR(64) NOT NULL,
+    calls INT NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd DECIMAL(12, 6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id, endpoint, model),
+    INDEX idx_user_day (user_id, day)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -21,3 +21,132 @@ EDAMAM_APP_KEY = os.getenv('EDAMAM_APP_KEY', '')
 
 # Google Maps
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', '')
+
+# Outbound HTTP clients (one pooled client per upstream)
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'True') == 'True'
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3))
+NUTRITIONIX_TIMEOUT = float(os.getenv('NUTRITIONIX_TIMEOUT', 10))
+EDAMAM_TIMEOUT = float(os.getenv('EDAMAM_TIMEOUT', 10))
+GOOGLE_PLACES_TIMEOUT = float(os.getenv('GOOGLE_PLACES_TIMEOUT', 10))
+
+# Google Places details fan-out
+PLACES_DETAILS_CONCURRENCY = int(os.getenv('PLACES_DETAILS_CONCURRENCY', 8))
+PLACES_DETAILS_DEADLINE = float(os.getenv('PLACES_DETAILS_DEADLINE', 3))
+
+# Nutrition lookup cache
+NUTRITION_CACHE_MAX_ENTRIES = int(os.getenv('NUTRITION_CACHE_MAX_ENTRIES', 2000))
+NUTRITION_CACHE_TTL = float(os.getenv('NUTRITION_CACHE_TTL', 7 * 24 * 3600))
+# Upper bound on concurrent upstream nutrition lookups per request
+NUTRITION_MAX_CONCURRENCY = int(os.getenv('NUTRITION_MAX_CONCURRENCY', 8))
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+
+# Offline food-composition database (per-100g values)
+FOOD_DB_PATH = os.getenv(
+    'FOOD_DB_PATH', os.path.join(os.path.dirname(__file__), 'data', 'foods.csv')
+)
+# Minimum match score to answer from the local database ahead of the paid APIs
+FOOD_DB_MATCH_THRESHOLD = float(os.getenv('FOOD_DB_MATCH_THRESHOLD', 0.8))
+# Minimum match score to use a local food as the estimate when all APIs fail
+FOOD_DB_ESTIMATE_THRESHOLD = float(os.getenv('FOOD_DB_ESTIMATE_THRESHOLD', 0.35))
+
+# LLM response cache
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 5000))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 24 * 3600))
+# Semantic tier embeds each chatbot question (one extra embeddings call per miss)
+RESPONSE_CACHE_SEMANTIC = os.getenv('RESPONSE_CACHE_SEMANTIC', 'False') == 'True'
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('RESPONSE_CACHE_SIMILARITY_THRESHOLD', 0.92))
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+
+# Background diet plan jobs
+DIET_JOB_WORKERS = int(os.getenv('DIET_JOB_WORKERS', 2))
+# How long finished jobs can still be polled (in-memory backend)
+DIET_JOB_RETENTION = float(os.getenv('DIET_JOB_RETENTION', 24 * 3600))
+# Upper bound on ?wait= long-polling
+DIET_JOB_MAX_WAIT = float(os.getenv('DIET_JOB_MAX_WAIT', 60))
+# Running jobs refresh updated_at this often; jobs silent for DIET_JOB_STALE_AFTER
+# seconds lost their worker and are run again
+DIET_JOB_HEARTBEAT_INTERVAL = float(os.getenv('DIET_JOB_HEARTBEAT_INTERVAL', 15))
+DIET_JOB_STALE_AFTER = float(os.getenv('DIET_JOB_STALE_AFTER', 120))
+
+# Nearby restaurant tile cache
+MAPS_TILE_TTL = float(os.getenv('MAPS_TILE_TTL', 6 * 3600))
+MAPS_DETAILS_TTL = float(os.getenv('MAPS_DETAILS_TTL', 7 * 24 * 3600))
+MAPS_TILE_CACHE_MAX_ENTRIES = int(os.getenv('MAPS_TILE_CACHE_MAX_ENTRIES', 2000))
+MAPS_DETAILS_CACHE_MAX_ENTRIES = int(os.getenv('MAPS_DETAILS_CACHE_MAX_ENTRIES', 10000))
+# Upper bound on tiles (upstream searches on a cold cache) per request; a
+# circle needs at most 4 tiles once they are at least as wide as it
+MAPS_MAX_TILES_PER_SEARCH = int(os.getenv('MAPS_MAX_TILES_PER_SEARCH', 4))
+
+# In-process spatial index over stored restaurants
+RESTAURANT_INDEX_CELL_DEGREES = float(os.getenv('RESTAURANT_INDEX_CELL_DEGREES', 0.01))
+RESTAURANT_INDEX_REFRESH_INTERVAL = float(os.getenv('RESTAURANT_INDEX_REFRESH_INTERVAL', 300))
+# Fewer local results than this falls back to Google Places
+RESTAURANT_LOCAL_MIN_RESULTS = int(os.getenv('RESTAURANT_LOCAL_MIN_RESULTS', 5))
+
+# Restaurant health scoring
+HEALTH_LEXICON_PATH = os.getenv(
+    'HEALTH_LEXICON_PATH', os.path.join(os.path.dirname(__file__), 'data', 'healthy_lexicon.csv')
+)
+# Restaurants scoring below this are left out of nearby results
+HEALTH_SCORE_MIN = float(os.getenv('HEALTH_SCORE_MIN', 0))
+
+# Upstream resilience (per upstream: Nutritionix, Edamam, Google Places, OpenAI)
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RECOVERY_TIMEOUT = float(os.getenv('BREAKER_RECOVERY_TIMEOUT', 30))
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', 2))
+RETRY_BACKOFF_BASE = float(os.getenv('RETRY_BACKOFF_BASE', 0.1))
+RETRY_BACKOFF_MAX = float(os.getenv('RETRY_BACKOFF_MAX', 2))
+# Retries allowed per 10s window: this fraction of requests, plus a floor
+RETRY_BUDGET_RATIO = float(os.getenv('RETRY_BUDGET_RATIO', 0.2))
+RETRY_BUDGET_MIN_RETRIES = int(os.getenv('RETRY_BUDGET_MIN_RETRIES', 3))
+# Fire Edamam when Nutritionix hasn't answered by its p95 latency
+HEDGE_NUTRITION = os.getenv('HEDGE_NUTRITION', 'True') == 'True'
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', 1.0))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 0.2))
+
+# Async MySQL connection pool
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+# Connections older than this (seconds) are replaced; keep below MySQL's wait_timeout
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 5))
+# Connections idle longer than this are pinged before use
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+DB_CONNECT_TIMEOUT = float(os.getenv('DB_CONNECT_TIMEOUT', 5))
+# Add the columns and indexes FastAPI needs (fastapi_ai/schema.py) on startup
+DB_ENSURE_SCHEMA = os.getenv('DB_ENSURE_SCHEMA', 'True') == 'True'
+
+# Prometheus metrics on /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+
+# OpenAI models and spend budgets (USD per UTC day; 0 disables a budget)
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo-preview')
+# Cheaper model used instead of rejecting requests once a budget is spent
+OPENAI_BUDGET_MODEL = os.getenv('OPENAI_BUDGET_MODEL', 'gpt-3.5-turbo')
+OPENAI_USER_DAILY_BUDGET_USD = float(os.getenv('OPENAI_USER_DAILY_BUDGET_USD', 0.5))
+OPENAI_GLOBAL_DAILY_BUDGET_USD = float(os.getenv('OPENAI_GLOBAL_DAILY_BUDGET_USD', 50))
+# Seconds between batched writes of token usage to MySQL
+USAGE_FLUSH_INTERVAL = float(os.getenv('USAGE_FLUSH_INTERVAL', 10))
+
+# Per-request model routing (rules and A/B experiments in JSON)
+OPENAI_FAST_MODEL = os.getenv('OPENAI_FAST_MODEL', 'gpt-3.5-turbo')
+MODEL_ROUTING_PATH = os.getenv(
+    'MODEL_ROUTING_PATH', os.path.join(os.path.dirname(__file__), 'data', 'model_routing.json')
+)
+
+# Local diet planner (/diet/generate?mode=fast|hybrid): accepted daily calorie deviation
+DIET_PLANNER_TOLERANCE = float(os.getenv('DIET_PLANNER_TOLERANCE', 0.1))
+# Foods per category the planner combines (most nutrient-dense first), and the
+# most combinations it enumerates per meal slot; keeps large food databases
+# from exhausting memory at startup
+DIET_PLANNER_POOL_SIZE = int(os.getenv('DIET_PLANNER_POOL_SIZE', 24))
+DIET_PLANNER_MAX_COMBOS = int(os.getenv('DIET_PLANNER_MAX_COMBOS', 50000))
+
+# Ask the model once more for days missing or invalid in a generated diet plan
+PLAN_SECOND_CHANCE = os.getenv('PLAN_SECOND_CHANCE', 'True') == 'True'
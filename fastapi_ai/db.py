@@ -0,0 +1,174 @@
+"""
+MySQL access for the FastAPI service.
+
+Wraps an ``aiomysql`` connection pool so queries never block the event
+loop. Connections idle longer than ``DB_POOL_HEALTH_CHECK_INTERVAL`` are
+pinged (and reconnected) before use, connections older than
+``DB_POOL_RECYCLE`` are replaced, and waiting for a free connection is
+bounded by ``DB_POOL_ACQUIRE_TIMEOUT``.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import aiomysql
+
+from . import config
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within the acquire timeout."""
+
+
+class Database:
+    """Async facade over a pooled MySQL connection."""
+
+    def __init__(
+        self,
+        pool,
+        acquire_timeout: float = config.DB_POOL_ACQUIRE_TIMEOUT,
+        health_check_interval: float = config.DB_POOL_HEALTH_CHECK_INTERVAL,
+    ):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.waiting = 0
+        self.counters = {
+            "acquired": 0,
+            "acquire_timeouts": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+        }
+        self._acquire_wait_total = 0.0
+        self._acquire_wait_max = 0.0
+
+    @classmethod
+    async def connect(cls) -> Optional["Database"]:
+        """Create the connection pool, or return None if MySQL is unreachable."""
+        try:
+            pool = await aiomysql.create_pool(
+                minsize=config.DB_POOL_MIN_SIZE,
+                maxsize=config.DB_POOL_MAX_SIZE,
+                pool_recycle=config.DB_POOL_RECYCLE,
+                connect_timeout=config.DB_CONNECT_TIMEOUT,
+                host=config.MYSQL_HOST,
+                db=config.MYSQL_DATABASE,
+                user=config.MYSQL_USER,
+                password=config.MYSQL_PASSWORD,
+                port=config.MYSQL_PORT,
+                charset="utf8mb4",
+                autocommit=True,
+                cursorclass=aiomysql.DictCursor,
+            )
+        except (aiomysql.Error, OSError) as e:
+            print(f"Error creating database pool: {e}")
+            return None
+        print("Database connection pool created successfully")
+        return cls(pool)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Any]:
+        """
+        Borrow a healthy connection for the duration of the block.
+
+        Raises ``PoolTimeout`` when none is free within ``acquire_timeout``.
+        """
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            conn = await asyncio.wait_for(self._acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.counters["acquire_timeouts"] += 1
+            raise PoolTimeout(
+                f"No database connection available within {self.acquire_timeout}s"
+            ) from None
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.counters["acquired"] += 1
+        self._acquire_wait_total += waited
+        self._acquire_wait_max = max(self._acquire_wait_max, waited)
+
+        try:
+            await self._check(conn)
+            yield conn
+        except (aiomysql.OperationalError, aiomysql.InterfaceError):
+            # Lost or unusable connection: close it so the pool replaces it
+            conn.close()
+            raise
+        finally:
+            self.pool.release(conn)
+
+    async def _acquire(self):
+        return await self.pool.acquire()
+
+    async def _check(self, conn) -> None:
+        """Ping connections that sat idle long enough to have been dropped."""
+        idle = asyncio.get_running_loop().time() - conn.last_usage
+        if idle < self.health_check_interval:
+            return
+        self.counters["health_checks"] += 1
+        try:
+            await conn.ping(reconnect=True)
+        except Exception:
+            self.counters["health_check_failures"] += 1
+            raise
+
+    async def _run(self, query: str, params: Sequence[Any], fetch: Optional[str]):
+        async with self.acquire() as conn:
+            async with conn.cursor() as cursor:
+                if fetch == "many":
+                    await conn.begin()
+                    try:
+                        await cursor.executemany(query, params)
+                        await conn.commit()
+                    except BaseException:
+                        await conn.rollback()
+                        raise
+                    return cursor.rowcount
+                await cursor.execute(query, params)
+                if fetch == "one":
+                    return await cursor.fetchone()
+                if fetch == "all":
+                    return await cursor.fetchall()
+                return cursor.lastrowid if fetch == "lastrowid" else cursor.rowcount
+
+    async def fetchone(self, query: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        return await self._run(query, params, "one")
+
+    async def fetchall(self, query: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        return list(await self._run(query, params, "all"))
+
+    async def execute(self, query: str, params: Sequence[Any] = ()) -> int:
+        """Run a write statement (autocommitted); returns the affected row count."""
+        return await self._run(query, params, None)
+
+    async def executemany(self, query: str, rows: Sequence[Sequence[Any]]) -> int:
+        """Run a write statement once per row in a single transaction."""
+        return await self._run(query, rows, "many")
+
+    async def insert(self, query: str, params: Sequence[Any] = ()) -> int:
+        """Run an INSERT (autocommitted); returns the new row's auto-increment id."""
+        return await self._run(query, params, "lastrowid")
+
+    def stats(self) -> Dict[str, Any]:
+        size = self.pool.size
+        free = self.pool.freesize
+        acquired = self.counters["acquired"]
+        return dict(
+            self.counters,
+            min_size=self.pool.minsize,
+            max_size=self.pool.maxsize,
+            size=size,
+            free=free,
+            in_use=size - free,
+            waiting=self.waiting,
+            acquire_wait_avg_ms=round(self._acquire_wait_total / acquired * 1000, 2) if acquired else 0.0,
+            acquire_wait_max_ms=round(self._acquire_wait_max * 1000, 2),
+        )
+
+    async def close(self) -> None:
+        self.pool.close()
+        await self.pool.wait_closed()
+        print("Database connection pool closed")
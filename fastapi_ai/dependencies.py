@@ -0,0 +1,193 @@
+"""
+FastAPI dependencies exposing application-scoped resources to routes.
+
+Resources are created in the application ``lifespan`` and stored on
+``app.state``; when the lifespan has not run (e.g. a bare ``TestClient``)
+they are created lazily on first use.
+"""
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException, Request
+from fastapi.requests import HTTPConnection
+
+from . import config
+from .db import Database
+from .http_clients import HTTPClients
+from .repositories import DietPlanRepository, ProfileRepository
+from .resilience import Resilience
+from .services.diet_jobs import DietJobQueue, InMemoryJobBackend, MySQLJobBackend
+from .services.food_db import FoodCompositionDB, load_default as load_food_db
+from .services.meal_planner import MealPlanner
+from .services.model_router import ModelRouter, load_default as load_model_router
+from .services.nutrition_cache import NutritionCache
+from .services.openai_service import OpenAIService
+from .services.response_cache import ResponseCache
+from .services.restaurant_cache import RestaurantCache
+from .services.spatial_index import SpatialIndex
+from .services.usage import UsageTracker
+
+
+def get_db(request: Request) -> Optional[Database]:
+    """MySQL access, or None when the database is unavailable."""
+    return getattr(request.app.state, "db", None)
+
+
+def get_profile_repository(request: Request) -> ProfileRepository:
+    """Stored user profiles."""
+    return ProfileRepository(get_db(request))
+
+
+def get_diet_plan_repository(request: Request) -> DietPlanRepository:
+    """Saved diet plans."""
+    return DietPlanRepository(get_db(request))
+
+
+def get_http_clients(request: Request) -> HTTPClients:
+    """Shared pooled HTTP clients for outbound API calls."""
+    state = request.app.state
+    if getattr(state, "http_clients", None) is None:
+        state.http_clients = HTTPClients()
+    return state.http_clients
+
+
+def get_resilience(connection: HTTPConnection) -> Resilience:
+    """Shared circuit breakers and retry budgets for upstream APIs."""
+    state = connection.app.state
+    if getattr(state, "resilience", None) is None:
+        state.resilience = Resilience()
+    return state.resilience
+
+
+def get_usage_tracker(connection: HTTPConnection) -> UsageTracker:
+    """OpenAI token accounting and spend budgets."""
+    state = connection.app.state
+    if getattr(state, "usage", None) is None:
+        state.usage = UsageTracker(db=getattr(state, "db", None))
+    return state.usage
+
+
+def get_model_router(connection: HTTPConnection) -> ModelRouter:
+    """Per-request OpenAI model routing rules and A/B experiments."""
+    state = connection.app.state
+    if getattr(state, "model_router", None) is None:
+        state.model_router = load_model_router()
+    return state.model_router
+
+
+def get_user_id(x_user_id: Optional[int] = Header(None)) -> Optional[int]:
+    """Calling user (``X-User-Id``, set by the Django proxy), for usage accounting."""
+    return x_user_id
+
+
+def require_user_id(x_user_id: Optional[int] = Header(None)) -> int:
+    """Calling user (``X-User-Id``) for endpoints that change a user's data."""
+    if x_user_id is None:
+        raise HTTPException(status_code=401, detail="X-User-Id header is required")
+    return x_user_id
+
+
+def get_user_tier(x_user_tier: Optional[str] = Header(None)) -> Optional[str]:
+    """Calling user's subscription tier (``X-User-Tier``), for model routing."""
+    return x_user_tier
+
+
+def get_nutrition_cache(request: Request) -> NutritionCache:
+    """Application-wide nutrition lookup cache."""
+    state = request.app.state
+    if getattr(state, "nutrition_cache", None) is None:
+        state.nutrition_cache = NutritionCache(db=get_db(request))
+    return state.nutrition_cache
+
+
+def get_food_db(request: Request) -> FoodCompositionDB:
+    """Indexed offline food-composition database."""
+    state = request.app.state
+    if getattr(state, "food_db", None) is None:
+        state.food_db = load_food_db()
+    return state.food_db
+
+
+def get_meal_planner(request: Request) -> MealPlanner:
+    """Local diet planner over the food-composition database."""
+    state = request.app.state
+    if getattr(state, "meal_planner", None) is None:
+        state.meal_planner = MealPlanner(get_food_db(request))
+    return state.meal_planner
+
+
+def get_restaurant_cache(request: Request) -> RestaurantCache:
+    """Application-wide restaurant tile and place-details cache."""
+    state = request.app.state
+    if getattr(state, "restaurant_cache", None) is None:
+        state.restaurant_cache = RestaurantCache(db=get_db(request))
+    return state.restaurant_cache
+
+
+def get_spatial_index(request: Request) -> SpatialIndex:
+    """In-process spatial index over stored restaurants."""
+    state = request.app.state
+    if getattr(state, "spatial_index", None) is None:
+        state.spatial_index = SpatialIndex()
+    return state.spatial_index
+
+
+def create_response_cache(
+    resilience: Optional[Resilience] = None,
+    usage: Optional[UsageTracker] = None
+) -> Optional[ResponseCache]:
+    """Response cache per the ``RESPONSE_CACHE_*`` settings, or None when disabled."""
+    if not config.RESPONSE_CACHE_ENABLED:
+        return None
+    embedder = None
+    if config.RESPONSE_CACHE_SEMANTIC:
+        embedder = OpenAIService(resilience=resilience, usage=usage).embed
+    return ResponseCache(embedder=embedder)
+
+
+def get_response_cache(connection: HTTPConnection) -> Optional[ResponseCache]:
+    """Application-wide OpenAI response cache (HTTP and WebSocket routes)."""
+    state = connection.app.state
+    if not hasattr(state, "response_cache"):
+        state.response_cache = create_response_cache(
+            get_resilience(connection), get_usage_tracker(connection)
+        )
+    return state.response_cache
+
+
+def create_diet_job_queue(
+    db: Optional[Database],
+    response_cache: Optional[ResponseCache],
+    resilience: Optional[Resilience] = None,
+    usage: Optional[UsageTracker] = None,
+    router: Optional[ModelRouter] = None
+) -> DietJobQueue:
+    """Diet job queue backed by MySQL when available, otherwise in memory."""
+    backend = MySQLJobBackend(db) if db is not None else InMemoryJobBackend()
+    generate = OpenAIService(
+        response_cache=response_cache, resilience=resilience, usage=usage, router=router
+    ).generate_diet_plan
+    return DietJobQueue(generate, backend=backend, db=db)
+
+
+async def get_diet_jobs(request: Request) -> DietJobQueue:
+    """Background diet plan job queue (workers are started on first use)."""
+    state = request.app.state
+    if getattr(state, "diet_jobs", None) is None:
+        state.diet_jobs = create_diet_job_queue(
+            get_db(request),
+            get_response_cache(request),
+            get_resilience(request),
+            get_usage_tracker(request),
+            get_model_router(request),
+        )
+        await state.diet_jobs.start()
+    return state.diet_jobs
+
+
+def require_admin(x_admin_token: str = Header(None)) -> None:
+    """Guard admin endpoints with the ``X-Admin-Token`` header."""
+    if not config.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, config.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -0,0 +1,70 @@
+"""
+Shared, pooled HTTP clients for outbound calls to third-party APIs.
+
+One ``httpx.AsyncClient`` is kept per upstream for the lifetime of the
+application so that TCP/TLS connections are reused across requests instead
+of being re-established for every call.
+"""
+import logging
+from typing import Dict
+
+import httpx
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+NUTRITIONIX = "nutritionix"
+EDAMAM = "edamam"
+GOOGLE_PLACES = "google_places"
+
+# Per-upstream read/write/pool timeout in seconds
+UPSTREAM_TIMEOUTS = {
+    NUTRITIONIX: config.NUTRITIONIX_TIMEOUT,
+    EDAMAM: config.EDAMAM_TIMEOUT,
+    GOOGLE_PLACES: config.GOOGLE_PLACES_TIMEOUT,
+}
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional ``h2`` package (``httpx[http2]``)."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HTTPClients:
+    """Registry of application-scoped HTTP clients, one per upstream."""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._http2 = config.HTTP2_ENABLED and _http2_available()
+        self._limits = httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    def get(self, upstream: str) -> httpx.AsyncClient:
+        """Return the pooled client for an upstream, creating it on first use."""
+        client = self._clients.get(upstream)
+        if client is None or client.is_closed:
+            timeout = UPSTREAM_TIMEOUTS.get(upstream, 10)
+            client = httpx.AsyncClient(
+                http2=self._http2,
+                limits=self._limits,
+                timeout=httpx.Timeout(timeout, connect=config.HTTP_CONNECT_TIMEOUT),
+            )
+            self._clients[upstream] = client
+        return client
+
+    async def aclose(self) -> None:
+        """Close every client and release pooled connections."""
+        for upstream, client in self._clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning("Error closing %s HTTP client: %s", upstream, e)
+        self._clients.clear()
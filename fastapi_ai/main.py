@@ -1,45 +1,77 @@
 """
 FastAPI main application for Health-Bite AI microservices.
 """
-from fastapi import FastAPI, HTTPException
+import asyncio
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-import os
-import mysql.connector
-from mysql.connector import Error
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
+from . import config, metrics
+from .db import Database
+from .dependencies import create_diet_job_queue, create_response_cache
+from .http_clients import HTTPClients
+from .resilience import OPEN, Resilience
 from .routes import chatbot, diet, food, restaurant
-
-# Database connection pool
-db_pool = None
+from .schema import ensure_schema
+from .services.food_db import load_default as load_food_db
+from .services.health_scoring import load_default as load_health_scorer
+from .services.meal_planner import MealPlanner
+from .services.nutrition_cache import NutritionCache
+from .services.restaurant_cache import RestaurantCache
+from .services.spatial_index import SpatialIndex
+from .services.model_router import load_default as load_model_router
+from .services.usage import UsageTracker
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan events."""
     # Startup
-    global db_pool
-    try:
-        db_pool = mysql.connector.pooling.MySQLConnectionPool(
-            pool_name="health_bite_pool",
-            pool_size=5,
-            pool_reset_session=True,
-            host=os.getenv('MYSQL_HOST', 'mysql'),
-            database=os.getenv('MYSQL_DATABASE', 'health_bite_db'),
-            user=os.getenv('MYSQL_USER', 'root'),
-            password=os.getenv('MYSQL_PASSWORD', 'rootpassword'),
-            port=int(os.getenv('MYSQL_PORT', 3306)),
-        )
-        print("Database connection pool created successfully")
-    except Error as e:
-        print(f"Error creating database pool: {e}")
+    app.state.db = await Database.connect()
+    if app.state.db and config.DB_ENSURE_SCHEMA:
+        await ensure_schema(app.state.db)
+    app.state.http_clients = HTTPClients()
+    app.state.resilience = Resilience()
+    app.state.nutrition_cache = NutritionCache(db=app.state.db)
+    app.state.food_db = load_food_db()
+    app.state.meal_planner = MealPlanner(app.state.food_db)
+    # Compile the health-scoring lexicon before the first request
+    load_health_scorer()
+    app.state.restaurant_cache = RestaurantCache(db=app.state.db)
+    app.state.spatial_index = SpatialIndex()
+    index_refresh = None
+    if app.state.db:
+        index_refresh = asyncio.create_task(app.state.spatial_index.refresh_periodically(
+            app.state.db, config.RESTAURANT_INDEX_REFRESH_INTERVAL
+        ))
+    app.state.usage = UsageTracker(db=app.state.db)
+    await app.state.usage.load_today()
+    usage_flush = asyncio.create_task(
+        app.state.usage.flush_periodically(config.USAGE_FLUSH_INTERVAL)
+    )
+    app.state.model_router = load_model_router()
+    app.state.response_cache = create_response_cache(app.state.resilience, app.state.usage)
+    app.state.diet_jobs = create_diet_job_queue(
+        app.state.db,
+        app.state.response_cache,
+        app.state.resilience,
+        app.state.usage,
+        app.state.model_router,
+    )
+    await app.state.diet_jobs.start()
     
     yield
     
     # Shutdown
-    if db_pool:
-        db_pool._remove_connections()
-        print("Database connection pool closed")
+    if index_refresh is not None:
+        index_refresh.cancel()
+    await app.state.diet_jobs.stop()
+    usage_flush.cancel()
+    await app.state.usage.flush()
+    await app.state.http_clients.aclose()
+    if app.state.db:
+        await app.state.db.close()
 
 
 app = FastAPI(
@@ -58,6 +90,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if config.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.registry.register(metrics.AppStateCollector(app.state))
+
 # Include routers
 app.include_router(chatbot.router, prefix="/chatbot", tags=["Chatbot"])
 app.include_router(diet.router, prefix="/diet", tags=["Diet"])
@@ -73,8 +109,38 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
+    """Health check endpoint; ``degraded`` while any upstream circuit is open."""
+    db = getattr(app.state, "db", None)
+    resilience = getattr(app.state, "resilience", None)
+    upstreams = resilience.stats() if resilience else None
+    degraded = upstreams and any(
+        upstream["circuit"]["state"] == OPEN for upstream in upstreams.values()
+    )
+    response_cache = getattr(app.state, "response_cache", None)
+    restaurant_cache = getattr(app.state, "restaurant_cache", None)
+    spatial_index = getattr(app.state, "spatial_index", None)
+    diet_jobs = getattr(app.state, "diet_jobs", None)
+    usage = getattr(app.state, "usage", None)
+    model_router = getattr(app.state, "model_router", None)
+    return {
+        "status": "degraded" if degraded else "healthy",
+        "upstreams": upstreams,
+        "db_pool": db.stats() if db else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+        "restaurant_cache": restaurant_cache.stats() if restaurant_cache else None,
+        "restaurant_index": spatial_index.stats() if spatial_index else None,
+        "diet_jobs": diet_jobs.stats() if diet_jobs else None,
+        "openai_usage": usage.stats() if usage else None,
+        "model_routing": model_router.stats() if model_router else None,
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus metrics in text exposition format."""
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(generate_latest(metrics.registry), media_type=CONTENT_TYPE_LATEST)
 
 
 # Export app for uvicorn
@@ -0,0 +1,215 @@
+"""
+Prometheus metrics for the FastAPI service, exposed on ``/metrics``.
+
+Request and upstream metrics are recorded as they happen; cache hit
+ratios, DB pool utilization and circuit breaker state are read from the
+application-scoped resources on ``app.state`` only when scraped, so they
+add nothing to the request path.
+"""
+import time
+from typing import Any, Dict, Iterator, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+registry = CollectorRegistry()
+
+# Buckets spanning local cache hits (ms) to long LLM generations (tens of s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status.",
+    ["method", "route", "status"], registry=registry,
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route (until the body is sent).",
+    ["method", "route"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", registry=registry,
+)
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Third-party API call latency per attempt.",
+    ["provider", "outcome"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total", "OpenAI tokens used, by model and kind (prompt/completion).",
+    ["model", "kind"], registry=registry,
+)
+PLAN_PARSE = Counter(
+    "plan_parse_total",
+    "Generated plan sections parsed, by kind and outcome (ok, repaired, second_chance, failed).",
+    ["kind", "outcome"], registry=registry,
+)
+PLAN_RETRY_TOKENS = Counter(
+    "plan_retry_tokens_total", "Tokens spent on second-chance calls for missing plan sections.",
+    ["kind"], registry=registry,
+)
+PLAN_RETRY_COST = Counter(
+    "plan_retry_cost_usd_total", "USD spent on second-chance calls for missing plan sections.",
+    ["kind"], registry=registry,
+)
+OPENAI_ROUTE_DURATION = Histogram(
+    "openai_route_duration_seconds", "OpenAI call latency by routing rule and A/B variant.",
+    ["route", "variant", "model"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+OPENAI_ROUTE_TOKENS = Counter(
+    "openai_route_tokens_total", "OpenAI tokens by routing rule, A/B variant and kind.",
+    ["route", "variant", "kind"], registry=registry,
+)
+
+
+def observe_upstream(provider: str, outcome: str, seconds: float) -> None:
+    UPSTREAM_DURATION.labels(provider, outcome).observe(seconds)
+
+
+def record_openai_usage(model: str, usage: Any) -> None:
+    """Count the ``usage`` block of an OpenAI response (ignored when absent)."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None)
+    completion = getattr(usage, "completion_tokens", None)
+    if isinstance(prompt, int) and prompt > 0:
+        OPENAI_TOKENS.labels(model, "prompt").inc(prompt)
+    if isinstance(completion, int) and completion > 0:
+        OPENAI_TOKENS.labels(model, "completion").inc(completion)
+
+
+def observe_openai_route(
+    route: str, variant: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int
+) -> None:
+    OPENAI_ROUTE_DURATION.labels(route, variant, model).observe(seconds)
+    OPENAI_ROUTE_TOKENS.labels(route, variant, "prompt").inc(prompt_tokens)
+    OPENAI_ROUTE_TOKENS.labels(route, variant, "completion").inc(completion_tokens)
+
+
+def record_plan_parse(kind: str, outcome: str) -> None:
+    PLAN_PARSE.labels(kind, outcome).inc()
+
+
+def record_plan_retry(kind: str, tokens: int, cost_usd: float) -> None:
+    PLAN_RETRY_TOKENS.labels(kind).inc(tokens)
+    PLAN_RETRY_COST.labels(kind).inc(cost_usd)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency, status counts and
+    requests in flight.
+
+    Routes are labeled by their path template (``/diet/jobs/{job_id}``),
+    not the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # (method, route, status) -> counter child, skipping labels() on repeat requests
+        self._counters: Dict[Tuple[str, str, str], Any] = {}
+        self._histograms: Dict[Tuple[str, str], Any] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self._observe(scope["method"], route, status, time.perf_counter() - started)
+
+    def _observe(self, method: str, route: str, status: str, seconds: float) -> None:
+        counter = self._counters.get((method, route, status))
+        if counter is None:
+            counter = self._counters[(method, route, status)] = HTTP_REQUESTS.labels(
+                method, route, status
+            )
+        counter.inc()
+        histogram = self._histograms.get((method, route))
+        if histogram is None:
+            histogram = self._histograms[(method, route)] = HTTP_REQUEST_DURATION.labels(
+                method, route
+            )
+        histogram.observe(seconds)
+
+
+class AppStateCollector:
+    """Scrape-time metrics from caches, the DB pool and circuit breakers."""
+
+    def __init__(self, state):
+        self.state = state
+
+    def collect(self) -> Iterator[Any]:
+        lookups = CounterMetricFamily(
+            "cache_lookups", "Cache lookups by cache and result.", labels=["cache", "result"]
+        )
+        ratio = GaugeMetricFamily(
+            "cache_hit_ratio", "Cache hits over lookups since start.", labels=["cache"]
+        )
+        for cache, hits, misses in self._cache_counts():
+            lookups.add_metric([cache, "hit"], hits)
+            lookups.add_metric([cache, "miss"], misses)
+            ratio.add_metric([cache], hits / (hits + misses) if hits + misses else 0.0)
+        yield lookups
+        yield ratio
+
+        db = getattr(self.state, "db", None)
+        if db is not None:
+            stats = db.stats()
+            connections = GaugeMetricFamily(
+                "db_pool_connections", "Pooled MySQL connections by state.", labels=["state"]
+            )
+            connections.add_metric(["in_use"], stats["in_use"])
+            connections.add_metric(["free"], stats["free"])
+            yield connections
+            yield GaugeMetricFamily(
+                "db_pool_max_size", "Maximum pooled MySQL connections.", value=stats["max_size"]
+            )
+            yield GaugeMetricFamily(
+                "db_pool_utilization", "Connections in use over the pool's maximum size.",
+                value=stats["in_use"] / stats["max_size"] if stats["max_size"] else 0.0,
+            )
+            yield GaugeMetricFamily(
+                "db_pool_waiting", "Requests waiting for a pooled connection.",
+                value=stats["waiting"],
+            )
+            yield CounterMetricFamily(
+                "db_pool_acquire_timeouts", "Acquire attempts that timed out.",
+                value=stats["acquire_timeouts"],
+            )
+
+        resilience = getattr(self.state, "resilience", None)
+        if resilience is not None:
+            circuit = GaugeMetricFamily(
+                "upstream_circuit_open", "1 while the upstream's circuit breaker is open.",
+                labels=["provider"],
+            )
+            for provider, stats in resilience.stats().items():
+                circuit.add_metric([provider], 1.0 if stats["circuit"]["state"] == "open" else 0.0)
+            yield circuit
+
+    def _cache_counts(self) -> Iterator[Tuple[str, int, int]]:
+        response_cache = getattr(self.state, "response_cache", None)
+        if response_cache is not None:
+            for namespace, counts in response_cache.counters.items():
+                hits = counts.get("exact_hits", 0) + counts.get("semantic_hits", 0)
+                yield f"response_{namespace}", hits, counts.get("misses", 0)
+        nutrition_cache = getattr(self.state, "nutrition_cache", None)
+        if nutrition_cache is not None:
+            yield "nutrition", nutrition_cache.hits, nutrition_cache.misses
+        restaurant_cache = getattr(self.state, "restaurant_cache", None)
+        if restaurant_cache is not None:
+            counters = restaurant_cache.counters
+            yield "restaurant_tiles", counters["tile_hits"], counters["tile_misses"]
+            yield "restaurant_details", counters["details_hits"], counters["details_misses"]
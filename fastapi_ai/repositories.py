@@ -0,0 +1,82 @@
+"""
+Access to Django-owned tables for FastAPI routes.
+
+Each repository wraps the shared async ``Database`` pool and returns plain
+dicts with JSON columns decoded. Without a database (``db`` is None) reads
+return nothing, so routes can treat stored data as optional.
+"""
+import json
+from typing import Any, Dict, Optional
+
+from .db import Database
+
+# Profile fields used to personalize prompts and plans
+PROFILE_FIELDS = ("age", "gender", "height", "weight", "goals")
+
+
+def _load_json(value: Any) -> Any:
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+class ProfileRepository:
+    """User profiles (``users`` table)."""
+
+    def __init__(self, db: Optional[Database]):
+        self.db = db
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Age, gender, height, weight and goals of an active user."""
+        if self.db is None:
+            return None
+        row = await self.db.fetchone(
+            f"SELECT {', '.join(PROFILE_FIELDS)} FROM users WHERE id = %s AND is_active",
+            (user_id,),
+        )
+        if row is None:
+            return None
+        return dict(row, goals=_load_json(row["goals"]))
+
+
+class DietPlanRepository:
+    """Saved diet plans (``diet_plans`` table)."""
+
+    def __init__(self, db: Optional[Database]):
+        self.db = db
+
+    async def get(self, plan_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """A plan by id, optionally only if it belongs to ``user_id``."""
+        if self.db is None:
+            return None
+        query = "SELECT id, user_id, plan, created_at, updated_at FROM diet_plans WHERE id = %s"
+        params: tuple = (plan_id,)
+        if user_id is not None:
+            query += " AND user_id = %s"
+            params += (user_id,)
+        return self._row(await self.db.fetchone(query, params))
+
+    async def latest(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """The user's most recent active plan."""
+        if self.db is None:
+            return None
+        row = await self.db.fetchone(
+            "SELECT id, user_id, plan, created_at, updated_at FROM diet_plans "
+            "WHERE user_id = %s AND is_active ORDER BY created_at DESC, id DESC LIMIT 1",
+            (user_id,),
+        )
+        return self._row(row)
+
+    async def update_plan(self, plan_id: int, plan: Dict[str, Any]) -> bool:
+        """Overwrite a stored plan's JSON (partial regeneration); False if it is gone."""
+        if self.db is None:
+            return False
+        updated = await self.db.execute(
+            "UPDATE diet_plans SET plan = %s, updated_at = UTC_TIMESTAMP() WHERE id = %s",
+            (json.dumps(plan), plan_id),
+        )
+        return updated > 0
+
+    @staticmethod
+    def _row(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        return dict(row, plan=_load_json(row["plan"]))
@@ -0,0 +1,326 @@
+"""
+Resilience policies for calls to third-party APIs.
+
+Each upstream (Nutritionix, Edamam, Google Places, OpenAI) gets a circuit
+breaker, a retry budget and a latency tracker. Calls go through
+``Upstream.call``, which fails fast while the breaker is open, retries
+transient errors with jittered exponential backoff as long as the budget
+allows, and records latency so callers can hedge with a backup upstream
+once the primary is slower than its p95.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+import openai
+
+from . import config, metrics
+from .http_clients import EDAMAM, GOOGLE_PLACES, NUTRITIONIX
+
+logger = logging.getLogger(__name__)
+
+OPENAI = "openai"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"{upstream} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Timeouts, connection errors, 429s and 5xx responses are worth retrying."""
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TransportError, openai.APIConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with half-open probing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast. Once ``recovery_timeout`` has passed, up to
+    ``half_open_max_calls`` probe calls are let through: a success closes
+    the circuit, a failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = config.BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout: float = config.BREAKER_RECOVERY_TIMEOUT,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go through now (claims a probe slot when half-open)."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = HALF_OPEN
+            self.probes = 0
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_max_calls:
+                return False
+            self.probes += 1
+        return True
+
+    def release(self) -> None:
+        """Give back a probe slot whose call ended without an outcome (e.g. cancelled)."""
+        if self.state == HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info("Circuit for %s closed", self.name)
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+                logger.warning("Circuit for %s opened after %d failures", self.name, self.failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def retry_in(self) -> float:
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_in_seconds": round(self.retry_in(), 1) if self.state == OPEN else None,
+        }
+
+
+class RetryBudget:
+    """
+    Caps retries at ``ratio`` of recent requests (plus a small floor).
+
+    Keeps retries from multiplying load on an upstream that is already
+    struggling: once the budget is spent, failures are returned as-is.
+    """
+
+    def __init__(
+        self,
+        ratio: float = config.RETRY_BUDGET_RATIO,
+        min_retries_per_window: int = config.RETRY_BUDGET_MIN_RETRIES,
+        window: float = 10.0,
+    ):
+        self.ratio = ratio
+        self.min_retries_per_window = min_retries_per_window
+        self.window = window
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def record_request(self) -> None:
+        self._requests.append(time.monotonic())
+
+    def try_retry(self) -> bool:
+        """Spend one retry if the budget allows it."""
+        now = time.monotonic()
+        self._expire(now)
+        allowed = self.min_retries_per_window + self.ratio * len(self._requests)
+        if len(self._retries) >= allowed:
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire(time.monotonic())
+        return {"requests": len(self._requests), "retries": len(self._retries)}
+
+    def _expire(self, now: float) -> None:
+        for timestamps in (self._requests, self._retries):
+            while timestamps and now - timestamps[0] > self.window:
+                timestamps.popleft()
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for percentile-based hedging."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, default: Optional[float] = None) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return default
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Upstream:
+    """Breaker, retry budget and latency tracking for one upstream."""
+
+    def __init__(
+        self,
+        name: str,
+        max_retries: int = config.RETRY_MAX_ATTEMPTS,
+        backoff_base: float = config.RETRY_BACKOFF_BASE,
+        backoff_max: float = config.RETRY_BACKOFF_MAX,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(name)
+        self.budget = RetryBudget()
+        self.latency = LatencyTracker()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run ``fn`` under this upstream's policies.
+
+        Raises ``CircuitOpenError`` without calling ``fn`` while the
+        breaker is open. Transient errors are retried with full-jitter
+        exponential backoff while retries and budget remain; other errors
+        are raised immediately and do not count against the breaker. A
+        cancelled call records no outcome and gives back its probe slot.
+        """
+        if not self.breaker.allow():
+            metrics.observe_upstream(self.name, "circuit_open", 0.0)
+            raise CircuitOpenError(self.name, self.breaker.retry_in())
+        self.budget.record_request()
+        try:
+            return await self._attempts(fn)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+
+    async def _attempts(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                metrics.observe_upstream(self.name, "error", time.monotonic() - started)
+                if not is_transient(e):
+                    # The upstream answered; the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if (
+                    attempt >= self.max_retries
+                    or not self.budget.try_retry()
+                    or not self.breaker.allow()
+                ):
+                    raise
+                await asyncio.sleep(self.backoff_delay(attempt))
+                attempt += 1
+                continue
+            elapsed = time.monotonic() - started
+            metrics.observe_upstream(self.name, "success", elapsed)
+            self.breaker.record_success()
+            self.latency.record(elapsed)
+            return result
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2**attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def hedge_delay(self) -> float:
+        """How long to wait on this upstream before firing a hedge (its p95)."""
+        return max(
+            config.HEDGE_MIN_DELAY,
+            self.latency.percentile(0.95, default=config.HEDGE_DEFAULT_DELAY),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "circuit": self.breaker.stats(),
+            "retry_budget": self.budget.stats(),
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+async def hedged(
+    primary: Callable[[], Awaitable[Any]],
+    backup: Callable[[], Awaitable[Any]],
+    delay: float,
+) -> Any:
+    """
+    Run ``primary``; if it has not answered within ``delay`` seconds (or
+    fails), also run ``backup`` and return whichever succeeds first.
+
+    The slower call is cancelled. If both fail, the primary's error is
+    raised.
+    """
+    first = asyncio.ensure_future(primary())
+    tasks = [first]
+    errors = {}
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done and first.exception() is None:
+            return first.result()
+
+        second = asyncio.ensure_future(backup())
+        tasks.append(second)
+        pending = {first, second} - done
+        if done:
+            errors[first] = first.exception()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                errors[task] = task.exception()
+    finally:
+        # Also reached when the caller is cancelled (e.g. a client disconnect)
+        unfinished = [task for task in tasks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
+    raise errors.get(first) or errors[second]
+
+
+class Resilience:
+    """Registry of per-upstream policies shared by every service."""
+
+    def __init__(self):
+        self._upstreams: Dict[str, Upstream] = {}
+
+    def get(self, name: str) -> Upstream:
+        upstream = self._upstreams.get(name)
+        if upstream is None:
+            upstream = self._upstreams[name] = Upstream(name)
+        return upstream
+
+    def stats(self) -> Dict[str, Any]:
+        for name in (NUTRITIONIX, EDAMAM, GOOGLE_PLACES, OPENAI):
+            self.get(name)
+        return {name: upstream.stats() for name, upstream in self._upstreams.items()}
@@ -1,11 +1,26 @@
 """
 Chatbot route for nutrition/fitness Q&A using OpenAI GPT-4.1.
 """
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import json
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from ..dependencies import (
+    get_model_router,
+    get_resilience,
+    get_response_cache,
+    get_usage_tracker,
+    get_user_id,
+    get_user_tier,
+)
 from ..services.openai_service import OpenAIService
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 class ChatbotQuery(BaseModel):
@@ -21,10 +36,28 @@ class ChatbotResponse(BaseModel):
 
 
 @router.post("/query", response_model=ChatbotResponse)
-async def chatbot_query(request: ChatbotQuery):
+async def chatbot_query(
+    request: ChatbotQuery,
+    stream: bool = False,
+    response_cache=Depends(get_response_cache),
+    resilience=Depends(get_resilience),
+    usage=Depends(get_usage_tracker),
+    model_router=Depends(get_model_router),
+    user_id: Optional[int] = Depends(get_user_id),
+    user_tier: Optional[str] = Depends(get_user_tier)
+):
     """
     Handle chatbot queries about nutrition and fitness.
     
+    With ``?stream=true`` the answer is sent as Server-Sent Events while it
+    is generated: one ``data: {"token": "..."}`` event per fragment, then
+    ``event: done`` (or ``event: error``).
+    
+    Answers are served from the response cache when an identical (or, with
+    the semantic tier enabled, similar) question was answered for a user in
+    the same profile bucket. Otherwise the model and token budget are picked
+    by the routing rules from the question and the ``X-User-Tier`` header.
+    
     Example:
     ```json
     {
@@ -37,11 +70,29 @@ async def chatbot_query(request: ChatbotQuery):
     }
     ```
     """
+    if stream:
+        return StreamingResponse(
+            _sse_events(
+                OpenAIService(
+                    response_cache=response_cache, resilience=resilience, usage=usage, router=model_router
+                ),
+                request,
+                user_id,
+                user_tier,
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    
     try:
-        openai_service = OpenAIService()
+        openai_service = OpenAIService(
+            response_cache=response_cache, resilience=resilience, usage=usage, router=model_router
+        )
         response_text = await openai_service.chat_completion(
             query=request.query,
-            user_context=request.user_context
+            user_context=request.user_context,
+            user_id=user_id,
+            user_tier=user_tier
         )
         
         return ChatbotResponse(
@@ -53,3 +104,110 @@ async def chatbot_query(request: ChatbotQuery):
             status_code=500,
             detail=f"Error processing chatbot query: {str(e)}"
         )
+
+
+@router.websocket("/ws")
+async def chatbot_websocket(
+    websocket: WebSocket,
+    response_cache=Depends(get_response_cache),
+    resilience=Depends(get_resilience),
+    usage=Depends(get_usage_tracker),
+    model_router=Depends(get_model_router),
+    user_id: Optional[int] = Depends(get_user_id),
+    user_tier: Optional[str] = Depends(get_user_tier)
+):
+    """
+    Stream chatbot answers over a WebSocket.
+    
+    Send ``{"query": "...", "user_context": {...}}``; the server replies with
+    ``{"type": "token", "content": "..."}`` messages followed by
+    ``{"type": "done"}`` or ``{"type": "error", "detail": "..."}``. Several
+    queries can be sent over one connection, one at a time.
+    """
+    await websocket.accept()
+    openai_service = OpenAIService(
+        response_cache=response_cache, resilience=resilience, usage=usage, router=model_router
+    )
+    try:
+        while True:
+            try:
+                request = ChatbotQuery(**await websocket.receive_json())
+            except (ValidationError, TypeError, ValueError) as e:
+                await websocket.send_json({"type": "error", "detail": f"Invalid query: {e}"})
+                continue
+            
+            try:
+                tokens = _timed_stream(openai_service, request, "websocket", user_id, user_tier)
+                async with aclosing(tokens):
+                    async for token in tokens:
+                        await websocket.send_json({"type": "token", "content": token})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": f"Error processing chatbot query: {str(e)}"
+                })
+                continue
+            await websocket.send_json({"type": "done"})
+    except WebSocketDisconnect:
+        pass
+
+
+async def _sse_events(
+    openai_service: OpenAIService,
+    request: ChatbotQuery,
+    user_id: Optional[int] = None,
+    user_tier: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Format streamed tokens as Server-Sent Events."""
+    try:
+        async with aclosing(_timed_stream(openai_service, request, "sse", user_id, user_tier)) as tokens:
+            async for token in tokens:
+                yield f"data: {json.dumps({'token': token})}\n\n"
+    except Exception as e:
+        detail = json.dumps({'detail': f"Error processing chatbot query: {str(e)}"})
+        yield f"event: error\ndata: {detail}\n\n"
+        return
+    yield "event: done\ndata: {}\n\n"
+
+
+async def _timed_stream(
+    openai_service: OpenAIService,
+    request: ChatbotQuery,
+    transport: str,
+    user_id: Optional[int] = None,
+    user_tier: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Relay tokens from the OpenAI stream, logging time-to-first-byte.
+    
+    If the consumer stops early (client disconnect cancels the response
+    task), closing this generator closes the upstream stream as well.
+    """
+    started = time.perf_counter()
+    tokens = 0
+    completed = False
+    stream = openai_service.chat_completion_stream(
+        query=request.query,
+        user_context=request.user_context,
+        user_id=user_id,
+        user_tier=user_tier
+    )
+    try:
+        async for token in stream:
+            if tokens == 0:
+                logger.info(
+                    "chatbot %s stream time to first byte: %.0f ms",
+                    transport, (time.perf_counter() - started) * 1000,
+                )
+            tokens += 1
+            yield token
+        completed = True
+    finally:
+        await stream.aclose()
+        if not completed:
+            logger.info(
+                "chatbot %s stream stopped after %d tokens (%.0f ms)",
+                transport, tokens, (time.perf_counter() - started) * 1000,
+            )
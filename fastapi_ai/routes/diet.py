@@ -1,13 +1,36 @@
 """
 Diet plan generation route using OpenAI GPT-4.1.
 """
-from fastapi import APIRouter, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, Literal, Optional
+from .. import config
+from ..dependencies import (
+    get_diet_jobs,
+    get_diet_plan_repository,
+    get_meal_planner,
+    get_model_router,
+    get_profile_repository,
+    get_resilience,
+    get_response_cache,
+    get_usage_tracker,
+    get_user_id,
+    get_user_tier,
+    require_user_id,
+)
+from ..repositories import DietPlanRepository, ProfileRepository
+from ..services.diet_jobs import DietJobQueue
+from ..services.diet_plan_edits import PlanEditError
+from ..services.meal_planner import MealPlanner
 from ..services.openai_service import OpenAIService
 
 router = APIRouter()
 
+# Seconds between keep-alive comments on the job events stream
+JOB_EVENTS_KEEPALIVE = 15
+
 
 class DietPlanRequest(BaseModel):
     """Diet plan generation request model."""
@@ -24,11 +47,60 @@ class DietPlanResponse(BaseModel):
     message: str
 
 
+class DietPlanRegenerateRequest(BaseModel):
+    """Partial diet plan regeneration request model."""
+    section: Literal["day", "meal", "workout"]
+    day: str = None
+    meal: str = None
+    # Profile changes (e.g. new goals); other fields come from the stored profile
+    profile: DietPlanRequest = None
+
+
+class DietPlanRegenerateResponse(BaseModel):
+    """Patched diet plan model."""
+    diet_plan_id: int
+    section: str
+    plan: Dict[str, Any]
+
+
+class DietJobResponse(BaseModel):
+    """Diet plan job status model."""
+    job_id: str
+    status: str
+    user_id: Optional[int] = None
+    plan: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    diet_plan_id: Optional[int] = None
+    created_at: float
+    updated_at: float
+    deduplicated: bool = False
+
+
 @router.post("/generate", response_model=DietPlanResponse)
-async def generate_diet_plan(user_profile: DietPlanRequest):
+async def generate_diet_plan(
+    user_profile: DietPlanRequest,
+    include_workout: bool = True,
+    mode: Literal["fast", "llm", "hybrid"] = "llm",
+    planner: MealPlanner = Depends(get_meal_planner),
+    response_cache=Depends(get_response_cache),
+    resilience=Depends(get_resilience),
+    usage=Depends(get_usage_tracker),
+    model_router=Depends(get_model_router),
+    user_id: Optional[int] = Depends(get_user_id),
+    user_tier: Optional[str] = Depends(get_user_tier)
+):
     """
     Generate personalized diet plan using AI.
     
+    Pass ``?include_workout=false`` to skip workout plan generation.
+    
+    ``?mode=`` picks how the meals are produced:
+    - ``llm`` (default): the model writes the whole plan
+    - ``fast``: the local planner computes targets and picks meals from the
+      food database, with no OpenAI call (and no workout plan)
+    - ``hybrid``: the local plan, with titles and recipes (and the workout
+      plan) written by the model
+    
     Example:
     ```json
     {
@@ -44,8 +116,30 @@ async def generate_diet_plan(user_profile: DietPlanRequest):
     ```
     """
     try:
-        openai_service = OpenAIService()
-        plan = await openai_service.generate_diet_plan(user_profile.dict())
+        if mode == "fast":
+            return DietPlanResponse(
+                plan=planner.plan(user_profile.model_dump()),
+                message="Diet plan generated successfully"
+            )
+        
+        openai_service = OpenAIService(
+            response_cache=response_cache, resilience=resilience, usage=usage, router=model_router
+        )
+        if mode == "hybrid":
+            plan = await openai_service.describe_plan(
+                planner.plan(user_profile.model_dump()),
+                user_profile.model_dump(),
+                include_workout=include_workout,
+                user_id=user_id,
+                user_tier=user_tier
+            )
+        else:
+            plan = await openai_service.generate_diet_plan(
+                user_profile.model_dump(),
+                include_workout=include_workout,
+                user_id=user_id,
+                user_tier=user_tier
+            )
         
         return DietPlanResponse(
             plan=plan,
@@ -56,3 +150,164 @@ async def generate_diet_plan(user_profile: DietPlanRequest):
             status_code=500,
             detail=f"Error generating diet plan: {str(e)}"
         )
+
+
+@router.post("/plans/{plan_id}/regenerate", response_model=DietPlanRegenerateResponse)
+async def regenerate_diet_plan_section(
+    plan_id: int,
+    request: DietPlanRegenerateRequest,
+    plans: DietPlanRepository = Depends(get_diet_plan_repository),
+    profiles: ProfileRepository = Depends(get_profile_repository),
+    resilience=Depends(get_resilience),
+    usage=Depends(get_usage_tracker),
+    model_router=Depends(get_model_router),
+    user_id: int = Depends(require_user_id),
+    user_tier: Optional[str] = Depends(get_user_tier)
+):
+    """
+    Regenerate one day, one meal or the workout of a saved plan in place.
+    
+    Only the requested section is sent to the model; the rest of the plan
+    is kept and ``daily_totals`` / ``weekly_average`` are recomputed from
+    the meals. ``X-User-Id`` is required and only that user's plans can be
+    edited. If generation fails the stored plan is left unchanged.
+    
+    Example:
+    ```json
+    {"section": "meal", "day": "tuesday", "meal": "lunch", "profile": {"goals": {"weight_loss": true}}}
+    ```
+    """
+    if request.section in ("day", "meal") and not request.day:
+        raise HTTPException(status_code=422, detail="day is required")
+    if request.section == "meal" and not request.meal:
+        raise HTTPException(status_code=422, detail="meal is required")
+    
+    stored = await plans.get(plan_id, user_id=user_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Diet plan not found")
+    
+    profile = await profiles.get(user_id) or {}
+    if request.profile is not None:
+        profile.update(request.profile.dict(exclude_none=True))
+    
+    try:
+        openai_service = OpenAIService(resilience=resilience, usage=usage, router=model_router)
+        if request.section == "day":
+            plan = await openai_service.regenerate_day(
+                stored["plan"], profile, request.day, user_id=user_id, user_tier=user_tier
+            )
+        elif request.section == "meal":
+            plan = await openai_service.regenerate_meal(
+                stored["plan"], profile, request.day, request.meal,
+                user_id=user_id, user_tier=user_tier
+            )
+        else:
+            plan = await openai_service.regenerate_workout(
+                stored["plan"], profile, user_id=user_id, user_tier=user_tier
+            )
+        await plans.update_plan(plan_id, plan)
+    except PlanEditError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error regenerating diet plan: {str(e)}"
+        )
+    
+    return DietPlanRegenerateResponse(diet_plan_id=plan_id, section=request.section, plan=plan)
+
+
+@router.post("/jobs", response_model=DietJobResponse, status_code=202)
+async def submit_diet_plan_job(
+    request: DietPlanRequest,
+    include_workout: bool = True,
+    jobs: DietJobQueue = Depends(get_diet_jobs),
+    profiles: ProfileRepository = Depends(get_profile_repository),
+    user_id: Optional[int] = Depends(get_user_id),
+    user_tier: Optional[str] = Depends(get_user_tier)
+):
+    """
+    Queue diet plan generation and return a job id immediately.
+    
+    Poll ``GET /diet/jobs/{job_id}`` (optionally with ``?wait=30``) or
+    subscribe to ``GET /diet/jobs/{job_id}/events`` for the result. An
+    identical request from the same user that is still in progress returns
+    the existing job with ``deduplicated: true``. With ``X-User-Id`` the
+    finished plan is saved to that user's ``diet_plans`` and profile fields
+    left out of the request are filled in from the stored profile.
+    """
+    profile = request.model_dump()
+    try:
+        if user_id is not None and None in profile.values():
+            stored = await profiles.get(user_id) or {}
+            profile = {
+                field: stored.get(field) if value is None else value
+                for field, value in profile.items()
+            }
+        job, deduplicated = await jobs.submit(
+            profile,
+            include_workout=include_workout,
+            user_id=user_id,
+            user_tier=user_tier
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error queuing diet plan: {str(e)}"
+        )
+    
+    return DietJobResponse(**job.to_dict(), deduplicated=deduplicated)
+
+
+@router.get("/jobs/{job_id}", response_model=DietJobResponse)
+async def get_diet_plan_job(
+    job_id: str,
+    wait: float = 0,
+    jobs: DietJobQueue = Depends(get_diet_jobs)
+):
+    """
+    Get a diet plan job's status and, once finished, its plan or error.
+    
+    With ``?wait=<seconds>`` the request is held until the job finishes or
+    the wait (capped at ``DIET_JOB_MAX_WAIT``) runs out.
+    """
+    job = await jobs.wait(job_id, min(max(wait, 0), config.DIET_JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Diet plan job not found")
+    
+    return DietJobResponse(**job.to_dict())
+
+
+@router.get("/jobs/{job_id}/events")
+async def diet_plan_job_events(job_id: str, jobs: DietJobQueue = Depends(get_diet_jobs)):
+    """
+    Subscribe to a diet plan job as Server-Sent Events.
+    
+    Sends ``event: status`` with the job whenever its status changes and
+    finishes with ``event: done`` carrying the final job.
+    """
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Diet plan job not found")
+    
+    return StreamingResponse(
+        _job_events(jobs, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _job_events(jobs: DietJobQueue, job_id: str) -> AsyncIterator[str]:
+    """Emit job status changes until the job finishes."""
+    status = None
+    job = await jobs.get(job_id)
+    while job is not None and not job.done:
+        if job.status != status:
+            status = job.status
+            yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+        else:
+            # Keep proxies from timing out the idle connection
+            yield ": keep-alive\n\n"
+        job = await jobs.wait(job_id, JOB_EVENTS_KEEPALIVE)
+    if job is not None:
+        yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
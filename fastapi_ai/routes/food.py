@@ -1,13 +1,24 @@
 """
 Food analysis route using Nutritionix/Edamam API.
 """
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Dict, Any
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List
+from .. import config
+from ..dependencies import (
+    get_food_db, get_http_clients, get_nutrition_cache, get_resilience, require_admin
+)
+from ..http_clients import HTTPClients
+from ..resilience import Resilience
+from ..services.food_db import FoodCompositionDB
+from ..services.nutrition_cache import NutritionCache
 from ..services.nutrition_service import NutritionService
 
 router = APIRouter()
 
+MAX_BATCH_ITEMS = 100
+
 
 class FoodAnalysisRequest(BaseModel):
     """Food analysis request model."""
@@ -20,10 +31,50 @@ class FoodAnalysisResponse(BaseModel):
     calories: float
     nutrients: Dict[str, Any]
     serving_size: str = None
+    cache: Dict[str, Any] = None
+
+
+class BatchFoodItem(BaseModel):
+    """Single item of a batch food analysis request."""
+    name: str
+    quantity: float = Field(1, gt=0)
+
+
+class BatchFoodAnalysisRequest(BaseModel):
+    """Batch food analysis request model."""
+    items: List[BatchFoodItem]
+
+
+class BatchFoodAnalysisResult(BaseModel):
+    """Per-item batch analysis result; ``error`` is set when the item failed."""
+    name: str
+    quantity: float = 1
+    matched_name: str = None
+    calories: float = None
+    nutrients: Dict[str, Any] = None
+    serving_size: str = None
+    cache: Dict[str, Any] = None
+    error: str = None
+
+
+class BatchFoodAnalysisResponse(BaseModel):
+    """Batch food analysis response model."""
+    results: List[BatchFoodAnalysisResult]
+
+
+class CacheWarmRequest(BaseModel):
+    """Nutrition cache warm-up request model."""
+    names: List[str]
 
 
 @router.post("/analyze", response_model=FoodAnalysisResponse)
-async def analyze_food(request: FoodAnalysisRequest):
+async def analyze_food(
+    request: FoodAnalysisRequest,
+    http_clients: HTTPClients = Depends(get_http_clients),
+    cache: NutritionCache = Depends(get_nutrition_cache),
+    food_db: FoodCompositionDB = Depends(get_food_db),
+    resilience: Resilience = Depends(get_resilience),
+):
     """
     Analyze food nutrition and estimate calories.
     
@@ -41,7 +92,9 @@ async def analyze_food(request: FoodAnalysisRequest):
         )
     
     try:
-        nutrition_service = NutritionService()
+        nutrition_service = NutritionService(
+            http_clients=http_clients, cache=cache, food_db=food_db, resilience=resilience
+        )
         analysis = await nutrition_service.analyze_food(request.name)
         
         return FoodAnalysisResponse(**analysis)
@@ -50,3 +103,119 @@ async def analyze_food(request: FoodAnalysisRequest):
             status_code=500,
             detail=f"Error analyzing food: {str(e)}"
         )
+
+
+@router.post("/analyze/batch", response_model=BatchFoodAnalysisResponse)
+async def analyze_food_batch(
+    request: BatchFoodAnalysisRequest,
+    http_clients: HTTPClients = Depends(get_http_clients),
+    cache: NutritionCache = Depends(get_nutrition_cache),
+    food_db: FoodCompositionDB = Depends(get_food_db),
+    resilience: Resilience = Depends(get_resilience),
+):
+    """
+    Analyze several foods in one request, e.g. a whole meal.
+    
+    ``quantity`` is the number of servings and scales calories and nutrients.
+    Failed items are returned with an ``error`` instead of failing the batch.
+    
+    Example:
+    ```json
+    {
+        "items": [
+            {"name": "Grilled Chicken Breast", "quantity": 1.5},
+            {"name": "Brown Rice"},
+            {"name": "Steamed Broccoli"}
+        ]
+    }
+    ```
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="At least one item is required")
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {MAX_BATCH_ITEMS} items"
+        )
+    
+    try:
+        nutrition_service = NutritionService(
+            http_clients=http_clients, cache=cache, food_db=food_db, resilience=resilience
+        )
+        results = await nutrition_service.analyze_batch(
+            [item.model_dump() for item in request.items]
+        )
+        
+        return BatchFoodAnalysisResponse(
+            results=[BatchFoodAnalysisResult(**result) for result in results]
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error analyzing foods: {str(e)}"
+        )
+
+
+@router.get("/cache/stats", dependencies=[Depends(require_admin)])
+async def nutrition_cache_stats(cache: NutritionCache = Depends(get_nutrition_cache)):
+    """Nutrition cache size and hit/miss counters (admin only)."""
+    return cache.stats()
+
+
+@router.post("/cache/warm", dependencies=[Depends(require_admin)])
+async def warm_nutrition_cache(
+    request: CacheWarmRequest,
+    http_clients: HTTPClients = Depends(get_http_clients),
+    cache: NutritionCache = Depends(get_nutrition_cache),
+    food_db: FoodCompositionDB = Depends(get_food_db),
+    resilience: Resilience = Depends(get_resilience),
+):
+    """
+    Pre-load foods into the nutrition cache (admin only).
+    
+    Example:
+    ```json
+    {
+        "names": ["chicken breast", "banana", "brown rice"]
+    }
+    ```
+    """
+    nutrition_service = NutritionService(
+        http_clients=http_clients, cache=cache, food_db=food_db, resilience=resilience
+    )
+    semaphore = asyncio.Semaphore(config.NUTRITION_MAX_CONCURRENCY)
+    
+    async def warm(name: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await nutrition_service.analyze_food(name)
+    
+    results = await asyncio.gather(
+        *(warm(name) for name in request.names),
+        return_exceptions=True,
+    )
+    
+    warmed = {}
+    for name, result in zip(request.names, results):
+        if isinstance(result, Exception):
+            warmed[name] = {"status": "error", "detail": str(result)}
+        else:
+            # Foods answered by the local database never reach the cache
+            warmed[name] = result.get('cache') or {"status": "local"}
+    return {"warmed": warmed}
+
+
+@router.delete("/cache/{name}", dependencies=[Depends(require_admin)])
+async def invalidate_nutrition_cache_entry(
+    name: str,
+    cache: NutritionCache = Depends(get_nutrition_cache),
+):
+    """Remove a single food from the nutrition cache (admin only)."""
+    removed = await cache.invalidate(name)
+    return {"name": name, "removed": removed}
+
+
+@router.delete("/cache", dependencies=[Depends(require_admin)])
+async def clear_nutrition_cache(cache: NutritionCache = Depends(get_nutrition_cache)):
+    """Remove every entry from the nutrition cache (admin only)."""
+    await cache.clear()
+    return {"cleared": True}
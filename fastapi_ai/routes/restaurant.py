@@ -1,13 +1,22 @@
 """
 Restaurant filtering route using Google Maps API.
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from ..dependencies import (
+    get_http_clients, get_resilience, get_restaurant_cache, get_spatial_index
+)
+from ..http_clients import HTTPClients
+from ..resilience import Resilience
 from ..services.maps_service import MapsService
+from ..services.restaurant_cache import RestaurantCache
+from ..services.spatial_index import SpatialIndex
 
 router = APIRouter()
 
+MAX_RESULTS = 20
+
 
 class RestaurantResponse(BaseModel):
     """Restaurant response model."""
@@ -18,7 +27,13 @@ class RestaurantResponse(BaseModel):
 async def get_nearby_restaurants(
     latitude: float,
     longitude: float,
-    radius: int = 5000
+    radius: int = 5000,
+    include_details: bool = True,
+    k: Optional[int] = None,
+    http_clients: HTTPClients = Depends(get_http_clients),
+    cache: RestaurantCache = Depends(get_restaurant_cache),
+    index: SpatialIndex = Depends(get_spatial_index),
+    resilience: Resilience = Depends(get_resilience),
 ):
     """
     Get nearby healthy restaurants filtered by healthy options.
@@ -27,18 +42,36 @@ async def get_nearby_restaurants(
     - latitude: Latitude coordinate
     - longitude: Longitude coordinate
     - radius: Search radius in meters (default: 5000)
+    - include_details: Fetch phone, website and opening hours (default: true)
+    - k: Return only the k nearest healthy restaurants within the radius (max 20)
+    
+    Stored restaurants are searched locally first; when too few are in
+    range, results are assembled from cached geohash tiles around the
+    location. Results carry a ``distance_m`` field and are ranked by
+    ``health_score`` (nearest first on ties); with ``k`` they are the k
+    nearest healthy restaurants, nearest first.
     
     Example:
     ```
     GET /restaurant/nearby?latitude=40.7128&longitude=-74.0060&radius=5000
     ```
     """
+    if k is not None and not 1 <= k <= MAX_RESULTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"k must be between 1 and {MAX_RESULTS}"
+        )
+    
     try:
-        maps_service = MapsService()
+        maps_service = MapsService(
+            http_clients=http_clients, cache=cache, index=index, resilience=resilience
+        )
         restaurants = await maps_service.find_healthy_restaurants(
             latitude=latitude,
             longitude=longitude,
-            radius=radius
+            radius=radius,
+            include_details=include_details,
+            k=k
         )
         
         return RestaurantResponse(restaurants=restaurants)
@@ -0,0 +1,94 @@
+"""
+Columns and indexes the FastAPI service needs on MySQL tables.
+
+Tables such as ``restaurants`` are created by Django migrations, after
+``database/init.sql`` has run, so the columns FastAPI adds to them cannot
+be created there. init.sql also only runs on a fresh volume, so columns
+added to FastAPI's own tables later need the same treatment. On startup
+``ensure_schema`` compares each table with ``SCHEMA`` through
+``information_schema`` and adds whatever is missing in one ``ALTER TABLE``
+per table. Tables that do not exist yet are skipped with a warning; the
+next start picks them up.
+"""
+import logging
+from typing import List, NamedTuple, Tuple
+
+from .db import Database
+
+logger = logging.getLogger(__name__)
+
+
+class TableSchema(NamedTuple):
+    """Columns and indexes (name, DDL) required on one table, in creation order."""
+    table: str
+    columns: Tuple[Tuple[str, str], ...] = ()
+    indexes: Tuple[Tuple[str, str], ...] = ()
+
+
+SCHEMA = (
+    # Durable tier of RestaurantCache and source of the SpatialIndex
+    TableSchema(
+        "restaurants",
+        columns=(
+            ("place_id", "VARCHAR(255) NULL"),
+            ("geohash", "CHAR(9) NULL"),
+            ("data", "JSON NULL"),
+            ("fetched_at", "DOUBLE NULL"),
+            ("details", "JSON NULL"),
+            ("details_cached_at", "DOUBLE NULL"),
+            ("lat", "DOUBLE GENERATED ALWAYS AS (JSON_EXTRACT(location, '$.latitude')) STORED"),
+            ("lng", "DOUBLE GENERATED ALWAYS AS (JSON_EXTRACT(location, '$.longitude')) STORED"),
+            ("coords", "POINT GENERATED ALWAYS AS ("
+                       "ST_SRID(POINT(COALESCE(lat, 0), COALESCE(lng, 0)), 4326)"
+                       ") STORED NOT NULL SRID 4326"),
+        ),
+        indexes=(
+            ("uniq_place_id", "UNIQUE KEY uniq_place_id (place_id)"),
+            ("idx_geohash_fetched", "INDEX idx_geohash_fetched (geohash, fetched_at)"),
+            ("idx_fetched_id", "INDEX idx_fetched_id (fetched_at, id)"),
+            ("idx_coords", "SPATIAL INDEX idx_coords (coords)"),
+        ),
+    ),
+    # Created by init.sql; user_tier was added after the first release
+    TableSchema("diet_jobs", columns=(("user_tier", "VARCHAR(32) NULL"),)),
+)
+
+
+async def ensure_schema(db: Database, schema: Tuple[TableSchema, ...] = SCHEMA) -> List[str]:
+    """Add missing columns and indexes; returns the tables that were altered."""
+    altered = []
+    for table in schema:
+        try:
+            clauses = await _missing(db, table)
+            if clauses is None:
+                logger.warning("Table %s does not exist yet; its columns are added on a later start", table.table)
+                continue
+            if clauses:
+                await db.execute(f"ALTER TABLE {table.table} {', '.join(clauses)}")
+                altered.append(table.table)
+                logger.info("Altered %s: %s", table.table, ", ".join(clauses))
+        except Exception as e:
+            logger.warning("Failed to update the schema of %s: %s", table.table, e)
+    return altered
+
+
+async def _missing(db: Database, table: TableSchema):
+    """``ADD`` clauses for what ``table`` lacks, or None if the table does not exist."""
+    rows = await db.fetchall(
+        "SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table.table,),
+    )
+    columns = {row["name"] for row in rows}
+    if not columns:
+        return None
+    rows = await db.fetchall(
+        "SELECT DISTINCT INDEX_NAME AS name FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table.table,),
+    )
+    indexes = {row["name"] for row in rows}
+    return (
+        [f"ADD COLUMN {name} {ddl}" for name, ddl in table.columns if name not in columns]
+        + [f"ADD {ddl}" for name, ddl in table.indexes if name not in indexes]
+    )
@@ -0,0 +1,53 @@
+"""
+Benchmark food-composition database lookups.
+
+Usage:
+    python -m fastapi_ai.scripts.bench_food_db [--path PATH] [--iterations N]
+
+Reports index build time and lookups/sec for exact, fuzzy and unknown
+queries against the configured dataset.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from .. import config
+from ..services.food_db import FoodCompositionDB
+
+QUERIES = {
+    "exact": ["banana", "Grilled chicken breast", "brown rice cooked", "apples", "Avocado"],
+    "fuzzy": ["chicken", "greek yoghurt", "strawbery", "salmon fillet", "oatmeal with blueberries"],
+    "unknown": ["zzz qqq", "mystery stew", "xyzzy", "quux", "flibbertigibbet"],
+}
+
+
+def bench(food_db: FoodCompositionDB, queries, iterations: int) -> float:
+    """Return lookups per second over ``iterations`` passes of ``queries``."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for query in queries:
+            food_db.search(query)
+    elapsed = time.perf_counter() - started
+    return iterations * len(queries) / elapsed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--path", type=Path, default=Path(config.FOOD_DB_PATH))
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    food_db = FoodCompositionDB.from_csv(args.path)
+    print(f"Loaded and indexed {len(food_db)} foods in "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    for kind, queries in QUERIES.items():
+        rate = bench(food_db, queries, args.iterations)
+        print(f"{kind:>8}: {rate:>12,.0f} lookups/sec ({1e6 / rate:.1f} us/lookup)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Benchmark local nearby-restaurant queries against the Google Places path.
+
+Usage:
+    python -m fastapi_ai.scripts.bench_spatial_index [--places N] [--queries N]
+        [--radius METERS] [--k K] [--upstream-queries N]
+
+Builds a spatial index of synthetic places around New York and reports
+per-query latency for radius and k-nearest lookups, alongside a linear
+scan. When ``GOOGLE_MAPS_API_KEY`` is set, the same searches are also
+timed against ``MapsService._search_restaurants`` for comparison.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+from ..http_clients import HTTPClients
+from ..services.geo import haversine_m
+from ..services.maps_service import MapsService
+from ..services.spatial_index import SpatialIndex
+
+CENTER = (40.7128, -74.0060)
+SPREAD_DEGREES = 0.25
+
+
+def random_point(rng: random.Random):
+    return (
+        CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+        CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+    )
+
+
+def report(label: str, timings) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:>14}: median {statistics.median(timings) * 1000:9.3f} ms, "
+          f"p95 {p95 * 1000:9.3f} ms")
+
+
+def time_each(fn, points):
+    timings = []
+    for lat, lng in points:
+        started = time.perf_counter()
+        fn(lat, lng)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def time_upstream(points, radius: int):
+    http_clients = HTTPClients()
+    maps_service = MapsService(http_clients=http_clients)
+    timings = []
+    try:
+        for lat, lng in points:
+            started = time.perf_counter()
+            await maps_service._search_restaurants(lat, lng, radius, include_details=False)
+            timings.append(time.perf_counter() - started)
+    finally:
+        await http_clients.aclose()
+    return timings
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--places", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--radius", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--upstream-queries", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    places = []
+    for i in range(args.places):
+        lat, lng = random_point(rng)
+        places.append({
+            "place_id": f"place-{i}",
+            "name": f"Restaurant {i}",
+            "location": {"latitude": lat, "longitude": lng},
+        })
+
+    started = time.perf_counter()
+    index = SpatialIndex()
+    index.upsert_many(places)
+    print(f"Indexed {len(index)} places in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    points = [random_point(rng) for _ in range(args.queries)]
+    report("radius", time_each(lambda lat, lng: index.within(lat, lng, args.radius), points))
+    report(f"{args.k}-nearest", time_each(lambda lat, lng: index.nearest(lat, lng, args.k), points))
+
+    def linear_scan(lat, lng):
+        return [
+            place for place in places
+            if haversine_m(lat, lng, place["location"]["latitude"], place["location"]["longitude"])
+            <= args.radius
+        ]
+
+    report("linear scan", time_each(linear_scan, points[:max(1, args.queries // 100)]))
+
+    if not os.getenv("GOOGLE_MAPS_API_KEY"):
+        print("      upstream: skipped (GOOGLE_MAPS_API_KEY not set)")
+        return 0
+    upstream = asyncio.run(time_upstream(points[:args.upstream_queries], args.radius))
+    report("upstream", upstream)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Import a USDA FoodData Central CSV download into the food-composition format.
+
+Usage:
+    python -m fastapi_ai.scripts.import_fdc <fdc_csv_dir> [--output PATH]
+        [--data-types foundation_food,sr_legacy_food]
+
+``<fdc_csv_dir>`` is an extracted FoodData Central "Full Download" or
+"SR Legacy"/"Foundation Foods" CSV archive containing ``food.csv``,
+``food_nutrient.csv`` and ``food_category.csv``. The output CSV holds one
+row per food with calories and macronutrients per 100g and is loaded by
+``fastapi_ai.services.food_db`` (point ``FOOD_DB_PATH`` at it).
+"""
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+from .. import config
+from ..services.food_db import FoodCompositionDB, NUTRIENT_FIELDS
+
+# FoodData Central nutrient ids
+NUTRIENT_IDS = {
+    "1008": "calories",   # Energy (kcal)
+    "2047": "calories",   # Energy (Atwater General Factors), Foundation foods
+    "1003": "protein",
+    "1005": "carbs",      # Carbohydrate, by difference
+    "1004": "fats",       # Total lipid (fat)
+    "1079": "fiber",      # Fiber, total dietary
+    "2000": "sugar",      # Sugars, total including NLEA
+    "1063": "sugar",      # Sugars, Total NLEA
+}
+
+# FoodData Central category description keywords -> food_db category
+CATEGORY_KEYWORDS = (
+    ("poultry", "protein"),
+    ("beef", "protein"),
+    ("pork", "protein"),
+    ("lamb", "protein"),
+    ("sausage", "protein"),
+    ("finfish", "protein"),
+    ("legume", "legume"),
+    ("nut and seed", "nut_seed"),
+    ("dairy", "dairy"),
+    ("cereal", "grain"),
+    ("baked", "grain"),
+    ("vegetable", "vegetable"),
+    ("fruit", "fruit"),
+    ("fats and oils", "fat_oil"),
+    ("beverage", "beverage"),
+    ("sweets", "snack"),
+    ("snack", "snack"),
+    ("meals", "prepared"),
+    ("fast foods", "prepared"),
+    ("restaurant", "prepared"),
+    ("soups", "prepared"),
+)
+
+
+def map_category(description: str) -> str:
+    description = description.lower()
+    for keyword, category in CATEGORY_KEYWORDS:
+        if keyword in description:
+            return category
+    return "other"
+
+
+def import_fdc(source: Path, output: Path, data_types) -> int:
+    """Convert an FDC CSV directory to the food_db CSV format; returns row count."""
+    with open(source / "food_category.csv", newline="", encoding="utf-8") as f:
+        categories = {row["id"]: map_category(row["description"]) for row in csv.DictReader(f)}
+
+    foods = {}
+    with open(source / "food.csv", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row["data_type"] not in data_types:
+                continue
+            foods[row["fdc_id"]] = {
+                "description": row["description"],
+                "category": categories.get(row.get("food_category_id", ""), "other"),
+                "calories": "",
+                **{field: "" for field in NUTRIENT_FIELDS},
+            }
+
+    # food_nutrient.csv is large; stream it and keep only what we need.
+    # Earlier ids in NUTRIENT_IDS win (e.g. 1008 over 2047 for energy).
+    priority = {nutrient_id: i for i, nutrient_id in enumerate(NUTRIENT_IDS)}
+    seen = {}
+    with open(source / "food_nutrient.csv", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            food = foods.get(row["fdc_id"])
+            field = NUTRIENT_IDS.get(row["nutrient_id"])
+            if food is None or field is None or not row["amount"]:
+                continue
+            key = (row["fdc_id"], field)
+            rank = priority[row["nutrient_id"]]
+            if key in seen and seen[key] <= rank:
+                continue
+            seen[key] = rank
+            food[field] = row["amount"]
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=["description", "category", "calories", *NUTRIENT_FIELDS]
+        )
+        writer.writeheader()
+        for food in foods.values():
+            if food["calories"] == "":
+                continue
+            writer.writerow(food)
+            written += 1
+    return written
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("source", type=Path, help="Directory with FoodData Central CSV files")
+    parser.add_argument("--output", type=Path, default=Path(config.FOOD_DB_PATH))
+    parser.add_argument(
+        "--data-types",
+        default="foundation_food,sr_legacy_food",
+        help="Comma-separated FDC data_type values to import",
+    )
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    written = import_fdc(args.source, args.output, set(args.data_types.split(",")))
+    print(f"Imported {written} foods into {args.output} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    food_db = FoodCompositionDB.from_csv(args.output)
+    print(f"Indexed {len(food_db)} foods in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+In-process caching primitives shared by the service layer.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after ``ttl`` seconds.
+
+    Values are stored together with the time they were cached so callers can
+    report the age of a hit.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Return ``(value, cached_at)`` or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, value: Any, cached_at: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        self._entries[key] = (value, time.time() if cached_at is None else cached_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove a key, returning whether it was present."""
+        return self._entries.pop(key, None) is not None
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether ``key`` holds an unexpired value; does not affect LRU order."""
+        entry = self._entries.get(key)
+        return entry is not None and time.time() - entry[1] <= self.ttl
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls for the same key.
+
+    The first caller for a key starts the work; callers arriving while it is
+    in flight await the same result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """Run ``fn`` once per key; returns ``(result, shared)``."""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled caller does not cancel the work for the others
+        return await asyncio.shield(task), shared
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,493 @@
+"""
+Background diet plan generation.
+
+``POST /diet/jobs`` enqueues a job and returns immediately; a pool of
+in-process asyncio workers runs the (multi-call) LLM generation and
+clients poll or subscribe for the result. Job state lives in a pluggable
+backend: in memory for a single process, or the ``diet_jobs`` MySQL table
+so any worker process can answer a poll and queued jobs survive restarts.
+Running jobs are kept alive by a heartbeat; a job whose heartbeat stops
+(its process died) is picked up again by any worker. Finished plans for
+known users are saved into ``diet_plans``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .. import config
+from ..db import Database
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+Generator = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+def dedupe_key(user_id: Optional[int], profile: Dict[str, Any], include_workout: bool) -> str:
+    """Identity of a request; identical in-flight requests share one job."""
+    payload = json.dumps([user_id, profile, include_workout], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class DietJob:
+    """A diet plan generation job and its outcome."""
+
+    def __init__(
+        self,
+        id: str,
+        user_id: Optional[int],
+        profile: Dict[str, Any],
+        include_workout: bool,
+        dedupe_key: str,
+        user_tier: Optional[str] = None,
+        status: str = QUEUED,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        diet_plan_id: Optional[int] = None,
+        created_at: Optional[float] = None,
+        updated_at: Optional[float] = None,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.profile = profile
+        self.include_workout = include_workout
+        self.dedupe_key = dedupe_key
+        self.user_tier = user_tier
+        self.status = status
+        self.result = result
+        self.error = error
+        self.diet_plan_id = diet_plan_id
+        self.created_at = created_at if created_at is not None else time.time()
+        self.updated_at = updated_at if updated_at is not None else self.created_at
+
+    @classmethod
+    def new(
+        cls,
+        user_id: Optional[int],
+        profile: Dict[str, Any],
+        include_workout: bool,
+        user_tier: Optional[str] = None,
+    ) -> "DietJob":
+        return cls(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            profile=profile,
+            include_workout=include_workout,
+            dedupe_key=dedupe_key(user_id, profile, include_workout),
+            user_tier=user_tier,
+        )
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ACTIVE_STATUSES
+
+    def stale(self, before: float) -> bool:
+        """Running, but without a heartbeat since ``before``."""
+        return self.status == RUNNING and self.updated_at < before
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "user_id": self.user_id,
+            "plan": self.result,
+            "error": self.error,
+            "diet_plan_id": self.diet_plan_id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobBackend(ABC):
+    """
+    Storage for diet jobs; subclasses decide where job state lives.
+
+    ``stale_before`` is a timestamp: running jobs not updated since then
+    have lost their worker and count as neither active nor taken.
+    """
+
+    @abstractmethod
+    async def create(self, job: DietJob) -> None:
+        """Store a new queued job."""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[DietJob]:
+        """A job by id."""
+
+    @abstractmethod
+    async def find_active(self, key: str, stale_before: float) -> Optional[DietJob]:
+        """Queued or live running job with the given dedupe key."""
+
+    @abstractmethod
+    async def claim(self, job_id: str, stale_before: float) -> bool:
+        """Atomically move a queued or stale job to running; False if someone else has it."""
+
+    @abstractmethod
+    async def heartbeat(self, job_id: str) -> None:
+        """Mark a running job as still being worked on."""
+
+    @abstractmethod
+    async def save(self, job: DietJob) -> None:
+        """Persist a job's status and outcome."""
+
+    @abstractmethod
+    async def pending(self, stale_before: float) -> List[DietJob]:
+        """Queued and stale running jobs, oldest first (to be re-enqueued)."""
+
+
+class InMemoryJobBackend(JobBackend):
+    """Process-local job storage; jobs are kept for ``retention`` seconds."""
+
+    def __init__(self, retention: float = config.DIET_JOB_RETENTION, max_jobs: int = 10000):
+        self.jobs = TTLCache(max_entries=max_jobs, ttl=retention)
+        self._active: Dict[str, str] = {}
+
+    async def create(self, job: DietJob) -> None:
+        self.jobs.set(job.id, job)
+        self._active[job.dedupe_key] = job.id
+
+    async def get(self, job_id: str) -> Optional[DietJob]:
+        entry = self.jobs.get(job_id)
+        return entry[0] if entry is not None else None
+
+    async def find_active(self, key: str, stale_before: float) -> Optional[DietJob]:
+        job_id = self._active.get(key)
+        job = await self.get(job_id) if job_id else None
+        return job if job is not None and not job.done and not job.stale(stale_before) else None
+
+    async def claim(self, job_id: str, stale_before: float) -> bool:
+        job = await self.get(job_id)
+        if job is None or not (job.status == QUEUED or job.stale(stale_before)):
+            return False
+        job.status = RUNNING
+        job.updated_at = time.time()
+        return True
+
+    async def heartbeat(self, job_id: str) -> None:
+        job = await self.get(job_id)
+        if job is not None and job.status == RUNNING:
+            job.updated_at = time.time()
+
+    async def save(self, job: DietJob) -> None:
+        # Re-set so retention counts from the last update
+        self.jobs.set(job.id, job)
+        if job.done and self._active.get(job.dedupe_key) == job.id:
+            del self._active[job.dedupe_key]
+
+    async def pending(self, stale_before: float) -> List[DietJob]:
+        # Queued jobs are already in this process's queue; only stale ones need recovery
+        jobs = [await self.get(job_id) for job_id in list(self._active.values())]
+        return sorted(
+            (job for job in jobs if job is not None and job.stale(stale_before)),
+            key=lambda job: job.created_at,
+        )
+
+
+class MySQLJobBackend(JobBackend):
+    """Job storage in the ``diet_jobs`` table, shared by every worker process."""
+
+    _COLUMNS = (
+        "id, user_id, profile, include_workout, dedupe_key, user_tier, status, "
+        "result, error, diet_plan_id, created_at, updated_at"
+    )
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def create(self, job: DietJob) -> None:
+        await self.db.execute(
+            f"INSERT INTO diet_jobs ({self._COLUMNS}) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            (
+                job.id, job.user_id, json.dumps(job.profile), job.include_workout,
+                job.dedupe_key, job.user_tier, job.status, None, None, None,
+                job.created_at, job.updated_at,
+            ),
+        )
+
+    async def get(self, job_id: str) -> Optional[DietJob]:
+        row = await self.db.fetchone(
+            f"SELECT {self._COLUMNS} FROM diet_jobs WHERE id = %s", (job_id,)
+        )
+        return self._job(row) if row else None
+
+    async def find_active(self, key: str, stale_before: float) -> Optional[DietJob]:
+        row = await self.db.fetchone(
+            f"SELECT {self._COLUMNS} FROM diet_jobs "
+            "WHERE dedupe_key = %s AND (status = %s OR (status = %s AND updated_at >= %s)) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (key, QUEUED, RUNNING, stale_before),
+        )
+        return self._job(row) if row else None
+
+    async def claim(self, job_id: str, stale_before: float) -> bool:
+        claimed = await self.db.execute(
+            "UPDATE diet_jobs SET status = %s, updated_at = %s "
+            "WHERE id = %s AND (status = %s OR (status = %s AND updated_at < %s))",
+            (RUNNING, time.time(), job_id, QUEUED, RUNNING, stale_before),
+        )
+        return claimed > 0
+
+    async def heartbeat(self, job_id: str) -> None:
+        await self.db.execute(
+            "UPDATE diet_jobs SET updated_at = %s WHERE id = %s AND status = %s",
+            (time.time(), job_id, RUNNING),
+        )
+
+    async def save(self, job: DietJob) -> None:
+        await self.db.execute(
+            "UPDATE diet_jobs SET status = %s, result = %s, error = %s, "
+            "diet_plan_id = %s, updated_at = %s WHERE id = %s",
+            (
+                job.status,
+                json.dumps(job.result) if job.result is not None else None,
+                job.error,
+                job.diet_plan_id,
+                job.updated_at,
+                job.id,
+            ),
+        )
+
+    async def pending(self, stale_before: float) -> List[DietJob]:
+        rows = await self.db.fetchall(
+            f"SELECT {self._COLUMNS} FROM diet_jobs "
+            "WHERE status = %s OR (status = %s AND updated_at < %s) ORDER BY created_at",
+            (QUEUED, RUNNING, stale_before),
+        )
+        return [self._job(row) for row in rows]
+
+    @staticmethod
+    def _job(row: Dict[str, Any]) -> DietJob:
+        def load(value):
+            return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+        return DietJob(
+            id=row["id"],
+            user_id=row["user_id"],
+            profile=load(row["profile"]),
+            include_workout=bool(row["include_workout"]),
+            dedupe_key=row["dedupe_key"],
+            user_tier=row["user_tier"],
+            status=row["status"],
+            result=load(row["result"]),
+            error=row["error"],
+            diet_plan_id=row["diet_plan_id"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+
+class DietJobQueue:
+    """Queue of diet plan jobs served by a pool of asyncio workers."""
+
+    def __init__(
+        self,
+        generate: Generator,
+        backend: Optional[JobBackend] = None,
+        db: Optional[Database] = None,
+        workers: int = config.DIET_JOB_WORKERS,
+        heartbeat_interval: float = config.DIET_JOB_HEARTBEAT_INTERVAL,
+        stale_after: float = config.DIET_JOB_STALE_AFTER,
+    ):
+        self.generate = generate
+        self.backend = backend or InMemoryJobBackend()
+        self.db = db
+        self.workers = max(1, workers)
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        # Ids currently in _queue, so recovery sweeps do not enqueue a job twice
+        self._queued: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._events: Dict[str, asyncio.Event] = {}
+        # Callers in wait() per job; the event is dropped when the last one leaves
+        self._waiters: Dict[str, int] = {}
+        self._submit_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """
+        Start the workers and re-enqueue jobs left queued by a previous run.
+
+        Jobs left running by a process that died are re-enqueued once their
+        heartbeat is ``stale_after`` seconds old, here and by a periodic sweep.
+        """
+        if self._tasks:
+            return
+        await self.recover()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover_periodically()))
+
+    async def recover(self) -> int:
+        """Enqueue queued and stale running jobs; returns how many were added."""
+        try:
+            jobs = await self.backend.pending(self._stale_before())
+        except Exception as e:
+            logger.warning("Failed to recover diet jobs: %s", e)
+            return 0
+        recovered = 0
+        for job in jobs:
+            if job.id not in self._queued:
+                if job.status == RUNNING:
+                    logger.warning("Recovering diet job %s (no heartbeat since %.0f)", job.id, job.updated_at)
+                self._enqueue(job.id)
+                recovered += 1
+        return recovered
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self,
+        profile: Dict[str, Any],
+        include_workout: bool = True,
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None,
+    ) -> Tuple[DietJob, bool]:
+        """
+        Enqueue a job; returns ``(job, deduplicated)``.
+
+        An identical request from the same user that is still queued or
+        running (with a live heartbeat) is returned instead of starting
+        another generation.
+        """
+        job = DietJob.new(user_id, profile, include_workout, user_tier)
+        async with self._submit_lock:
+            existing = await self.backend.find_active(job.dedupe_key, self._stale_before())
+            if existing is not None:
+                return existing, True
+            await self.backend.create(job)
+        self._enqueue(job.id)
+        return job, False
+
+    async def get(self, job_id: str) -> Optional[DietJob]:
+        return await self.backend.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[DietJob]:
+        """
+        Wait up to ``timeout`` seconds for a job to finish and return it.
+
+        Completion is signalled for jobs run by this process; jobs run by
+        another process are simply re-read once the timeout expires.
+        """
+        if timeout <= 0:
+            return await self.backend.get(job_id)
+        # Register before reading so a completion in between is not missed
+        event = self._events.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            job = await self.backend.get(job_id)
+            if job is not None and not job.done:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                job = await self.backend.get(job_id)
+            return job
+        finally:
+            # Also on timeout or cancellation, so jobs finished elsewhere leave nothing behind
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                if self._events.get(job_id) is event:
+                    del self._events[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "queued": self._queue.qsize(),
+            "backend": type(self.backend).__name__,
+        }
+
+    def _stale_before(self) -> float:
+        return time.time() - self.stale_after
+
+    def _enqueue(self, job_id: str) -> None:
+        self._queued.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def _recover_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.stale_after)
+            await self.recover()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.backend.heartbeat(job_id)
+            except Exception as e:
+                logger.warning("Heartbeat for diet job %s failed: %s", job_id, e)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Diet job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        if not await self.backend.claim(job_id, self._stale_before()):
+            return
+        job = await self.backend.get(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            job.result = await self.generate(
+                job.profile,
+                include_workout=job.include_workout,
+                user_id=job.user_id,
+                user_tier=job.user_tier,
+            )
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            # Shutting down: leave the job for the next start to pick up
+            job.status = QUEUED
+            await self.backend.save(job)
+            raise
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+        else:
+            job.diet_plan_id = await self._persist_plan(job)
+        finally:
+            heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await heartbeat
+        job.updated_at = time.time()
+        await self.backend.save(job)
+
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _persist_plan(self, job: DietJob) -> Optional[int]:
+        """Save a finished plan into ``diet_plans`` for the requesting user."""
+        if self.db is None or job.user_id is None:
+            return None
+        try:
+            return await self.db.insert(
+                "INSERT INTO diet_plans (user_id, plan, created_at, updated_at, is_active) "
+                "VALUES (%s, %s, UTC_TIMESTAMP(), UTC_TIMESTAMP(), TRUE)",
+                (job.user_id, json.dumps(job.result)),
+            )
+        except Exception as e:
+            logger.warning("Failed to save diet plan for job %s: %s", job.id, e)
+            return None
@@ -0,0 +1,109 @@
+"""
+Partial edits of generated diet plans.
+
+Regenerating one day, one meal or the workout half only asks the LLM for
+that section; the rest of the stored plan is reused as is. Calorie and
+macro totals are then recomputed here from the meals instead of trusting
+the model's arithmetic.
+"""
+import copy
+from typing import Any, Dict, List, Optional
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+MACROS = ("protein", "carbs", "fats")
+# Nutrient keys the model uses for each macro (grams)
+MACRO_KEYS = {
+    "protein": ("protein", "protein_grams", "protein_g"),
+    "carbs": ("carbs", "carbs_grams", "carbs_g", "carbohydrates"),
+    "fats": ("fats", "fats_grams", "fats_g", "fat"),
+}
+
+
+class PlanEditError(ValueError):
+    """The requested day or meal does not exist in the plan."""
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().lower().rstrip("gkcal").strip())
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def meal_totals(meal: Dict[str, Any]) -> Dict[str, float]:
+    """Calories and macro grams of one meal."""
+    nutrients = meal.get("nutrients") or {}
+    totals = {"calories": _number(meal.get("calories"))}
+    for macro, keys in MACRO_KEYS.items():
+        totals[macro] = next((_number(nutrients[key]) for key in keys if key in nutrients), 0.0)
+    return totals
+
+
+def recompute_totals(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Set ``daily_totals`` per day and ``weekly_average`` from the meals
+    (in place); returns ``plan``.
+    """
+    daily = {}
+    for day, meals in (plan.get("weekly_plan") or {}).items():
+        totals = dict.fromkeys(("calories",) + MACROS, 0.0)
+        for meal in meals or []:
+            for key, value in meal_totals(meal).items():
+                totals[key] += value
+        daily[day] = {key: round(value, 1) for key, value in totals.items()}
+    plan["daily_totals"] = daily
+    plan["weekly_average"] = {
+        key: round(sum(totals[key] for totals in daily.values()) / len(daily), 1) if daily else 0.0
+        for key in ("calories",) + MACROS
+    }
+    return plan
+
+
+def day_meals(plan: Dict[str, Any], day: str) -> List[Dict[str, Any]]:
+    """The meals of ``day``; raises ``PlanEditError`` for unknown days."""
+    day = day.lower()
+    if day not in DAYS:
+        raise PlanEditError(f"Unknown day: {day}")
+    return list((plan.get("weekly_plan") or {}).get(day) or [])
+
+
+def find_meal(plan: Dict[str, Any], day: str, meal: str) -> Dict[str, Any]:
+    """The first ``meal`` (breakfast, lunch, ...) of ``day``."""
+    for item in day_meals(plan, day):
+        if str(item.get("meal", "")).lower() == meal.lower():
+            return item
+    raise PlanEditError(f"No {meal} on {day.lower()}")
+
+
+def replace_day(plan: Dict[str, Any], day: str, meals: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Copy of ``plan`` with ``day``'s meals replaced and totals recomputed."""
+    day_meals(plan, day)
+    patched = copy.deepcopy(plan)
+    patched.setdefault("weekly_plan", {})[day.lower()] = meals
+    return recompute_totals(patched)
+
+
+def replace_meal(
+    plan: Dict[str, Any],
+    day: str,
+    meal: str,
+    replacement: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Copy of ``plan`` with one meal of ``day`` replaced and totals recomputed."""
+    find_meal(plan, day, meal)
+    patched = copy.deepcopy(plan)
+    meals = patched["weekly_plan"][day.lower()]
+    index = next(i for i, item in enumerate(meals) if str(item.get("meal", "")).lower() == meal.lower())
+    meals[index] = dict(replacement, meal=meals[index].get("meal", meal))
+    return recompute_totals(patched)
+
+
+def replace_workout(plan: Dict[str, Any], workout: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Copy of ``plan`` with the workout plan replaced; meals are untouched."""
+    patched = copy.deepcopy(plan)
+    patched["workout_plan"] = workout
+    return patched
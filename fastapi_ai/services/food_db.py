@@ -0,0 +1,263 @@
+"""
+Offline food-composition database with an in-memory search index.
+
+Foods are loaded from a CSV of per-100g nutrient values (the bundled
+``data/foods.csv`` or a USDA FoodData Central import produced by
+``python -m fastapi_ai.scripts.import_fdc``). Queries are resolved through
+an exact-match hash on the normalized token sequence and, failing that, a
+trigram inverted index scored by Dice similarity. Word order matters
+("chocolate milk" is not "milk chocolate"), fuzzy matches must share the
+head noun ("rice" prefers cooked rice to rice cakes), and the comma style
+of the dataset is understood: "grilled chicken breast" exactly matches
+"Chicken breast, grilled".
+"""
+import csv
+import re
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .. import config
+
+NUTRIENT_FIELDS = ("protein", "carbs", "fats", "fiber", "sugar")
+
+_NON_WORD = re.compile(r"[^a-z0-9\s]")
+_STOPWORDS = frozenset({"a", "an", "and", "of", "the", "with", "in", "fresh", "plain"})
+# "200g" / "150 grams": values are per 100g, so these are scaled
+_GRAMS = re.compile(r"(?<![\w.])(\d+(?:\.\d+)?)\s*(?:g|grams?)\b", re.I)
+# Any other amount ("1 banana", "2 cups rice", "half an avocado") is left to
+# the APIs, which know serving weights; percentages and ranges are not amounts
+_AMOUNT = re.compile(
+    r"(?<![\d.%-])\d+(?:\.\d+)?(?![\d.%-])"
+    r"|\b(?:oz|ounces?|lbs?|pounds?|kg|ml|cups?|tbsp|tsp|tablespoons?|teaspoons?"
+    r"|slices?|pieces?|servings?|bowls?|handfuls?|half|dozen)\b",
+    re.I,
+)
+# Rough weights for estimates when no API can resolve an amount; volumes as water
+_UNIT = re.compile(
+    r"(?<![\w.])(?:(\d+(?:\.\d+)?)\s*)?"
+    r"(oz|ounces?|lbs?|pounds?|kg|ml|cups?|tbsp|tsp|tablespoons?|teaspoons?)\b",
+    re.I,
+)
+_UNIT_GRAMS = {
+    "oz": 28.35, "ounce": 28.35, "lb": 453.6, "lbs": 453.6, "pound": 453.6, "kg": 1000, "ml": 1,
+    "cup": 240, "tbsp": 15, "tablespoon": 15, "tsp": 5, "teaspoon": 5,
+}
+# Fuzzy scores are scaled by this when the head nouns differ
+HEAD_MISMATCH_FACTOR = 0.6
+
+
+class FoodRecord(NamedTuple):
+    """A single food with nutrient values per 100g."""
+    name: str
+    category: str
+    calories: float
+    protein: float
+    carbs: float
+    fats: float
+    fiber: float
+    sugar: float
+
+
+def _singular(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("oes", "ches", "shes", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip punctuation, drop stopwords and singularize."""
+    tokens = _NON_WORD.sub(" ", text.lower()).split()
+    return [_singular(t) for t in tokens if t not in _STOPWORDS]
+
+
+def word_orders(text: str) -> List[Tuple[str, ...]]:
+    """
+    Token sequences ``text`` is written as: as given and, for
+    ``"Head, modifier"`` names, with the modifiers moved in front.
+    """
+    orders = [tuple(tokenize(text))]
+    segments = text.split(",")
+    if len(segments) > 1:
+        reordered = tuple(tokenize(" ".join(reversed(segments))))
+        if reordered != orders[0]:
+            orders.append(reordered)
+    return orders
+
+
+def _in_order(query: Tuple[str, ...], candidate: Tuple[str, ...]) -> float:
+    """Share of the words both have in common that appear in the same order."""
+    positions = {}
+    for i, token in enumerate(candidate):
+        positions.setdefault(token, i)
+    sequence = [positions[token] for token in query if token in positions]
+    if len(sequence) < 2:
+        return 1.0
+    # Longest increasing subsequence
+    longest = [1] * len(sequence)
+    for i in range(len(sequence)):
+        for j in range(i):
+            if sequence[j] < sequence[i]:
+                longest[i] = max(longest[i], longest[j] + 1)
+    return max(longest) / len(sequence)
+
+
+def _same_head(query: Tuple[str, ...], orders: List[Tuple[str, ...]]) -> bool:
+    """
+    Whether the last word of ``query`` and of the modifier-first form of a
+    name (its head noun) are the same word, allowing for typos.
+    """
+    head, candidate = query[-1], orders[-1][-1]
+    if head == candidate:
+        return True
+    shared = len(_trigrams([head]) & _trigrams([candidate]))
+    return 2.0 * shared / (len(_trigrams([head])) + len(_trigrams([candidate]))) >= 0.5
+
+
+def _trigrams(tokens: List[str]) -> frozenset:
+    grams = set()
+    for token in tokens:
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class FoodCompositionDB:
+    """Indexed, read-only collection of food records."""
+
+    def __init__(self, records: List[FoodRecord]):
+        self.records = records
+        self._exact: Dict[Tuple[str, ...], int] = {}
+        self._trigrams: Dict[str, List[int]] = defaultdict(list)
+        self._sizes: List[int] = []
+        self._orders: List[List[Tuple[str, ...]]] = []
+        for idx, record in enumerate(records):
+            orders = word_orders(record.name)
+            for order in orders:
+                self._exact.setdefault(order, idx)
+            self._orders.append(orders)
+            grams = _trigrams(list(orders[0]))
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._trigrams[gram].append(idx)
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "FoodCompositionDB":
+        """Load records from a CSV with ``description,category`` and nutrient columns."""
+        records = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                records.append(FoodRecord(
+                    name=row["description"],
+                    category=row.get("category") or "other",
+                    calories=float(row["calories"] or 0),
+                    **{field: float(row.get(field) or 0) for field in NUTRIENT_FIELDS},
+                ))
+        return cls(records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def search(self, query: str) -> Optional[Tuple[FoodRecord, float]]:
+        """
+        Find the closest food to ``query``.
+
+        Returns ``(record, score)`` where score is 1.0 for an exact match of
+        the word sequence and otherwise the trigram Dice coefficient scaled
+        by how much of the shared words are in the same order and by
+        ``HEAD_MISMATCH_FACTOR`` when the head nouns differ, or None when no
+        trigram is shared.
+        """
+        orders = word_orders(query)
+        if not orders[0]:
+            return None
+        for order in orders:
+            idx = self._exact.get(order)
+            if idx is not None:
+                return self.records[idx], 1.0
+
+        grams = _trigrams(list(orders[0]))
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                overlap[candidate] += 1
+        if not overlap:
+            return None
+
+        query_size = len(grams)
+        best_idx, best_score = -1, 0.0
+        for candidate, shared in overlap.items():
+            score = 2.0 * shared / (query_size + self._sizes[candidate])
+            if score <= best_score:
+                continue
+            score *= max(
+                _in_order(query_order, order)
+                for query_order in orders
+                for order in self._orders[candidate]
+            )
+            if not _same_head(orders[0], self._orders[candidate]):
+                score *= HEAD_MISMATCH_FACTOR
+            if score > best_score:
+                best_idx, best_score = candidate, score
+        return self.records[best_idx], best_score
+
+    def analyze(self, query: str, min_score: float) -> Optional[Dict[str, Any]]:
+        """
+        Nutrition for ``query`` in the NutritionService result format.
+
+        Gram amounts ("chicken breast 200g") scale the per-100g values;
+        queries with any other amount are not answered locally.
+        """
+        grams, query = _grams(query)
+        if _AMOUNT.search(query) or grams == 0:
+            return None
+        return self._nutrition(query, grams, min_score)
+
+    def estimate(self, query: str, min_score: float) -> Optional[Dict[str, Any]]:
+        """
+        Like ``analyze``, for when no API can resolve the amount: weights and
+        common volumes are converted to grams, and counts ("2 eggs") are
+        dropped, giving the per-100g values.
+        """
+        grams, query = _grams(query)
+        if grams is None:
+            unit = _UNIT.search(query)
+            if unit is not None:
+                grams = float(unit.group(1) or 1) * _UNIT_GRAMS[_singular(unit.group(2).lower())]
+                query = query[:unit.start()] + query[unit.end():]
+        if grams == 0:
+            return None
+        return self._nutrition(_AMOUNT.sub(" ", query), grams, min_score)
+
+    def _nutrition(self, query: str, grams: Optional[float], min_score: float) -> Optional[Dict[str, Any]]:
+        match = self.search(query)
+        if match is None or match[1] < min_score:
+            return None
+        record, score = match
+        factor = grams / 100 if grams is not None else 1
+        return {
+            "name": record.name,
+            "calories": round(record.calories * factor, 2),
+            "nutrients": {field: round(getattr(record, field) * factor, 2) for field in NUTRIENT_FIELDS},
+            "serving_size": f"{grams:g}g" if grams is not None else "100g",
+            "match_score": round(score, 3),
+        }
+
+
+def _grams(query: str) -> Tuple[Optional[float], str]:
+    """Gram amount in ``query``, if any, and the query without it."""
+    amount = _GRAMS.search(query)
+    if amount is None:
+        return None, query
+    return float(amount.group(1)), query[:amount.start()] + query[amount.end():]
+
+
+@lru_cache(maxsize=1)
+def load_default() -> FoodCompositionDB:
+    """The configured food-composition dataset, loaded and indexed once."""
+    return FoodCompositionDB.from_csv(Path(config.FOOD_DB_PATH))
@@ -0,0 +1,137 @@
+"""
+Geographic helpers: great-circle distance and geohash tiling.
+"""
+import math
+from typing import List, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = 111320.0
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Tile precisions considered when covering a search circle
+# (precision 7 cells are ~150m across, precision 3 cells ~156km)
+MIN_TILE_PRECISION = 3
+MAX_TILE_PRECISION = 7
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 9) -> str:
+    """Geohash of a point at the given precision (characters)."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Bounding box of a geohash cell as ``(lat_min, lat_max, lng_min, lng_max)``."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lng_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Height and width in degrees of a geohash cell at ``precision``."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def tile_center(geohash: str) -> Tuple[float, float]:
+    lat_min, lat_max, lng_min, lng_max = geohash_bounds(geohash)
+    return (lat_min + lat_max) / 2, (lng_min + lng_max) / 2
+
+
+def tile_radius_m(geohash: str) -> float:
+    """Distance from a tile's center to its farthest corner, in meters."""
+    lat_min, lat_max, lng_min, lng_max = geohash_bounds(geohash)
+    center_lat, center_lng = tile_center(geohash)
+    return max(
+        haversine_m(center_lat, center_lng, lat, lng)
+        for lat in (lat_min, lat_max)
+        for lng in (lng_min, lng_max)
+    )
+
+
+def covering_tiles(lat: float, lng: float, radius_m: float, max_tiles: int = 4) -> List[str]:
+    """
+    Geohash tiles covering the bounding box of a search circle.
+
+    Starts from the coarsest precision whose tiles are no wider than the
+    search (so each tile query returns results as dense as a direct search)
+    and coarsens until the cover needs at most ``max_tiles`` tiles.
+    Neighbouring searches with similar radii resolve to the same tiles.
+    """
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlng = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    precision = MAX_TILE_PRECISION
+    while precision > MIN_TILE_PRECISION and _cell_radius_m(lat, precision - 1) <= 1.5 * radius_m:
+        precision -= 1
+
+    while True:
+        lat_step, lng_step = cell_size(precision)
+        rows = range(
+            math.floor((max(lat - dlat, -90.0) + 90) / lat_step),
+            math.floor((min(lat + dlat, 90.0) + 90) / lat_step) + 1,
+        )
+        cols = range(
+            math.floor((lng - dlng + 180) / lng_step),
+            math.floor((lng + dlng + 180) / lng_step) + 1,
+        )
+        if len(rows) * len(cols) <= max_tiles or precision == MIN_TILE_PRECISION:
+            break
+        precision -= 1
+
+    tiles = set()
+    for row in rows:
+        center_lat = min(-90 + (row + 0.5) * lat_step, 90.0)
+        for col in cols:
+            # Wrap across the antimeridian
+            center_lng = (-180 + (col + 0.5) * lng_step + 180) % 360 - 180
+            tiles.add(geohash_encode(center_lat, center_lng, precision))
+    return sorted(tiles)
+
+
+def _cell_radius_m(lat: float, precision: int) -> float:
+    """Approximate half-diagonal of a geohash cell at ``lat``, in meters."""
+    lat_step, lng_step = cell_size(precision)
+    height = lat_step * METERS_PER_DEGREE_LAT
+    width = lng_step * METERS_PER_DEGREE_LAT * math.cos(math.radians(lat))
+    return math.hypot(height, width) / 2
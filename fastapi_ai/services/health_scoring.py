@@ -0,0 +1,151 @@
+"""
+Health scoring for restaurants.
+
+Restaurant names, Google place types and any menu or description text are
+matched against a weighted lexicon (``data/healthy_lexicon.csv``) compiled
+once into a single regex automaton. A whole candidate list is scored in one
+pass: the texts are joined into one buffer, scanned once, and matches are
+mapped back to their restaurant and summed with NumPy.
+"""
+import csv
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .. import config
+
+# Restaurant fields scanned for lexicon terms
+TEXT_FIELDS = ("name", "types", "menu", "description", "editorial_summary")
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+# Never produced by normalize(), so matches cannot span two restaurants
+_SEPARATOR = "|"
+
+
+class LexiconTerm(NamedTuple):
+    """A lexicon entry: matched phrase, score weight and suggested option."""
+    term: str
+    weight: float
+    option: str
+
+
+class HealthScore(NamedTuple):
+    score: float
+    healthy_options: List[str]
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse punctuation/underscores ("Plant-Based" -> "plant based")."""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+class HealthScorer:
+    """Weighted-lexicon scorer compiled to a single regex."""
+
+    def __init__(self, terms: List[LexiconTerm]):
+        self.terms = {}
+        for entry in terms:
+            self.terms[normalize(entry.term)] = entry
+        self._term_ids = {term: i for i, term in enumerate(self.terms)}
+        self._weights = np.array([entry.weight for entry in self.terms.values()], dtype=np.float64)
+        self._options = [entry.option for entry in self.terms.values()]
+        # Longest alternatives first so "juice bar" wins over "juice" and "bar"
+        alternation = "|".join(
+            re.escape(term) for term in sorted(self.terms, key=len, reverse=True)
+        )
+        self._pattern = re.compile(rf"\b(?:{alternation})\b")
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "HealthScorer":
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls([
+                LexiconTerm(row["term"], float(row["weight"]), row.get("option") or "")
+                for row in csv.DictReader(f)
+            ])
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def score_all(self, restaurants: List[Dict[str, Any]]) -> List[HealthScore]:
+        """Score every restaurant in one scan; each term counts once per restaurant."""
+        if not restaurants:
+            return []
+        texts = [_restaurant_text(restaurant) for restaurant in restaurants]
+        buffer = _SEPARATOR.join(texts)
+        # Start offset of each restaurant's text within the buffer
+        offsets = np.cumsum([0] + [len(text) + 1 for text in texts[:-1]])
+
+        starts = []
+        term_ids = []
+        for match in self._pattern.finditer(buffer):
+            starts.append(match.start())
+            term_ids.append(self._term_ids[match.group()])
+        if not starts:
+            return [HealthScore(0.0, []) for _ in restaurants]
+
+        owners = np.searchsorted(offsets, np.array(starts), side="right") - 1
+        term_ids = np.array(term_ids)
+        # Drop repeats of the same term within one restaurant
+        pairs = np.unique(owners * len(self.terms) + term_ids)
+        owners, term_ids = np.divmod(pairs, len(self.terms))
+        scores = np.bincount(owners, weights=self._weights[term_ids], minlength=len(restaurants))
+
+        options: List[Dict[str, float]] = [{} for _ in restaurants]
+        for owner, term_id in zip(owners.tolist(), term_ids.tolist()):
+            weight = self._weights[term_id]
+            option = self._options[term_id]
+            if option and weight > 0:
+                options[owner][option] = max(options[owner].get(option, 0.0), weight)
+        return [
+            HealthScore(
+                round(float(score), 2),
+                sorted(found, key=lambda option: -found[option]),
+            )
+            for score, found in zip(scores, options)
+        ]
+
+    def rank(
+        self,
+        restaurants: List[Dict[str, Any]],
+        min_score: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Attach ``health_score`` and ``healthy_options`` and rank by score.
+
+        Restaurants scoring below ``min_score`` are dropped; ties keep their
+        incoming order (nearest first).
+        """
+        min_score = config.HEALTH_SCORE_MIN if min_score is None else min_score
+        ranked = []
+        for restaurant, result in zip(restaurants, self.score_all(restaurants)):
+            if result.score < min_score:
+                continue
+            restaurant['health_score'] = result.score
+            restaurant['healthy_options'] = result.healthy_options
+            ranked.append(restaurant)
+        ranked.sort(key=lambda restaurant: -restaurant['health_score'])
+        return ranked
+
+
+def _restaurant_text(restaurant: Dict[str, Any]) -> str:
+    parts = []
+    for field in TEXT_FIELDS:
+        value = restaurant.get(field)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            parts.extend(str(item) for item in value)
+        elif isinstance(value, dict):
+            parts.extend(str(item) for item in value.values())
+        else:
+            parts.append(str(value))
+    return normalize(" ".join(parts))
+
+
+@lru_cache(maxsize=1)
+def load_default() -> HealthScorer:
+    """The configured lexicon, compiled once."""
+    return HealthScorer.from_csv(Path(config.HEALTH_LEXICON_PATH))
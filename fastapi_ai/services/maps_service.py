@@ -1,63 +1,147 @@
 """
 Google Maps service for finding healthy restaurants.
 """
+import asyncio
+import logging
 import os
-import httpx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from .. import config
+from ..http_clients import HTTPClients, GOOGLE_PLACES
+from ..resilience import Resilience
+from .health_scoring import HealthScorer, load_default as load_health_scorer
+from .geo import covering_tiles, geohash_encode, haversine_m, tile_center, tile_radius_m
+from .restaurant_cache import RestaurantCache
+from .spatial_index import SpatialIndex
+
+logger = logging.getLogger(__name__)
 
 
 class MapsService:
     """Service for Google Maps API interactions."""
     
-    def __init__(self):
+    # Google Places Nearby Search rejects larger radii
+    MAX_SEARCH_RADIUS = 50000
+    
+    def __init__(
+        self,
+        http_clients: Optional[HTTPClients] = None,
+        cache: Optional[RestaurantCache] = None,
+        index: Optional[SpatialIndex] = None,
+        scorer: Optional[HealthScorer] = None,
+        resilience: Optional[Resilience] = None
+    ):
+        self.http_clients = http_clients or HTTPClients()
+        self.resilience = resilience or Resilience()
+        self.cache = cache
+        self.index = index
+        self.scorer = scorer or load_health_scorer()
+        self.local_min_results = config.RESTAURANT_LOCAL_MIN_RESULTS
         self.google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
         self.places_api_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
         self.details_api_url = "https://maps.googleapis.com/maps/api/place/details/json"
+        self.details_concurrency = config.PLACES_DETAILS_CONCURRENCY
+        self.details_deadline = config.PLACES_DETAILS_DEADLINE
     
     async def find_healthy_restaurants(
         self,
         latitude: float,
         longitude: float,
-        radius: int = 5000
+        radius: int = 5000,
+        include_details: bool = True,
+        k: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Find nearby healthy restaurants using Google Maps API.
         
+        Stored restaurants are searched locally first; Google Places is only
+        called when the local index has too few places in range.
+        
         Args:
             latitude: Latitude coordinate
             longitude: Longitude coordinate
             radius: Search radius in meters
+            include_details: Fetch phone, website and opening hours per place
+            k: Return only the k nearest healthy restaurants within the radius
             
         Returns:
-            List of restaurant dictionaries with healthy options
+            List of restaurant dictionaries with healthy options and
+            ``distance_m``, ranked by health score (nearest first on ties),
+            or nearest first when ``k`` is given
         """
-        if not self.google_maps_api_key:
+        restaurants = self._search_local(latitude, longitude, radius, k)
+        if restaurants is None and not self.google_maps_api_key:
             # Return mock data if API key is not available
             return self._get_mock_restaurants(latitude, longitude)
         
         try:
             # Search for restaurants
-            restaurants = await self._search_restaurants(latitude, longitude, radius)
+            if restaurants is not None:
+                if include_details and self.google_maps_api_key:
+                    await self._attach_place_details(restaurants)
+            else:
+                if self.cache is not None:
+                    restaurants = await self._search_tiles(
+                        latitude, longitude, radius, include_details=include_details
+                    )
+                else:
+                    restaurants = await self._search_restaurants(
+                        latitude, longitude, radius, include_details=include_details
+                    )
+                if self.index is not None:
+                    self.index.upsert_many(restaurants)
+            
+            # Nearest first, so equal health scores stay in distance order
+            restaurants = sorted((
+                restaurant if 'distance_m' in restaurant
+                else dict(restaurant, distance_m=round(haversine_m(
+                    latitude, longitude,
+                    restaurant['location']['latitude'], restaurant['location']['longitude'],
+                )))
+                for restaurant in restaurants
+            ), key=lambda r: r['distance_m'])
             
-            # Filter and enhance with healthy options
-            healthy_restaurants = []
-            for restaurant in restaurants:
-                healthy_options = await self._identify_healthy_options(restaurant)
-                if healthy_options:  # Only include restaurants with healthy options
-                    restaurant['healthy_options'] = healthy_options
-                    healthy_restaurants.append(restaurant)
+            # Score, filter and rank by healthiness in one pass
+            healthy_restaurants = self.scorer.rank(restaurants)
             
+            if k:
+                # The k nearest of the healthy ones, not the k healthiest
+                return sorted(healthy_restaurants, key=lambda r: r['distance_m'])[:k]
             return healthy_restaurants[:20]  # Limit to 20 results
         except Exception as e:
             # Fallback to mock data on error
             print(f"Error fetching restaurants: {e}")
             return self._get_mock_restaurants(latitude, longitude)
     
+    def _search_local(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        k: Optional[int] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Answer from the in-process spatial index, nearest first.
+        
+        Returns None when there is no index or coverage is too thin (fewer
+        than ``k``, or ``local_min_results``, places within the radius).
+        """
+        if self.index is None:
+            return None
+        if k:
+            matches = self.index.nearest(latitude, longitude, k, max_distance_m=radius)
+        else:
+            matches = self.index.within(latitude, longitude, radius)[:20]
+        if len(matches) < (k or self.local_min_results):
+            return None
+        return [dict(place, distance_m=round(distance)) for distance, place in matches]
+    
     async def _search_restaurants(
         self,
         latitude: float,
         longitude: float,
-        radius: int
+        radius: int,
+        include_details: bool = True
     ) -> List[Dict[str, Any]]:
         """Search for restaurants using Google Places API."""
         params = {
@@ -68,33 +152,128 @@ class MapsService:
             "key": self.google_maps_api_key,
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.places_api_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            restaurants = []
-            for place in data.get('results', [])[:20]:
-                restaurant = {
-                    "place_id": place.get('place_id'),
-                    "name": place.get('name'),
-                    "rating": place.get('rating'),
-                    "price_level": place.get('price_level'),
-                    "location": {
-                        "latitude": place['geometry']['location']['lat'],
-                        "longitude": place['geometry']['location']['lng'],
-                    },
-                    "address": place.get('vicinity', ''),
-                }
-                
-                # Get more details
-                details = await self._get_place_details(place.get('place_id'))
-                if details:
-                    restaurant.update(details)
-                
-                restaurants.append(restaurant)
-            
-            return restaurants
+        data = await self._get_json(self.places_api_url, params)
+        
+        restaurants = []
+        for place in data.get('results', [])[:20]:
+            restaurant = {
+                "place_id": place.get('place_id'),
+                "name": place.get('name'),
+                "rating": place.get('rating'),
+                "price_level": place.get('price_level'),
+                "location": {
+                    "latitude": place['geometry']['location']['lat'],
+                    "longitude": place['geometry']['location']['lng'],
+                },
+                "address": place.get('vicinity', ''),
+                "types": place.get('types', []),
+            }
+            restaurants.append(restaurant)
+        
+        if include_details:
+            await self._attach_place_details(restaurants)
+        
+        return restaurants
+    
+    async def _search_tiles(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: int,
+        include_details: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Search via cached geohash tiles.
+        
+        The tiles covering the search circle are loaded (from cache or one
+        Places search each), merged, filtered by exact distance and ordered
+        nearest first.
+        """
+        tiles = covering_tiles(latitude, longitude, radius, config.MAPS_MAX_TILES_PER_SEARCH)
+        results = await asyncio.gather(
+            *(self.cache.get_tile(tile, self._fetch_tile) for tile in tiles),
+            return_exceptions=True,
+        )
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if len(failures) == len(results):
+            raise failures[0]
+        if failures:
+            logger.warning("%d of %d restaurant tiles failed to load", len(failures), len(tiles))
+        
+        nearby = {}
+        for places in results:
+            if isinstance(places, BaseException):
+                continue
+            for place in places:
+                location = place['location']
+                distance = haversine_m(latitude, longitude, location['latitude'], location['longitude'])
+                if distance <= radius and place['place_id'] not in nearby:
+                    # Copy so per-request fields never leak into the cached tile
+                    nearby[place['place_id']] = dict(place, distance_m=round(distance))
+        
+        restaurants = sorted(nearby.values(), key=lambda r: r['distance_m'])[:20]
+        if include_details:
+            await self._attach_place_details(restaurants)
+        return restaurants
+    
+    async def _fetch_tile(self, tile: str) -> List[Dict[str, Any]]:
+        """Places search around a tile, keeping only places inside it."""
+        center_lat, center_lng = tile_center(tile)
+        radius = min(round(tile_radius_m(tile)), self.MAX_SEARCH_RADIUS)
+        places = await self._search_restaurants(center_lat, center_lng, radius, include_details=False)
+        return [
+            place for place in places
+            if place.get('place_id') and geohash_encode(
+                place['location']['latitude'], place['location']['longitude'], len(tile)
+            ) == tile
+        ]
+    
+    async def _attach_place_details(self, restaurants: List[Dict[str, Any]]) -> None:
+        """
+        Fetch place details concurrently and merge them into each restaurant.
+        
+        At most ``details_concurrency`` requests are in flight at once. Lookups
+        still running when ``details_deadline`` expires are cancelled, and the
+        affected restaurants are returned without details. With a cache,
+        known places are answered from it and only the rest are fetched.
+        """
+        semaphore = asyncio.Semaphore(self.details_concurrency)
+        
+        async def fetch(restaurant: Dict[str, Any]) -> None:
+            async with semaphore:
+                details = await self._get_place_details(restaurant['place_id'])
+            if details:
+                restaurant.update(details)
+                if self.cache is not None:
+                    await self.cache.set_details(restaurant['place_id'], details)
+            restaurant['details_loaded'] = True
+        
+        cached = {}
+        if self.cache is not None:
+            cached = await self.cache.get_details(
+                r['place_id'] for r in restaurants if r.get('place_id')
+            )
+        
+        tasks = []
+        for restaurant in restaurants:
+            restaurant['details_loaded'] = False
+            if restaurant.get('place_id') in cached:
+                restaurant.update(cached[restaurant['place_id']])
+                restaurant['details_loaded'] = True
+            elif restaurant.get('place_id'):
+                tasks.append(asyncio.create_task(fetch(restaurant)))
+        if not tasks:
+            return
+        
+        _, pending = await asyncio.wait(tasks, timeout=self.details_deadline)
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(
+                "Place details deadline of %ss exceeded; %d of %d lookups skipped",
+                self.details_deadline, len(pending), len(tasks),
+            )
     
     async def _get_place_details(self, place_id: str) -> Dict[str, Any]:
         """Get detailed information about a place."""
@@ -105,41 +284,27 @@ class MapsService:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(self.details_api_url, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                result = data.get('result', {})
-                return {
-                    "phone": result.get('formatted_phone_number', ''),
-                    "website": result.get('website', ''),
-                    "opening_hours": result.get('opening_hours', {}).get('weekday_text', []),
-                }
+            data = await self._get_json(self.details_api_url, params)
+            
+            result = data.get('result', {})
+            return {
+                "phone": result.get('formatted_phone_number', ''),
+                "website": result.get('website', ''),
+                "opening_hours": result.get('opening_hours', {}).get('weekday_text', []),
+            }
         except Exception:
             return {}
     
-    async def _identify_healthy_options(self, restaurant: Dict[str, Any]) -> List[str]:
-        """
-        Identify healthy menu options for a restaurant.
-        In a real implementation, this would use restaurant menu APIs or web scraping.
-        """
-        # Common healthy keywords
-        healthy_keywords = [
-            "grilled", "steamed", "salad", "vegetable", "fruit",
-            "whole grain", "lean protein", "organic", "fresh",
-            "low-fat", "low-calorie", "plant-based", "vegan", "vegetarian"
-        ]
+    async def _get_json(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """GET a Places endpoint through the Google Places circuit breaker and retry budget."""
+        client = self.http_clients.get(GOOGLE_PLACES)
         
-        # For now, return generic healthy options based on restaurant type
-        # In production, integrate with menu APIs or use AI to analyze menus
-        return [
-            "Grilled Chicken Salad",
-            "Quinoa Bowl with Vegetables",
-            "Fresh Fruit Smoothie",
-            "Steamed Vegetables with Brown Rice",
-            "Lean Protein Options"
-        ]
+        async def get():
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            return response.json()
+        
+        return await self.resilience.get(GOOGLE_PLACES).call(get)
     
     def _get_mock_restaurants(
         self,
@@ -0,0 +1,287 @@
+"""
+Deterministic local diet planner.
+
+Calorie and macro targets come from the Mifflin-St Jeor BMR, an activity
+factor and the user's goals. Meals are then assembled from the food-
+composition database: each meal slot is a template of food categories
+(e.g. lunch = protein + grain + vegetable), every combination of foods for
+the slot is enumerated at once, and portion sizes are fitted to the slot's
+macro targets by batched least squares in NumPy. The best combination per
+slot and day wins, with a penalty on foods eaten in the last days so the
+week varies. No LLM is involved, so a week is planned in milliseconds.
+
+Only the most nutrient-dense ``DIET_PLANNER_POOL_SIZE`` foods of each
+category take part, and a slot's pools are trimmed further if their
+product would exceed ``DIET_PLANNER_MAX_COMBOS``, so a large imported food
+database does not blow up the enumeration.
+"""
+import itertools
+import logging
+import math
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from .. import config
+from .diet_plan_edits import DAYS, recompute_totals
+from .food_db import FoodCompositionDB, FoodRecord
+
+logger = logging.getLogger(__name__)
+
+# Mifflin-St Jeor sex offsets; unknown gender uses the midpoint
+BMR_GENDER_OFFSET = {"male": 5, "female": -161}
+DEFAULT_BMR_OFFSET = -78
+ACTIVITY_FACTORS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9,
+}
+DEFAULT_ACTIVITY = "light"
+# Used when the profile leaves a field out
+DEFAULT_PROFILE = {"age": 30, "height": 170.0, "weight": 70.0}
+MIN_CALORIES = 1200
+
+# slot -> (share of daily calories, one category group per component)
+SLOTS = (
+    ("breakfast", 0.25, (("grain",), ("dairy", "protein"), ("fruit",))),
+    ("lunch", 0.30, (("protein", "legume"), ("grain",), ("vegetable",))),
+    ("snack", 0.075, (("dairy", "nut_seed"), ("fruit",))),
+    ("dinner", 0.30, (("protein", "legume"), ("grain", "vegetable"), ("vegetable",))),
+    ("snack", 0.075, (("dairy", "nut_seed"), ("fruit",))),
+)
+# Portion bounds in grams per category
+PORTION_GRAMS = {
+    "protein": (60, 250),
+    "legume": (80, 300),
+    "grain": (30, 250),
+    "vegetable": (60, 300),
+    "fruit": (80, 250),
+    "dairy": (30, 300),
+    "nut_seed": (15, 40),
+}
+# Foods never picked by the planner
+EXCLUDED_FOODS = frozenset({"Bacon, cooked", "Lemon", "Whey protein powder"})
+# Added to a combination's error per food eaten within VARIETY_DAYS
+VARIETY_PENALTY = 0.5
+VARIETY_DAYS = 2
+VARIETY_CANDIDATES = 500
+PORTION_STEP = 5
+RIDGE = 1e-9
+
+
+class NutritionTargets(NamedTuple):
+    bmr: float
+    tdee: float
+    calories: float
+    protein: float
+    carbs: float
+    fats: float
+
+
+def nutrition_targets(profile: Dict[str, Any]) -> NutritionTargets:
+    """BMR, TDEE and daily calorie and macro (gram) targets for a profile."""
+    goals = profile.get("goals") or {}
+    age = profile.get("age") or DEFAULT_PROFILE["age"]
+    height = profile.get("height") or DEFAULT_PROFILE["height"]
+    weight = profile.get("weight") or DEFAULT_PROFILE["weight"]
+    gender = str(profile.get("gender") or "").lower()
+
+    bmr = 10 * weight + 6.25 * height - 5 * age + BMR_GENDER_OFFSET.get(gender, DEFAULT_BMR_OFFSET)
+    activity = goals.get("activity_level", DEFAULT_ACTIVITY) if isinstance(goals, dict) else DEFAULT_ACTIVITY
+    tdee = bmr * ACTIVITY_FACTORS.get(activity, ACTIVITY_FACTORS[DEFAULT_ACTIVITY])
+
+    wants = (lambda goal: bool(goals.get(goal))) if isinstance(goals, dict) else (lambda goal: goal in goals)
+    calories = tdee
+    protein_per_kg = 1.6
+    if wants("weight_loss"):
+        calories -= 500
+        protein_per_kg = 1.8
+    elif wants("muscle_gain"):
+        calories += 300
+        protein_per_kg = 2.0
+    calories = max(calories, MIN_CALORIES)
+
+    protein = protein_per_kg * weight
+    fats = 0.25 * calories / 9
+    carbs = max(calories - protein * 4 - fats * 9, 0) / 4
+    return NutritionTargets(*(round(value) for value in (bmr, tdee, calories, protein, carbs, fats)))
+
+
+class _Candidates(NamedTuple):
+    """Food combinations for a slot template (profile independent)."""
+    combos: np.ndarray  # (n, k) food indices
+    low: np.ndarray  # (n, k) portion bounds in grams
+    high: np.ndarray
+    nutrients: np.ndarray  # (n, k, 4) per gram
+    outer: np.ndarray  # (n, k, k, 4)
+
+
+class _SlotFit(NamedTuple):
+    """Every food combination for a slot with fitted portions and target error."""
+    combos: np.ndarray  # (n, k) food indices
+    grams: np.ndarray  # (n, k)
+    error: np.ndarray  # (n,)
+
+
+class MealPlanner:
+    """Weekly meal plans from the food-composition database."""
+
+    def __init__(
+        self,
+        food_db: FoodCompositionDB,
+        tolerance: float = config.DIET_PLANNER_TOLERANCE,
+        pool_size: int = config.DIET_PLANNER_POOL_SIZE,
+        max_combos: int = config.DIET_PLANNER_MAX_COMBOS,
+    ):
+        self.tolerance = tolerance
+        self.max_combos = max_combos
+        self.foods: List[FoodRecord] = [
+            record for record in food_db.records if record.name not in EXCLUDED_FOODS
+        ]
+        # Per gram: calories, protein, carbs, fats
+        self._per_gram = np.array(
+            [(r.calories, r.protein, r.carbs, r.fats) for r in self.foods], dtype=np.float64
+        ) / 100
+        self._by_category: Dict[str, List[int]] = {}
+        for i, record in enumerate(self.foods):
+            self._by_category.setdefault(record.category, []).append(i)
+        self._density = np.array([_nutrient_density(record) for record in self.foods])
+        for category, indices in self._by_category.items():
+            if len(indices) > pool_size:
+                self._by_category[category] = self._densest(indices, pool_size)
+        # Candidate combinations depend only on the templates, so enumerate them once
+        self._candidates = {
+            groups: self._enumerate(groups) for _, _, groups in SLOTS
+        }
+
+    def plan(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """A 7-day plan in the same format as LLM-generated plans."""
+        targets = nutrition_targets(profile)
+        daily = np.array([targets.calories, targets.protein, targets.carbs, targets.fats])
+        fits = {}
+        for name, share, groups in SLOTS:
+            if (share, groups) not in fits:
+                fits[(share, groups)] = self._fit(groups, daily * share)
+
+        last_eaten = np.full(len(self.foods), -VARIETY_DAYS - 1)
+        weekly_plan = {}
+        for day_index, day in enumerate(DAYS):
+            meals = []
+            for name, share, groups in SLOTS:
+                fit = fits[(share, groups)]
+                recent = (day_index - last_eaten[fit.combos]) <= VARIETY_DAYS
+                best = int(np.argmin(fit.error + VARIETY_PENALTY * recent.sum(axis=1)))
+                last_eaten[fit.combos[best]] = day_index
+                meals.append(self._meal(name, fit.combos[best], fit.grams[best]))
+            weekly_plan[day] = meals
+
+        plan = recompute_totals({
+            "daily_calorie_target": targets.calories,
+            "macros": {
+                "protein_grams": targets.protein,
+                "carbs_grams": targets.carbs,
+                "fats_grams": targets.fats,
+            },
+            "targets": {"bmr": targets.bmr, "tdee": targets.tdee},
+            "weekly_plan": weekly_plan,
+            "generated_by": "planner",
+        })
+        plan["within_tolerance"] = all(
+            abs(totals["calories"] - targets.calories) <= self.tolerance * targets.calories
+            for totals in plan["daily_totals"].values()
+        )
+        return plan
+
+    def _enumerate(self, groups: Tuple[Tuple[str, ...], ...]) -> "_Candidates":
+        """All food combinations for a slot template, with portion bounds and nutrients."""
+        pools = [
+            [i for category in group for i in self._by_category.get(category, ())]
+            for group in groups
+        ]
+        estimate = math.prod(len(pool) for pool in pools)
+        if estimate > self.max_combos:
+            # Drop the least dense food of the largest pool until the product fits
+            while math.prod(len(pool) for pool in pools) > self.max_combos:
+                largest = max(range(len(pools)), key=lambda p: len(pools[p]))
+                pools[largest] = self._densest(pools[largest], len(pools[largest]) - 1)
+            logger.warning(
+                "Meal slot %s would enumerate %d food combinations; limited to pools of %s",
+                "/".join("+".join(group) for group in groups), estimate, [len(pool) for pool in pools],
+            )
+        combos = np.array(
+            [combo for combo in itertools.product(*pools) if len(set(combo)) == len(combo)],
+            dtype=np.intp,
+        )
+        bounds = np.array([PORTION_GRAMS.get(record.category, (30, 250)) for record in self.foods])
+        nutrients = self._per_gram[combos]  # (n, k, 4)
+        # Per-nutrient outer products, so a target only reweights them: (n, k, k, 4)
+        outer = np.einsum("nkm,njm->nkjm", nutrients, nutrients)
+        return _Candidates(combos, bounds[combos, 0], bounds[combos, 1], nutrients, outer)
+
+    def _densest(self, indices: List[int], n: int) -> List[int]:
+        """The ``n`` most nutrient-dense of ``indices``, in their original order."""
+        keep = set(sorted(indices, key=lambda i: -self._density[i])[:n])
+        return [i for i in indices if i in keep]
+
+    def _fit(self, groups: Tuple[Tuple[str, ...], ...], target: np.ndarray) -> _SlotFit:
+        """Least-squares portions for every combination against ``target`` (kcal, P, C, F)."""
+        candidates = self._candidates[groups]
+        # Weight calories and each macro by the inverse target, i.e. fit relative errors
+        weights = 1 / np.maximum(target, 1)
+        # Normal equations of (nutrients * weights)^T g ~= 1 for every combination at
+        # once; the small ridge keeps near-collinear food pairs solvable
+        gram = np.tensordot(candidates.outer, weights ** 2, 1) + RIDGE * np.eye(candidates.combos.shape[1])
+        rhs = np.tensordot(candidates.nutrients, weights, 1)
+        grams = _solve_small(gram, rhs)
+        grams = np.clip(grams, candidates.low, candidates.high)
+        grams = np.round(grams / PORTION_STEP) * PORTION_STEP
+        achieved = np.einsum("nk,nkm->nm", grams, candidates.nutrients) * weights
+        error = np.abs(achieved - 1).sum(axis=1) + 2 * np.abs(achieved[:, 0] - 1)
+        # Only the best fits compete for variety when picking each day's meals
+        best = np.argsort(error)[:VARIETY_CANDIDATES]
+        return _SlotFit(candidates.combos[best], grams[best], error[best])
+
+    def _meal(self, slot: str, combo: np.ndarray, grams: np.ndarray) -> Dict[str, Any]:
+        ingredients = [
+            {"food": self.foods[i].name, "grams": int(g)} for i, g in zip(combo, grams)
+        ]
+        amounts = grams @ self._per_gram[combo]
+        return {
+            "meal": slot,
+            "name": " with ".join(self.foods[i].name.split(",")[0] for i in combo),
+            "calories": round(float(amounts[0])),
+            "nutrients": {
+                "protein": round(float(amounts[1]), 1),
+                "carbs": round(float(amounts[2]), 1),
+                "fats": round(float(amounts[3]), 1),
+            },
+            "ingredients": ingredients,
+        }
+
+
+def _nutrient_density(record: FoodRecord) -> float:
+    """Grams of protein and fiber per 100 kcal."""
+    return 100 * (record.protein + record.fiber) / max(record.calories, 1)
+
+
+def _solve_small(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Solve stacked 2x2 or 3x3 systems ``a x = b`` by Cramer's rule, which
+    vectorizes far better than a LAPACK call per system.
+    """
+    if a.shape[-1] == 2:
+        det = a[:, 0, 0] * a[:, 1, 1] - a[:, 0, 1] * a[:, 1, 0]
+        x0 = b[:, 0] * a[:, 1, 1] - a[:, 0, 1] * b[:, 1]
+        x1 = a[:, 0, 0] * b[:, 1] - b[:, 0] * a[:, 1, 0]
+        return np.stack([x0, x1], axis=1) / det[:, None]
+    if a.shape[-1] != 3:
+        return np.linalg.solve(a, b[..., None])[..., 0]
+    # Rows of the adjugate via cross products of the columns
+    c0, c1, c2 = a[:, :, 0], a[:, :, 1], a[:, :, 2]
+    r0, r1, r2 = np.cross(c1, c2), np.cross(c2, c0), np.cross(c0, c1)
+    det = np.einsum("ni,ni->n", c0, r0)
+    return np.stack(
+        [np.einsum("ni,ni->n", r, b) for r in (r0, r1, r2)], axis=1
+    ) / det[:, None]
@@ -0,0 +1,176 @@
+"""
+Model and token-budget routing for OpenAI calls.
+
+Each call is matched against ordered rules (``data/model_routing.json``)
+on endpoint, query length, user tier and a keyword intent classifier;
+the first matching rule picks the model, ``max_tokens`` and temperature.
+Experiments send a fraction of a route's traffic to another model, and
+latency and token usage are recorded per route, variant and model so the
+two arms can be compared before moving traffic.
+"""
+import hashlib
+import json
+import random
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .. import config, metrics
+
+FACTUAL = "factual"
+PLAN = "plan"
+ADVICE = "advice"
+
+# Per-endpoint fallbacks for fields a matching rule leaves out
+ENDPOINT_DEFAULTS = {
+    "chatbot": {"max_tokens": 1000, "temperature": 0.7},
+    "diet_plan": {"max_tokens": 3000, "temperature": 0.7},
+    "workout_plan": {"max_tokens": 2000, "temperature": 0.7},
+    "diet_day": {"max_tokens": 800, "temperature": 0.7},
+    "diet_meal": {"max_tokens": 250, "temperature": 0.7},
+    "diet_descriptions": {"max_tokens": 2000, "temperature": 0.7},
+    "diet_plan_repair": {"max_tokens": 3000, "temperature": 0.7},
+}
+DEFAULT_ROUTE = {"max_tokens": 1000, "temperature": 0.7}
+
+_PLAN_WORDS = re.compile(
+    r"\b(plan|plans|schedule|routine|program|programme|menu|week|weekly|days|split|recipes?)\b"
+)
+_FACTUAL_START = re.compile(
+    r"^(how many|how much|what is|what's|what are|is|are|does|do|can|which|when|calories in)\b"
+)
+_WORD = re.compile(r"\w+")
+
+
+def classify_intent(query: str) -> str:
+    """
+    Cheap keyword intent: ``plan`` for multi-day/routine requests,
+    ``factual`` for short direct questions, otherwise ``advice``.
+    """
+    text = query.lower().strip()
+    if _PLAN_WORDS.search(text):
+        return PLAN
+    if _FACTUAL_START.match(text) and len(_WORD.findall(text)) <= 20:
+        return FACTUAL
+    return ADVICE
+
+
+class RoutingDecision(NamedTuple):
+    route: str
+    variant: str
+    model: str
+    max_tokens: int
+    temperature: float
+
+
+class ModelRouter:
+    """Rule-based model selection with A/B experiments and per-route stats."""
+
+    def __init__(self, rules: List[Dict[str, Any]], experiments: Optional[List[Dict[str, Any]]] = None):
+        self.rules = rules
+        # route -> {"model": ..., "fraction": ...}
+        self.experiments = {experiment["route"]: experiment for experiment in experiments or []}
+        # (route, variant, model) -> [calls, seconds, prompt_tokens, completion_tokens]
+        self._stats: Dict[Tuple[str, str, str], list] = {}
+
+    @classmethod
+    def from_json(cls, path: Path) -> "ModelRouter":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("rules", []), data.get("experiments", []))
+
+    def route(
+        self,
+        endpoint: str,
+        query: str = "",
+        user_id: Optional[int] = None,
+        tier: Optional[str] = None,
+    ) -> RoutingDecision:
+        """Pick the model, ``max_tokens`` and temperature for one call."""
+        intent = classify_intent(query) if query else None
+        facts = {"endpoint": endpoint, "intent": intent, "tier": tier or "standard"}
+        rule = next((rule for rule in self.rules if _matches(rule.get("when", {}), facts, query)), {})
+        defaults = ENDPOINT_DEFAULTS.get(endpoint, DEFAULT_ROUTE)
+        route = rule.get("name", endpoint)
+
+        max_tokens = rule.get("max_tokens", defaults["max_tokens"])
+        model = _resolve_model(rule.get("model", "default"))
+
+        variant = "a"
+        experiment = self.experiments.get(route)
+        if experiment and _in_treatment(route, user_id, experiment["fraction"]):
+            variant = "b"
+            model = _resolve_model(experiment["model"])
+        return RoutingDecision(
+            route, variant, model, int(max_tokens), float(rule.get("temperature", defaults["temperature"]))
+        )
+
+    def record(
+        self,
+        decision: RoutingDecision,
+        seconds: float,
+        prompt_tokens: int,
+        completion_tokens: int,
+    ) -> None:
+        """Account one finished call against its route, variant and (final) model."""
+        entry = self._stats.setdefault((decision.route, decision.variant, decision.model), [0, 0.0, 0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += prompt_tokens
+        entry[3] += completion_tokens
+        metrics.observe_openai_route(
+            decision.route, decision.variant, decision.model, seconds, prompt_tokens, completion_tokens
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        routes: Dict[str, list] = {}
+        for (route, variant, model), (calls, seconds, prompt, completion) in self._stats.items():
+            routes.setdefault(route, []).append({
+                "variant": variant,
+                "model": model,
+                "calls": calls,
+                "avg_latency_ms": round(seconds / calls * 1000),
+                "avg_prompt_tokens": round(prompt / calls),
+                "avg_completion_tokens": round(completion / calls),
+            })
+        return {
+            "rules": [rule.get("name") for rule in self.rules],
+            "experiments": list(self.experiments.values()),
+            "routes": routes,
+        }
+
+
+def _matches(when: Dict[str, Any], facts: Dict[str, Any], query: str) -> bool:
+    for key, expected in when.items():
+        if key == "max_query_chars":
+            if len(query) > expected:
+                return False
+        elif key == "min_query_chars":
+            if len(query) < expected:
+                return False
+        elif isinstance(expected, list):
+            if facts.get(key) not in expected:
+                return False
+        elif facts.get(key) != expected:
+            return False
+    return True
+
+
+def _resolve_model(name: str) -> str:
+    """``default`` and ``fast`` refer to the configured models; anything else is literal."""
+    return {"default": config.OPENAI_MODEL, "fast": config.OPENAI_FAST_MODEL}.get(name, name)
+
+
+def _in_treatment(route: str, user_id: Optional[int], fraction: float) -> bool:
+    """Known users stay in one arm per route; anonymous calls are split at random."""
+    if user_id is None:
+        return random.random() < fraction
+    digest = hashlib.sha256(f"{route}:{user_id}".encode()).digest()
+    return int.from_bytes(digest[:4], "big") / 2 ** 32 < fraction
+
+
+@lru_cache(maxsize=1)
+def load_default() -> ModelRouter:
+    """The configured routing rules."""
+    return ModelRouter.from_json(Path(config.MODEL_ROUTING_PATH))
@@ -0,0 +1,182 @@
+"""
+Two-tier cache for nutrition lookups.
+
+Tier 1 is an in-process LRU with a TTL; tier 2 is the ``nutrition_cache``
+table in the shared MySQL database, so entries survive restarts and are
+shared between workers. Concurrent misses for the same food are collapsed
+into a single upstream call.
+"""
+import json
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .. import config
+from ..db import Database
+from .cache import SingleFlight, TTLCache
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_food_name(name: str) -> str:
+    """Normalize a food name into a cache key ("Chicken  Breast!" -> "chicken breast")."""
+    name = _NON_WORD.sub(" ", name.lower())
+    return _WHITESPACE.sub(" ", name).strip()
+
+
+class NutritionCache:
+    """LRU + MySQL cache for nutrition analysis results."""
+
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        max_entries: int = config.NUTRITION_CACHE_MAX_ENTRIES,
+        ttl: float = config.NUTRITION_CACHE_TTL,
+    ):
+        self.db = db
+        self.ttl = ttl
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.single_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self,
+        food_name: str,
+        loader: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Return the cached analysis for a food, calling ``loader`` on a miss.
+
+        Returns ``(value, metadata)`` where metadata describes whether the
+        lookup was a hit, which tier served it and how old the entry is.
+        ``loader`` results of None are not cached.
+        """
+        key = normalize_food_name(food_name)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[0], self._metadata("hit", "memory", entry[1])
+
+        async def load() -> Tuple[Optional[Dict[str, Any]], Optional[float], Optional[str]]:
+            stored = await self._db_get(key)
+            if stored is not None:
+                self.memory.set(key, stored[0], cached_at=stored[1])
+                return stored[0], stored[1], "mysql"
+            value = await loader(food_name)
+            if value is not None:
+                await self.set(food_name, value)
+            return value, None, None
+
+        (value, cached_at, tier), shared = await self.single_flight.do(key, load)
+        if tier is not None:
+            self.hits += 1
+            return value, self._metadata("hit", tier, cached_at)
+        self.misses += 1
+        metadata = self._metadata("miss", None, None)
+        metadata["coalesced"] = shared
+        return value, metadata
+
+    async def lookup(self, food_name: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Return ``(value, metadata)`` for a cached food without loading it.
+
+        Only hits are counted; callers that go on to resolve a miss
+        themselves should report it with ``record_miss``.
+        """
+        key = normalize_food_name(food_name)
+        entry = self.memory.get(key)
+        tier = "memory"
+        if entry is None:
+            entry = await self._db_get(key)
+            if entry is None:
+                return None
+            self.memory.set(key, entry[0], cached_at=entry[1])
+            tier = "mysql"
+        self.hits += 1
+        return entry[0], self._metadata("hit", tier, entry[1])
+
+    def record_miss(self) -> None:
+        self.misses += 1
+
+    async def set(self, food_name: str, value: Dict[str, Any]) -> None:
+        """Store an analysis result in both tiers."""
+        key = normalize_food_name(food_name)
+        cached_at = time.time()
+        self.memory.set(key, value, cached_at=cached_at)
+        if self.db is None:
+            return
+        try:
+            await self.db.execute(
+                "INSERT INTO nutrition_cache (cache_key, food_name, data, cached_at) "
+                "VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE food_name = VALUES(food_name), "
+                "data = VALUES(data), cached_at = VALUES(cached_at)",
+                (key, food_name, json.dumps(value), cached_at),
+            )
+        except Exception as e:
+            logger.warning("Failed to persist nutrition cache entry %r: %s", key, e)
+
+    async def invalidate(self, food_name: str) -> bool:
+        """Drop a single food from both tiers; returns whether it was cached."""
+        key = normalize_food_name(food_name)
+        removed = self.memory.delete(key)
+        if self.db is not None:
+            try:
+                deleted = await self.db.execute(
+                    "DELETE FROM nutrition_cache WHERE cache_key = %s", (key,)
+                )
+                removed = removed or deleted > 0
+            except Exception as e:
+                logger.warning("Failed to invalidate nutrition cache entry %r: %s", key, e)
+        return removed
+
+    async def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        self.memory.clear()
+        if self.db is not None:
+            try:
+                await self.db.execute("DELETE FROM nutrition_cache")
+            except Exception as e:
+                logger.warning("Failed to clear nutrition cache table: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "max_entries": self.memory.max_entries,
+            "ttl_seconds": self.ttl,
+            "inflight": len(self.single_flight),
+        }
+
+    async def _db_get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        if self.db is None:
+            return None
+        try:
+            row = await self.db.fetchone(
+                "SELECT data, cached_at FROM nutrition_cache "
+                "WHERE cache_key = %s AND cached_at > %s",
+                (key, time.time() - self.ttl),
+            )
+        except Exception as e:
+            logger.warning("Nutrition cache lookup failed for %r: %s", key, e)
+            return None
+        if row is None:
+            return None
+        data = row["data"]
+        return (json.loads(data) if isinstance(data, (str, bytes)) else data), row["cached_at"]
+
+    @staticmethod
+    def _metadata(status: str, tier: Optional[str], cached_at: Optional[float]) -> Dict[str, Any]:
+        return {
+            "status": status,
+            "tier": tier,
+            "age_seconds": round(time.time() - cached_at, 3) if cached_at is not None else None,
+        }
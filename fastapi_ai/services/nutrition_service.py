@@ -1,15 +1,34 @@
 """
-Nutrition service for food analysis using Nutritionix/Edamam APIs.
+Nutrition service for food analysis using the local food database and
+Nutritionix/Edamam APIs.
 """
+import asyncio
 import os
-import httpx
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+from .. import config
+from ..http_clients import HTTPClients, NUTRITIONIX, EDAMAM
+from ..resilience import Resilience, hedged
+from .food_db import FoodCompositionDB, load_default
+from .nutrition_cache import NutritionCache, normalize_food_name
+
+NUTRITIONIX_NATURAL_URL = "https://trackapi.nutritionix.com/v2/natural/nutrients"
 
 
 class NutritionService:
     """Service for food nutrition analysis."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        http_clients: Optional[HTTPClients] = None,
+        cache: Optional[NutritionCache] = None,
+        food_db: Optional[FoodCompositionDB] = None,
+        resilience: Optional[Resilience] = None
+    ):
+        self.http_clients = http_clients or HTTPClients()
+        self.cache = cache
+        self.food_db = food_db or load_default()
+        self.resilience = resilience or Resilience()
         self.nutritionix_app_id = os.getenv('NUTRITIONIX_APP_ID')
         self.nutritionix_api_key = os.getenv('NUTRITIONIX_API_KEY')
         self.edamam_app_id = os.getenv('EDAMAM_APP_ID')
@@ -17,62 +36,207 @@ class NutritionService:
     
     async def analyze_food(self, food_name: str) -> Dict[str, Any]:
         """
-        Analyze food nutrition using Nutritionix or Edamam API.
+        Analyze food nutrition using the local database, Nutritionix or Edamam API.
+        
+        Confident matches in the offline food database are answered
+        immediately; anything else goes through the cache to the APIs.
         
         Args:
             food_name: Name of the food item
             
         Returns:
-            Dictionary with calories, nutrients, and serving size
+            Dictionary with calories, nutrients, and serving size, plus
+            cache hit/miss metadata when a cache is configured
+        """
+        local = self.food_db.analyze(food_name, config.FOOD_DB_MATCH_THRESHOLD)
+        if local is not None:
+            return local
+        
+        if self.cache is None:
+            analysis = await self._analyze_with_apis(food_name)
+            return analysis or self._estimate_nutrition(food_name)
+        
+        analysis, cache_info = await self.cache.get_or_load(food_name, self._analyze_with_apis)
+        # Estimates are not cached so real API data replaces them once available
+        analysis = dict(analysis or self._estimate_nutrition(food_name))
+        analysis['cache'] = cache_info
+        return analysis
+    
+    async def analyze_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Analyze several foods at once, e.g. every item of a meal.
+        
+        Identical names are resolved once. Local database and cache hits are
+        answered without network calls; the remaining foods are sent to
+        Nutritionix as one natural-language query when possible, otherwise
+        resolved individually with bounded concurrency.
+        
+        Args:
+            items: Dicts with ``name`` and optional ``quantity`` (number of
+                servings, default 1)
+            
+        Returns:
+            One result per item, in order, scaled by quantity. Items that
+            could not be analyzed carry an ``error`` message instead.
+        """
+        unique: Dict[str, str] = {}
+        for item in items:
+            key = normalize_food_name(item.get('name') or '')
+            if key:
+                unique.setdefault(key, item['name'])
+        
+        resolved: Dict[str, Any] = {}
+        misses: Dict[str, str] = {}
+        for key, name in unique.items():
+            local = self.food_db.analyze(name, config.FOOD_DB_MATCH_THRESHOLD)
+            if local is not None:
+                resolved[key] = local
+            elif self.cache is not None and (cached := await self.cache.lookup(name)):
+                resolved[key] = dict(cached[0], cache=cached[1])
+            else:
+                misses[key] = name
+        
+        if len(misses) > 1:
+            resolved.update(await self._analyze_batch_with_nutritionix(misses))
+            misses = {key: name for key, name in misses.items() if key not in resolved}
+        
+        if misses:
+            semaphore = asyncio.Semaphore(config.NUTRITION_MAX_CONCURRENCY)
+            
+            async def analyze_one(name: str) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self.analyze_food(name)
+            
+            results = await asyncio.gather(
+                *(analyze_one(name) for name in misses.values()),
+                return_exceptions=True,
+            )
+            resolved.update(zip(misses.keys(), results))
+        
+        return [self._batch_item_result(item, resolved) for item in items]
+    
+    async def _analyze_batch_with_nutritionix(self, foods: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Resolve several foods with a single Nutritionix natural-language query.
+        
+        Returns results keyed like ``foods``, or an empty dict when
+        Nutritionix is unavailable or its answer cannot be mapped back to
+        the requested foods one-to-one.
+        """
+        if not (self.nutritionix_app_id and self.nutritionix_api_key):
+            return {}
+        try:
+            parsed = await self._query_nutritionix("\n".join(foods.values()))
+        except Exception:
+            return {}
+        if len(parsed) != len(foods):
+            return {}
+        
+        resolved = {}
+        for (key, name), analysis in zip(foods.items(), parsed):
+            if self.cache is not None:
+                await self.cache.set(name, analysis)
+                self.cache.record_miss()
+                analysis = dict(analysis, cache={"status": "miss", "tier": None, "age_seconds": None})
+            resolved[key] = analysis
+        return resolved
+    
+    @staticmethod
+    def _batch_item_result(item: Dict[str, Any], resolved: Dict[str, Any]) -> Dict[str, Any]:
+        name = item.get('name') or ''
+        quantity = item.get('quantity', 1)
+        result = {"name": name, "quantity": quantity}
+        analysis = resolved.get(normalize_food_name(name))
+        if not normalize_food_name(name):
+            result["error"] = "Food name is required"
+        elif analysis is None or isinstance(analysis, Exception):
+            result["error"] = f"Error analyzing food: {analysis}"
+        else:
+            result.update(analysis)
+            result["name"] = name
+            result["matched_name"] = analysis.get('name', name)
+            result["calories"] = round(analysis['calories'] * quantity, 2)
+            result["nutrients"] = {
+                nutrient: round(value * quantity, 2) if isinstance(value, (int, float)) else value
+                for nutrient, value in analysis.get('nutrients', {}).items()
+            }
+        return result
+    
+    async def _analyze_with_apis(self, food_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Try Nutritionix first, fallback to Edamam; None if neither answers.
+        
+        With both configured and ``HEDGE_NUTRITION`` on, Edamam is also
+        fired once Nutritionix has taken longer than its p95 latency, and
+        whichever answers first wins.
         """
-        # Try Nutritionix first, fallback to Edamam, then to estimate
-        if self.nutritionix_app_id and self.nutritionix_api_key:
+        nutritionix = bool(self.nutritionix_app_id and self.nutritionix_api_key)
+        edamam = bool(self.edamam_app_id and self.edamam_app_key)
+        if nutritionix and edamam and config.HEDGE_NUTRITION:
+            try:
+                return await hedged(
+                    lambda: self._analyze_with_nutritionix(food_name),
+                    lambda: self._analyze_with_edamam(food_name),
+                    self.resilience.get(NUTRITIONIX).hedge_delay(),
+                )
+            except Exception:
+                return None
+        
+        if nutritionix:
             try:
                 return await self._analyze_with_nutritionix(food_name)
             except Exception:
                 pass
         
-        if self.edamam_app_id and self.edamam_app_key:
+        if edamam:
             try:
                 return await self._analyze_with_edamam(food_name)
             except Exception:
                 pass
         
-        # Fallback to estimation if APIs are not available
-        return self._estimate_nutrition(food_name)
+        return None
     
     async def _analyze_with_nutritionix(self, food_name: str) -> Dict[str, Any]:
         """Analyze food using Nutritionix API."""
-        url = "https://trackapi.nutritionix.com/v2/natural/nutrients"
+        foods = await self._query_nutritionix(food_name)
+        if foods:
+            return foods[0]
+        
+        raise Exception("No nutrition data found")
+    
+    async def _query_nutritionix(self, query: str) -> List[Dict[str, Any]]:
+        """Run a Nutritionix natural-language query; one result per food it recognized."""
         headers = {
             "x-app-id": self.nutritionix_app_id,
             "x-app-key": self.nutritionix_api_key,
             "Content-Type": "application/json",
         }
-        data = {"query": food_name}
+        data = {"query": query}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=data, timeout=10)
+        client = self.http_clients.get(NUTRITIONIX)
+        
+        async def post():
+            response = await client.post(NUTRITIONIX_NATURAL_URL, headers=headers, json=data)
             response.raise_for_status()
-            result = response.json()
-            
-            foods = result.get('foods', [])
-            if foods:
-                food = foods[0]
-                return {
-                    "name": food.get('food_name', food_name),
-                    "calories": food.get('nf_calories', 0),
-                    "nutrients": {
-                        "protein": food.get('nf_protein', 0),
-                        "carbs": food.get('nf_total_carbohydrate', 0),
-                        "fats": food.get('nf_total_fat', 0),
-                        "fiber": food.get('nf_dietary_fiber', 0),
-                        "sugar": food.get('nf_sugars', 0),
-                    },
-                    "serving_size": food.get('serving_unit', '1 serving'),
-                }
+            return response.json()
         
-        raise Exception("No nutrition data found")
+        result = await self.resilience.get(NUTRITIONIX).call(post)
+        
+        return [
+            {
+                "name": food.get('food_name', query),
+                "calories": food.get('nf_calories', 0),
+                "nutrients": {
+                    "protein": food.get('nf_protein', 0),
+                    "carbs": food.get('nf_total_carbohydrate', 0),
+                    "fats": food.get('nf_total_fat', 0),
+                    "fiber": food.get('nf_dietary_fiber', 0),
+                    "sugar": food.get('nf_sugars', 0),
+                },
+                "serving_size": food.get('serving_unit', '1 serving'),
+            }
+            for food in result.get('foods', [])
+        ]
     
     async def _analyze_with_edamam(self, food_name: str) -> Dict[str, Any]:
         """Analyze food using Edamam API."""
@@ -83,61 +247,51 @@ class NutritionService:
             "ingr": food_name,
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10)
+        client = self.http_clients.get(EDAMAM)
+        
+        async def get():
+            response = await client.get(url, params=params)
             response.raise_for_status()
-            result = response.json()
-            
-            calories = result.get('calories', 0)
-            total_nutrients = result.get('totalNutrients', {})
-            
-            return {
-                "name": food_name,
-                "calories": calories,
-                "nutrients": {
-                    "protein": total_nutrients.get('PROCNT', {}).get('quantity', 0),
-                    "carbs": total_nutrients.get('CHOCDF', {}).get('quantity', 0),
-                    "fats": total_nutrients.get('FAT', {}).get('quantity', 0),
-                    "fiber": total_nutrients.get('FIBTG', {}).get('quantity', 0),
-                    "sugar": total_nutrients.get('SUGAR', {}).get('quantity', 0),
-                },
-                "serving_size": "100g",
-            }
+            return response.json()
+        
+        result = await self.resilience.get(EDAMAM).call(get)
+        
+        calories = result.get('calories', 0)
+        total_nutrients = result.get('totalNutrients', {})
+        
+        return {
+            "name": food_name,
+            "calories": calories,
+            "nutrients": {
+                "protein": total_nutrients.get('PROCNT', {}).get('quantity', 0),
+                "carbs": total_nutrients.get('CHOCDF', {}).get('quantity', 0),
+                "fats": total_nutrients.get('FAT', {}).get('quantity', 0),
+                "fiber": total_nutrients.get('FIBTG', {}).get('quantity', 0),
+                "sugar": total_nutrients.get('SUGAR', {}).get('quantity', 0),
+            },
+            "serving_size": "100g",
+        }
     
     def _estimate_nutrition(self, food_name: str) -> Dict[str, Any]:
         """
         Estimate nutrition values when APIs are unavailable.
-        This is a simple fallback - in production, use proper APIs.
+        Uses the closest food in the local database, with any amount
+        approximated, or generic values.
         """
-        food_name_lower = food_name.lower()
-        
-        # Simple estimation logic based on common foods
-        estimates = {
-            'chicken': {'calories': 231, 'protein': 43.5, 'carbs': 0, 'fats': 5},
-            'rice': {'calories': 130, 'protein': 2.7, 'carbs': 28, 'fats': 0.3},
-            'apple': {'calories': 52, 'protein': 0.3, 'carbs': 14, 'fats': 0.2},
-            'banana': {'calories': 89, 'protein': 1.1, 'carbs': 23, 'fats': 0.3},
-            'egg': {'calories': 155, 'protein': 13, 'carbs': 1.1, 'fats': 11},
-        }
-        
-        # Try to match food name
-        matched = None
-        for key, values in estimates.items():
-            if key in food_name_lower:
-                matched = values
-                break
-        
-        if not matched:
-            # Default estimation
-            matched = {'calories': 150, 'protein': 10, 'carbs': 15, 'fats': 5}
+        matched = self.food_db.estimate(food_name, config.FOOD_DB_ESTIMATE_THRESHOLD)
+        if matched:
+            matched['name'] = food_name
+            matched['serving_size'] += " (estimated)"
+            return matched
         
+        # Default estimation
         return {
             "name": food_name,
-            "calories": matched['calories'],
+            "calories": 150,
             "nutrients": {
-                "protein": matched['protein'],
-                "carbs": matched['carbs'],
-                "fats": matched['fats'],
+                "protein": 10,
+                "carbs": 15,
+                "fats": 5,
                 "fiber": 2.0,
                 "sugar": 5.0,
             },
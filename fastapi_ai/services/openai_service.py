@@ -1,22 +1,79 @@
 """
 OpenAI service for GPT-4.1 integration.
 """
+import asyncio
+import copy
 import os
 import json
+import logging
+import time
+import anyio
+from contextlib import suppress
 from openai import AsyncOpenAI
-from typing import Dict, Any, Optional
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, Any, List, Optional
 
-# Initialize OpenAI client
-client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+from .. import config, metrics
+from ..resilience import OPENAI, Resilience
+from .diet_plan_edits import (
+    DAYS, day_meals, find_meal, recompute_totals, replace_day, replace_meal, replace_workout
+)
+from .meal_planner import nutrition_targets
+from .model_router import ModelRouter, RoutingDecision, load_default
+from .plan_parsing import (
+    TARGETS, ParsedPlan, PlanParseError, loads, parse_diet_plan, parse_workout_plan, validate_meals
+)
+from .response_cache import ResponseCache
+from .usage import UsageTracker, cost_usd, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Initialize OpenAI client; retries go through the shared retry budget instead
+client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0)
+
+# Second-chance calls for days missing from a generated plan ask for this many tokens per day
+REPAIR_TOKENS_PER_DAY = 450
+
+# Partial plan regeneration (one day / one meal)
+DAY_SYSTEM_PROMPT = """You are a professional nutritionist updating one day of a meal plan.
+Return valid JSON: {"meals": [{"meal": "breakfast", "name": "...", "calories": number, "nutrients": {"protein": number, "carbs": number, "fats": number}}, ...]}
+Hit the daily targets; grams for macros."""
+
+DESCRIBE_SYSTEM_PROMPT = """You are a professional nutritionist writing a meal plan for a user.
+The meals, portions and calories are fixed. For each numbered meal, write a short appetizing title and a 1-2 sentence recipe.
+Return valid JSON: {"meals": {"1": {"title": "...", "recipe": "..."}, ...}}"""
+
+REPAIR_SYSTEM_PROMPT = """You are a professional nutritionist completing a weekly meal plan.
+Create breakfast, lunch, dinner and 2 snacks for each requested day only.
+Return valid JSON: {"weekly_plan": {"<day>": [{"meal": "breakfast", "name": "...", "calories": number, "nutrients": {"protein": number, "carbs": number, "fats": number}}, ...]}}
+Hit the daily targets; grams for macros."""
+
+MEAL_SYSTEM_PROMPT = """You are a professional nutritionist replacing one meal in a meal plan.
+Return valid JSON: {"meal": {"name": "...", "calories": number, "nutrients": {"protein": number, "carbs": number, "fats": number}}}
+Grams for macros."""
 
 
 class OpenAIService:
     """Service for OpenAI GPT-4.1 interactions."""
     
+    def __init__(
+        self,
+        response_cache: Optional[ResponseCache] = None,
+        resilience: Optional[Resilience] = None,
+        usage: Optional[UsageTracker] = None,
+        router: Optional[ModelRouter] = None
+    ):
+        self.response_cache = response_cache
+        self.resilience = resilience or Resilience()
+        self.usage = usage
+        self.router = router or load_default()
+    
     async def chat_completion(
         self,
         query: str,
-        user_context: Optional[Dict[str, Any]] = None
+        user_context: Optional[Dict[str, Any]] = None,
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None
     ) -> str:
         """
         Get chatbot response for nutrition/fitness queries.
@@ -24,10 +81,180 @@ class OpenAIService:
         Args:
             query: User's question
             user_context: Optional user profile information
+            user_id: User billed for the tokens (budgets apply per user)
+            user_tier: Subscription tier, used by the model routing rules
             
         Returns:
             AI-generated response
         """
+        lookup = None
+        if self.response_cache is not None:
+            lookup = await self.response_cache.lookup("chatbot", query, user_context)
+            if lookup.hit:
+                return lookup.value
+        
+        try:
+            response = await self._create_completion(
+                "chatbot",
+                user_id,
+                self._route("chatbot", user_id, user_tier, query),
+                messages=self._chat_messages(query, user_context),
+            )
+            
+            answer = response.choices[0].message.content.strip()
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+        
+        if lookup is not None:
+            self.response_cache.store(lookup, answer)
+        return answer
+    
+    async def chat_completion_stream(
+        self,
+        query: str,
+        user_context: Optional[Dict[str, Any]] = None,
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the chatbot response token by token as OpenAI generates it.
+        
+        Closing the generator early (e.g. when the client disconnects) closes
+        the upstream stream so no further tokens are generated for it.
+        Streams report no token usage, so it is estimated from the text.
+        
+        Args:
+            query: User's question
+            user_context: Optional user profile information
+            user_id: User billed for the tokens (budgets apply per user)
+            user_tier: Subscription tier, used by the model routing rules
+            
+        Yields:
+            Response text fragments in order
+        """
+        lookup = None
+        if self.response_cache is not None:
+            lookup = await self.response_cache.lookup("chatbot", query, user_context)
+            if lookup.hit:
+                yield lookup.value
+                return
+        
+        decision = self._route("chatbot", user_id, user_tier, query)
+        messages = self._chat_messages(query, user_context)
+        started = time.perf_counter()
+        try:
+            stream = await self._create_completion(
+                "chatbot_stream",
+                user_id,
+                decision,
+                messages=messages,
+                stream=True,
+            )
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+        
+        parts = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Shielded so a cancelled request still releases the upstream connection
+            with anyio.CancelScope(shield=True):
+                await stream.response.aclose()
+            # Tokens generated before an early close are billed too
+            usage = SimpleNamespace(
+                prompt_tokens=estimate_tokens("".join(m["content"] for m in messages)),
+                completion_tokens=estimate_tokens("".join(parts)),
+            )
+            self._record_usage("chatbot_stream", user_id, decision.model, usage)
+            self.router.record(
+                decision, time.perf_counter() - started, usage.prompt_tokens, usage.completion_tokens
+            )
+        
+        # Only complete answers are cached
+        if lookup is not None:
+            self.response_cache.store(lookup, "".join(parts).strip())
+    
+    async def embed(self, text: str) -> List[float]:
+        """Embedding vector for ``text``, used by the semantic response cache."""
+        response = await self.resilience.get(OPENAI).call(
+            lambda: client.embeddings.create(model=config.EMBEDDING_MODEL, input=text)
+        )
+        self._record_usage("embedding", None, config.EMBEDDING_MODEL, response.usage)
+        return response.data[0].embedding
+    
+    def _route(
+        self,
+        endpoint: str,
+        user_id: Optional[int],
+        user_tier: Optional[str],
+        query: str = ""
+    ) -> RoutingDecision:
+        """
+        Model, ``max_tokens`` and temperature from the routing rules; the
+        model is swapped for the cheaper budget model once a budget is spent.
+        """
+        decision = self.router.route(endpoint, query, user_id=user_id, tier=user_tier)
+        if self.usage is None:
+            return decision
+        choice = self.usage.route(user_id, decision.model)
+        if choice.downgraded:
+            logger.info("OpenAI call downgraded to %s (%s)", choice.model, choice.reason)
+        return decision._replace(model=choice.model)
+    
+    async def _create_completion(
+        self,
+        endpoint: str,
+        user_id: Optional[int],
+        decision: RoutingDecision,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Chat completion with the routed model and token budget, through the
+        OpenAI circuit breaker and retry budget.
+        
+        Token usage and latency of non-streamed completions are recorded
+        against ``user_id``, ``endpoint`` and the route. For streams only
+        opening the stream is covered; a stream that breaks mid-answer is
+        not retried.
+        """
+        kwargs.update(
+            model=decision.model, max_tokens=decision.max_tokens, temperature=decision.temperature
+        )
+        started = time.perf_counter()
+        response = await self.resilience.get(OPENAI).call(
+            lambda: client.chat.completions.create(**kwargs)
+        )
+        if not kwargs.get("stream"):
+            usage = getattr(response, "usage", None)
+            self._record_usage(endpoint, user_id, decision.model, usage)
+            prompt_tokens = getattr(usage, "prompt_tokens", 0)
+            completion_tokens = getattr(usage, "completion_tokens", 0)
+            self.router.record(
+                decision,
+                time.perf_counter() - started,
+                prompt_tokens if isinstance(prompt_tokens, int) else 0,
+                completion_tokens if isinstance(completion_tokens, int) else 0,
+            )
+        return response
+    
+    def _record_usage(self, endpoint: str, user_id: Optional[int], model: str, usage: Any) -> None:
+        metrics.record_openai_usage(model, usage)
+        if self.usage is None or usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+            self.usage.record(user_id, endpoint, model, prompt_tokens, completion_tokens)
+    
+    def _chat_messages(
+        self,
+        query: str,
+        user_context: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, str]]:
+        """Build the system and user messages for a chatbot query."""
         system_prompt = """You are a knowledgeable and friendly nutrition and fitness assistant for Health-Bite.
 You provide accurate, helpful advice about:
 - Healthy eating and meal planning
@@ -51,27 +278,29 @@ Always provide practical, actionable advice. If asked about medical conditions,
                 context_str += f"- Goals: {user_context['goals']}\n"
             user_prompt = context_str + f"\nQuestion: {query}"
 
-        try:
-            response = await client.chat.completions.create(
-                model="gpt-4-turbo-preview",  # Using latest GPT-4 model
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000,
-            )
-            
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            raise Exception(f"OpenAI API error: {str(e)}")
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
     
-    async def generate_diet_plan(self, user_profile: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_diet_plan(
+        self,
+        user_profile: Dict[str, Any],
+        include_workout: bool = True,
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Generate personalized diet plan based on user profile.
         
+        The workout plan is generated concurrently with the diet plan and is
+        cancelled if the diet half fails.
+        
         Args:
             user_profile: User's age, gender, height, weight, goals
+            include_workout: Also generate a workout plan
+            user_id: User billed for the tokens (budgets apply per user)
+            user_tier: Subscription tier, used by the model routing rules
             
         Returns:
             Structured diet plan as JSON
@@ -109,33 +338,370 @@ Return the response as valid JSON with this structure:
 
 Generate a healthy, balanced meal plan."""
 
+        lookup = None
+        if self.response_cache is not None:
+            variant = "diet_and_workout" if include_workout else "diet_only"
+            lookup = await self.response_cache.lookup(
+                "diet_plan", variant, user_profile, semantic=False
+            )
+            if lookup.hit:
+                return copy.deepcopy(lookup.value)
+        
+        # The workout plan is independent of the diet plan, so request both at once
+        workout_task = None
+        if include_workout:
+            workout_task = asyncio.create_task(
+                self._generate_workout_plan(user_profile, user_id, user_tier)
+            )
+        
         try:
-            response = await client.chat.completions.create(
-                model="gpt-4-turbo-preview",
+            response = await self._create_completion(
+                "diet_plan",
+                user_id,
+                self._route("diet_plan", user_id, user_tier),
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=0.7,
-                max_tokens=3000,
                 response_format={"type": "json_object"},
             )
             
-            content = response.choices[0].message.content.strip()
-            plan = json.loads(content)
+            parsed = parse_diet_plan(response.choices[0].message.content.strip())
+            if parsed.plan is None or not parsed.plan["weekly_plan"]:
+                raise PlanParseError("no valid day in the diet plan")
+            plan = await self._complete_plan(parsed, user_profile, user_id, user_tier)
             
-            # Also generate a workout plan
-            workout_plan = await self._generate_workout_plan(user_profile)
-            plan['workout_plan'] = workout_plan
+            if workout_task is not None:
+                plan['workout_plan'] = await workout_task
             
+            # Plans with a section that fell back (days still missing, targets
+            # computed locally, placeholder workout) are not cached
+            fell_back = (
+                "missing_days" in plan
+                or TARGETS in parsed.missing
+                or plan.get("workout_plan", {}).get("fallback", False)
+            )
+            if lookup is not None and not fell_back:
+                self.response_cache.store(lookup, copy.deepcopy(plan))
             return plan
-        except json.JSONDecodeError:
+        except PlanParseError:
+            metrics.record_plan_parse("diet_plan", "failed")
             raise Exception("Failed to parse AI-generated diet plan")
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}")
+        finally:
+            # Don't leave the workout call running if the diet half failed or was cancelled
+            if workout_task is not None and not workout_task.done():
+                workout_task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await workout_task
     
-    async def _generate_workout_plan(self, user_profile: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate workout plan as part of diet plan generation."""
+    async def regenerate_day(
+        self,
+        plan: Dict[str, Any],
+        user_profile: Dict[str, Any],
+        day: str,
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Regenerate one day's meals of an existing plan.
+        
+        Only the day's targets and the profile are sent, so the prompt and
+        the completion are a fraction of a full weekly plan; the other days
+        are reused and the totals recomputed locally.
+        
+        Args:
+            plan: Stored plan to patch
+            user_profile: User's age, gender, height, weight, goals
+            day: Day to regenerate (monday..sunday)
+            user_id: User billed for the tokens (budgets apply per user)
+            user_tier: Subscription tier, used by the model routing rules
+            
+        Returns:
+            The patched plan
+        """
+        slots = [item.get("meal") for item in day_meals(plan, day) if item.get("meal")]
+        user_prompt = f"""{_profile_lines(user_profile)}
+- Daily calorie target: {plan.get('daily_calorie_target', 'Not specified')}
+- Macro targets: {json.dumps(plan.get('macros', {}))}
+
+Create {day.lower()}'s meals: {', '.join(slots) or 'breakfast, lunch, dinner and 2 snacks'}."""
+        content = await self._plan_section(
+            "diet_day", user_id, user_tier, DAY_SYSTEM_PROMPT, user_prompt
+        )
+        meals = validate_meals(content.get("meals"))
+        if not meals:
+            metrics.record_plan_parse("diet_day", "failed")
+            raise Exception("Failed to parse AI-generated diet plan")
+        return replace_day(plan, day, meals)
+    
+    async def regenerate_meal(
+        self,
+        plan: Dict[str, Any],
+        user_profile: Dict[str, Any],
+        day: str,
+        meal: str,
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Replace a single meal with one of about the same calories.
+        
+        Args:
+            plan: Stored plan to patch
+            user_profile: User's age, gender, height, weight, goals
+            day: Day of the meal (monday..sunday)
+            meal: Meal slot (breakfast, lunch, dinner, snack, ...)
+            user_id: User billed for the tokens (budgets apply per user)
+            user_tier: Subscription tier, used by the model routing rules
+            
+        Returns:
+            The patched plan
+        """
+        current = find_meal(plan, day, meal)
+        others = [item.get("name") for item in day_meals(plan, day) if item is not current]
+        user_prompt = f"""{_profile_lines(user_profile)}
+
+Replace this {meal.lower()}: {current.get('name', 'unknown')} ({current.get('calories', '?')} kcal).
+Keep it around the same calories and different from: {', '.join(filter(None, others)) or 'nothing'}."""
+        content = await self._plan_section(
+            "diet_meal", user_id, user_tier, MEAL_SYSTEM_PROMPT, user_prompt
+        )
+        replacement = validate_meals([content.get("meal") or content])
+        if not replacement:
+            metrics.record_plan_parse("diet_meal", "failed")
+            raise Exception("Failed to parse AI-generated diet plan")
+        return replace_meal(plan, day, meal, replacement[0])
+    
+    async def regenerate_workout(
+        self,
+        plan: Dict[str, Any],
+        user_profile: Dict[str, Any],
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Regenerate only the workout half of a plan; meals are reused.
+        
+        Unlike full plan generation there is no placeholder workout: a failed
+        generation raises so the stored workout is left as it was.
+        """
+        workout = await self._generate_workout_plan(user_profile, user_id, user_tier, fallback=False)
+        return replace_workout(plan, workout)
+    
+    async def describe_plan(
+        self,
+        plan: Dict[str, Any],
+        user_profile: Dict[str, Any],
+        include_workout: bool = True,
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Add titles and recipes to a locally planned diet (hybrid mode).
+        
+        The model only writes text for each distinct meal; foods, portions
+        and all calorie/macro numbers stay as planned. If the call fails the
+        plan is returned without descriptions.
+        
+        Args:
+            plan: Plan from the local planner
+            user_profile: User's age, gender, height, weight, goals
+            include_workout: Also generate a workout plan (concurrently)
+            user_id: User billed for the tokens (budgets apply per user)
+            user_tier: Subscription tier, used by the model routing rules
+            
+        Returns:
+            The plan with ``title`` and ``recipe`` on each meal
+        """
+        plan = copy.deepcopy(plan)
+        workout_task = None
+        if include_workout:
+            workout_task = asyncio.create_task(
+                self._generate_workout_plan(user_profile, user_id, user_tier)
+            )
+        
+        # Meals repeated across the week are described once
+        meals = {}
+        for meals_of_day in plan.get("weekly_plan", {}).values():
+            for meal in meals_of_day:
+                meals.setdefault(meal["name"], []).append(meal)
+        lines = [
+            f"{i}. {items[0]['meal']}: " + ", ".join(
+                f"{ingredient['food']} {ingredient['grams']}g" for ingredient in items[0].get("ingredients", [])
+            )
+            for i, items in enumerate(meals.values(), 1)
+        ]
+        user_prompt = f"""{_profile_lines(user_profile)}
+
+Meals:
+""" + "\n".join(lines)
+        try:
+            try:
+                content = await self._plan_section(
+                    "diet_descriptions", user_id, user_tier, DESCRIBE_SYSTEM_PROMPT, user_prompt
+                )
+            except Exception as e:
+                logger.warning("Meal descriptions failed, returning the plan without them: %s", e)
+                content = {}
+            descriptions = content.get("meals") or {}
+            for i, items in enumerate(meals.values(), 1):
+                text = descriptions.get(str(i))
+                if isinstance(text, dict):
+                    for meal in items:
+                        meal["title"] = text.get("title")
+                        meal["recipe"] = text.get("recipe")
+            
+            if workout_task is not None:
+                plan["workout_plan"] = await workout_task
+        finally:
+            if workout_task is not None and not workout_task.done():
+                workout_task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await workout_task
+        plan["generated_by"] = "hybrid"
+        return plan
+    
+    async def _complete_plan(
+        self,
+        parsed: ParsedPlan,
+        user_profile: Dict[str, Any],
+        user_id: Optional[int],
+        user_tier: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Fill in what a parsed plan is missing and recompute its totals.
+        
+        Missing calorie/macro targets are computed locally from the profile;
+        missing or invalid days are requested in one targeted second-chance
+        call. Days still missing after it are listed in ``missing_days``.
+        """
+        plan = parsed.plan
+        if TARGETS in parsed.missing:
+            targets = nutrition_targets(user_profile)
+            plan["daily_calorie_target"] = targets.calories
+            plan["macros"] = {
+                "protein_grams": targets.protein,
+                "carbs_grams": targets.carbs,
+                "fats_grams": targets.fats,
+            }
+        
+        days = [section for section in parsed.missing if section != TARGETS]
+        outcome = "repaired" if parsed.repaired else "ok"
+        if days and config.PLAN_SECOND_CHANCE:
+            outcome = "second_chance"
+            plan["weekly_plan"].update(
+                await self._complete_days(plan, user_profile, days, user_id, user_tier)
+            )
+            days = [day for day in days if day not in plan["weekly_plan"]]
+        if days:
+            plan["missing_days"] = days
+        plan["weekly_plan"] = {
+            day: plan["weekly_plan"][day]
+            for day in sorted(plan["weekly_plan"], key=DAYS.index)
+        }
+        metrics.record_plan_parse("diet_plan", outcome)
+        return recompute_totals(plan)
+    
+    async def _complete_days(
+        self,
+        plan: Dict[str, Any],
+        user_profile: Dict[str, Any],
+        days: List[str],
+        user_id: Optional[int],
+        user_tier: Optional[str]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Second-chance call asking only for ``days``; returns the valid ones."""
+        decision = self._route("diet_plan_repair", user_id, user_tier)
+        decision = decision._replace(
+            max_tokens=min(decision.max_tokens, REPAIR_TOKENS_PER_DAY * len(days))
+        )
+        user_prompt = f"""{_profile_lines(user_profile)}
+- Daily calorie target: {plan['daily_calorie_target']}
+- Macro targets: {json.dumps(plan['macros'])}
+
+Create meals for: {', '.join(days)}."""
+        try:
+            response = await self._create_completion(
+                "diet_plan_repair",
+                user_id,
+                decision,
+                messages=[
+                    {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ],
+                response_format={"type": "json_object"},
+            )
+        except Exception as e:
+            logger.warning("Second-chance call for %s failed: %s", ", ".join(days), e)
+            return {}
+        
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0)
+        completion_tokens = getattr(usage, "completion_tokens", 0)
+        if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+            metrics.record_plan_retry(
+                "diet_plan",
+                prompt_tokens + completion_tokens,
+                cost_usd(decision.model, prompt_tokens, completion_tokens),
+            )
+        
+        content = loads(response.choices[0].message.content.strip())
+        weekly_plan = content.get("weekly_plan") if isinstance(content, dict) else None
+        if not isinstance(weekly_plan, dict):
+            return {}
+        weekly_plan = {str(day).strip().lower(): meals for day, meals in weekly_plan.items()}
+        completed = {}
+        for day in days:
+            meals = validate_meals(weekly_plan.get(day))
+            if meals:
+                completed[day] = meals
+        return completed
+    
+    async def _plan_section(
+        self,
+        endpoint: str,
+        user_id: Optional[int],
+        user_tier: Optional[str],
+        system_prompt: str,
+        user_prompt: str
+    ) -> Dict[str, Any]:
+        """JSON completion for one section of a plan (truncated output is closed)."""
+        try:
+            response = await self._create_completion(
+                endpoint,
+                user_id,
+                self._route(endpoint, user_id, user_tier),
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                response_format={"type": "json_object"},
+            )
+            
+            content = loads(response.choices[0].message.content.strip())
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+        if not isinstance(content, dict):
+            metrics.record_plan_parse(endpoint, "failed")
+            raise Exception("Failed to parse AI-generated diet plan")
+        metrics.record_plan_parse(endpoint, "ok")
+        return content
+    
+    async def _generate_workout_plan(
+        self,
+        user_profile: Dict[str, Any],
+        user_id: Optional[int] = None,
+        user_tier: Optional[str] = None,
+        fallback: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Generate workout plan as part of diet plan generation.
+        
+        With ``fallback`` a basic plan, marked ``"fallback": True``, is
+        returned if generation fails; otherwise the failure is raised.
+        """
         system_prompt = """You are a fitness trainer creating personalized workout plans.
 Generate a weekly workout plan with:
 - Exercise name, sets, reps, duration
@@ -159,25 +725,43 @@ Return as JSON:
 - Goals: {json.dumps(user_profile.get('goals', {}))}"""
 
         try:
-            response = await client.chat.completions.create(
-                model="gpt-4-turbo-preview",
+            response = await self._create_completion(
+                "workout_plan",
+                user_id,
+                self._route("workout_plan", user_id, user_tier),
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=0.7,
-                max_tokens=2000,
                 response_format={"type": "json_object"},
             )
             
-            content = response.choices[0].message.content.strip()
-            return json.loads(content)
+            workout = parse_workout_plan(response.choices[0].message.content.strip())
+            if workout is None:
+                raise PlanParseError("invalid workout plan")
+            metrics.record_plan_parse("workout_plan", "ok")
+            return workout
         except Exception as e:
+            # Only an unusable reply is a parse failure; the call itself may have failed
+            metrics.record_plan_parse("workout_plan", "failed" if isinstance(e, PlanParseError) else "api_error")
+            if not fallback:
+                raise Exception(f"Failed to generate workout plan: {str(e)}")
             # Return a basic workout plan if AI generation fails
             return {
                 "weekly_schedule": {
                     "monday": [{"exercise": "Full body workout", "sets": 3, "reps": "10-12", "duration": "45 min"}],
                 },
                 "rest_days": ["sunday"],
-                "difficulty": "intermediate"
+                "difficulty": "intermediate",
+                "fallback": True
             }
+
+
+def _profile_lines(user_profile: Dict[str, Any]) -> str:
+    """Compact profile block for partial plan prompts."""
+    return f"""User:
+- Age: {user_profile.get('age', 'Not specified')}
+- Gender: {user_profile.get('gender', 'Not specified')}
+- Height: {user_profile.get('height', 'Not specified')} cm
+- Weight: {user_profile.get('weight', 'Not specified')} kg
+- Goals: {json.dumps(user_profile.get('goals', {}))}"""
@@ -0,0 +1,265 @@
+"""
+Validated, repairable parsing of LLM-generated diet and workout plans.
+
+Model output is parsed with orjson and checked against Pydantic schemas.
+Instead of discarding a whole generation over one bad token, the parser
+repairs what it can: truncated JSON is closed, numeric strings such as
+``"450 kcal"`` or ``"30g"`` are coerced, and meals or exercises that still
+fail validation are dropped. Whatever remains missing (whole days, or the
+calorie/macro targets) is reported so the caller can ask for just those
+sections.
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+from .diet_plan_edits import DAYS
+
+# Commas to backtrack over when closing truncated JSON
+MAX_REPAIR_CUTS = 64
+# Sections reported as missing besides day names
+TARGETS = "targets"
+
+_NUMERIC = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*(?:g|grams?|kcal|cal|calories|min|mins)?\s*$", re.I)
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _coerce_number(value: Any) -> Any:
+    """``"450 kcal"`` -> 450.0; anything else is left for validation."""
+    if isinstance(value, str):
+        match = _NUMERIC.match(value)
+        if match:
+            return float(match.group(1))
+    return value
+
+
+class Nutrients(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    protein: float = Field(0, ge=0)
+    carbs: float = Field(0, ge=0)
+    fats: float = Field(0, ge=0)
+
+    @field_validator("protein", "carbs", "fats", mode="before")
+    @classmethod
+    def _coerce(cls, value: Any) -> Any:
+        return _coerce_number(value)
+
+
+class Meal(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    meal: Optional[str] = None
+    name: str = Field(min_length=1)
+    calories: float = Field(ge=0, le=5000)
+    nutrients: Nutrients = Field(default_factory=Nutrients)
+
+    @field_validator("calories", mode="before")
+    @classmethod
+    def _coerce(cls, value: Any) -> Any:
+        return _coerce_number(value)
+
+
+class Macros(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    protein_grams: float = Field(ge=0)
+    carbs_grams: float = Field(ge=0)
+    fats_grams: float = Field(ge=0)
+
+    @field_validator("protein_grams", "carbs_grams", "fats_grams", mode="before")
+    @classmethod
+    def _coerce(cls, value: Any) -> Any:
+        return _coerce_number(value)
+
+
+class DietPlanTargets(BaseModel):
+    """Top-level targets of a diet plan (meals are validated one by one)."""
+
+    daily_calorie_target: float = Field(gt=0, le=10000)
+    macros: Macros
+
+    @field_validator("daily_calorie_target", mode="before")
+    @classmethod
+    def _coerce(cls, value: Any) -> Any:
+        return _coerce_number(value)
+
+
+class Exercise(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    exercise: str = Field(min_length=1)
+    sets: Optional[int] = Field(None, ge=0)
+    reps: Optional[str] = None
+    duration: Optional[str] = None
+
+    @field_validator("sets", mode="before")
+    @classmethod
+    def _coerce_sets(cls, value: Any) -> Any:
+        value = _coerce_number(value)
+        return int(value) if isinstance(value, float) and value.is_integer() else value
+
+    @field_validator("reps", "duration", mode="before")
+    @classmethod
+    def _stringify(cls, value: Any) -> Any:
+        return str(value) if isinstance(value, (int, float)) else value
+
+
+class WorkoutPlan(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    weekly_schedule: Dict[str, List[Exercise]]
+    rest_days: List[str] = []
+    difficulty: Optional[str] = None
+
+
+class PlanParseError(ValueError):
+    """Model output with nothing usable in it."""
+
+
+class ParsedPlan(NamedTuple):
+    plan: Optional[Dict[str, Any]]
+    # Days (and ``targets``) absent or with no valid meal
+    missing: List[str]
+    # True when anything had to be closed, coerced or dropped
+    repaired: bool
+
+
+def loads(content: str) -> Any:
+    """Parse JSON, closing truncated output if needed; None when unrecoverable."""
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError:
+        return close_truncated(content)
+
+
+def close_truncated(text: str) -> Any:
+    """
+    Parse JSON cut off mid-output (e.g. at ``max_tokens``).
+
+    Open strings, arrays and objects are closed; if that does not parse,
+    the text is cut back to the previous comma (dropping the partial
+    element) and closed again. Returns None when nothing parses.
+    """
+    text = text.strip()
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return None
+    text = text[start:]
+    for cut in [len(text)] + _commas(text)[::-1][:MAX_REPAIR_CUTS]:
+        try:
+            return orjson.loads(_close(text[:cut]))
+        except orjson.JSONDecodeError:
+            continue
+    return None
+
+
+def _commas(text: str) -> List[int]:
+    in_string = escaped = False
+    commas = []
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ",":
+            commas.append(i)
+    return commas
+
+
+def _close(prefix: str) -> str:
+    stack = []
+    in_string = escaped = False
+    for char in prefix:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        prefix += '"'
+    prefix = prefix.rstrip().rstrip(",:").rstrip()
+    return prefix + "".join(reversed(stack))
+
+
+def validate_meals(meals: Any) -> List[Dict[str, Any]]:
+    """The meals that validate (after coercion); invalid ones are dropped."""
+    valid = []
+    for meal in meals if isinstance(meals, list) else []:
+        try:
+            valid.append(Meal.model_validate(meal).model_dump(exclude_unset=True))
+        except ValidationError:
+            continue
+    return valid
+
+
+def parse_diet_plan(content: str) -> ParsedPlan:
+    """Parse and validate a weekly diet plan, salvaging what is valid."""
+    repaired = False
+    try:
+        data = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        data = close_truncated(content)
+        repaired = True
+    if not isinstance(data, dict):
+        return ParsedPlan(None, list(DAYS) + [TARGETS], repaired)
+
+    plan = dict(data)
+    missing = []
+    try:
+        plan.update(DietPlanTargets.model_validate(data).model_dump(exclude_unset=True))
+    except ValidationError:
+        plan.pop("daily_calorie_target", None)
+        plan.pop("macros", None)
+        missing.append(TARGETS)
+
+    weekly_plan = {}
+    days = data.get("weekly_plan") if isinstance(data.get("weekly_plan"), dict) else {}
+    for day, meals in days.items():
+        # Keys such as "day 1" would leave every weekday missing
+        key = day.strip().lower()
+        if key not in DAYS:
+            repaired = True
+            continue
+        valid = validate_meals(meals)
+        repaired |= valid != meals or key != day
+        if valid:
+            weekly_plan[key] = valid
+    plan["weekly_plan"] = weekly_plan
+    missing = [day for day in DAYS if day not in weekly_plan] + missing
+    return ParsedPlan(plan, missing, repaired or bool(missing))
+
+
+def parse_workout_plan(content: str) -> Optional[Dict[str, Any]]:
+    """Parse and validate a workout plan, dropping invalid exercises; None if unusable."""
+    data = loads(content)
+    if not isinstance(data, dict) or not isinstance(data.get("weekly_schedule"), dict):
+        return None
+    schedule = {}
+    for day, exercises in data["weekly_schedule"].items():
+        valid = []
+        for exercise in exercises if isinstance(exercises, list) else []:
+            try:
+                valid.append(Exercise.model_validate(exercise).model_dump(exclude_unset=True))
+            except ValidationError:
+                continue
+        schedule[day] = valid
+    try:
+        return WorkoutPlan.model_validate(dict(data, weekly_schedule=schedule)).model_dump(exclude_unset=True)
+    except ValidationError:
+        return None
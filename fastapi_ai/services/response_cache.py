@@ -0,0 +1,207 @@
+"""
+Response cache in front of OpenAIService.
+
+Responses are keyed on the normalized prompt plus a bucketed user profile
+(age, weight and height bands, gender and goal set), so near-identical
+requests from similar users share an answer. An optional semantic tier
+embeds chatbot questions and serves a cached answer when a previous
+question with the same profile bucket is similar enough.
+"""
+import hashlib
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .. import config
+from .cache import TTLCache
+
+Embedder = Callable[[str], Awaitable[List[float]]]
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+# Profile field -> band width used for bucketing
+PROFILE_BANDS = {"age": 5, "weight": 5, "height": 5}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case- and whitespace-insensitive form of a prompt."""
+    prompt = _WHITESPACE.sub(" ", prompt.lower()).strip()
+    return _TRAILING_PUNCTUATION.sub("", prompt)
+
+
+def bucket_profile(profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reduce a user profile to coarse bands so similar users share a bucket."""
+    if not profile:
+        return {}
+    bucketed = {}
+    for field, width in PROFILE_BANDS.items():
+        value = profile.get(field)
+        if isinstance(value, (int, float)):
+            low = int(value // width * width)
+            bucketed[field] = f"{low}-{low + width - 1}"
+    if profile.get("gender"):
+        bucketed["gender"] = str(profile["gender"]).lower()
+    goals = profile.get("goals")
+    if isinstance(goals, dict):
+        bucketed["goals"] = sorted(goal for goal, enabled in goals.items() if enabled)
+    elif isinstance(goals, (list, tuple)):
+        bucketed["goals"] = sorted(str(goal).lower() for goal in goals)
+    elif goals:
+        bucketed["goals"] = [str(goals).lower()]
+    return bucketed
+
+
+class VectorIndex:
+    """Brute-force cosine-similarity index over unit-normalized embeddings."""
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._groups: List[str] = []
+        # Rows beyond len(self._keys) are spare capacity
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, group: str, vector: np.ndarray) -> None:
+        size = len(self._keys)
+        if self._matrix is None:
+            self._matrix = np.empty((16, vector.shape[0]), dtype=np.float32)
+        elif size == self._matrix.shape[0]:
+            grown = np.empty((size * 2, self._matrix.shape[1]), dtype=np.float32)
+            grown[:size] = self._matrix
+            self._matrix = grown
+        self._matrix[size] = vector
+        self._keys.append(key)
+        self._groups.append(group)
+
+    def search(self, vector: np.ndarray, group: str) -> Optional[Tuple[str, float]]:
+        """Most similar entry in ``group`` as ``(key, cosine similarity)``."""
+        rows = [i for i, g in enumerate(self._groups) if g == group]
+        if not rows:
+            return None
+        scores = self._matrix[rows] @ vector
+        best = int(np.argmax(scores))
+        return self._keys[rows[best]], float(scores[best])
+
+    def retain(self, keep: Callable[[str], bool]) -> None:
+        """Drop every entry whose key fails ``keep``."""
+        rows = [i for i, key in enumerate(self._keys) if keep(key)]
+        if len(rows) == len(self._keys):
+            return
+        self._keys = [self._keys[i] for i in rows]
+        self._groups = [self._groups[i] for i in rows]
+        self._matrix = self._matrix[rows] if rows else None
+
+
+class CacheLookup:
+    """Result of a cache lookup, reused to store the response on a miss."""
+
+    def __init__(self, namespace: str, key: str, group: str, value: Any = None,
+                 tier: Optional[str] = None, embedding: Optional[np.ndarray] = None):
+        self.namespace = namespace
+        self.key = key
+        self.group = group
+        self.value = value
+        self.tier = tier
+        self.embedding = embedding
+
+    @property
+    def hit(self) -> bool:
+        return self.tier is not None
+
+
+class ResponseCache:
+    """Exact + optional semantic cache for LLM responses."""
+
+    def __init__(
+        self,
+        max_entries: int = config.RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: float = config.RESPONSE_CACHE_TTL,
+        similarity_threshold: float = config.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+        embedder: Optional[Embedder] = None,
+    ):
+        self.entries = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder
+        self.index = VectorIndex()
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    async def lookup(
+        self,
+        namespace: str,
+        prompt: str,
+        context: Optional[Dict[str, Any]] = None,
+        semantic: bool = True,
+    ) -> CacheLookup:
+        """
+        Find a cached response for ``prompt`` under the bucketed ``context``.
+
+        The exact tier is checked first; the semantic tier is only consulted
+        when an embedder is configured and ``semantic`` is set.
+        """
+        group = self._key(namespace, "", context)
+        key = self._key(namespace, normalize_prompt(prompt), context)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self._count(namespace, "exact_hits")
+            return CacheLookup(namespace, key, group, entry[0], "exact")
+
+        embedding = None
+        if semantic and self.embedder is not None and prompt:
+            embedding = await self._embed(prompt)
+            if embedding is not None:
+                match = self.index.search(embedding, group)
+                if match is not None and match[1] >= self.similarity_threshold:
+                    entry = self.entries.get(match[0])
+                    if entry is not None:
+                        self._count(namespace, "semantic_hits")
+                        return CacheLookup(namespace, key, group, entry[0], "semantic", embedding)
+
+        self._count(namespace, "misses")
+        return CacheLookup(namespace, key, group, embedding=embedding)
+
+    def store(self, lookup: CacheLookup, value: Any) -> None:
+        """Cache the response for a lookup that missed."""
+        self.entries.set(lookup.key, value)
+        if lookup.embedding is not None:
+            self.index.add(lookup.key, lookup.group, lookup.embedding)
+            # Keep the vector index in step with LRU/TTL eviction
+            if len(self.index) > 2 * max(len(self.entries), 1):
+                self.index.retain(lambda key: key in self.entries)
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, counts in self.counters.items():
+            hits = counts.get("exact_hits", 0) + counts.get("semantic_hits", 0)
+            lookups = hits + counts.get("misses", 0)
+            namespaces[namespace] = dict(counts, hit_rate=hits / lookups if lookups else 0.0)
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.entries.max_entries,
+            "vectors": len(self.index),
+            "semantic_enabled": self.embedder is not None,
+            "similarity_threshold": self.similarity_threshold,
+            "namespaces": namespaces,
+        }
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(await self.embedder(normalize_prompt(text)), dtype=np.float32)
+        except Exception:
+            # The semantic tier is best-effort; fall back to exact matching
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _count(self, namespace: str, counter: str) -> None:
+        counts = self.counters.setdefault(namespace, {"exact_hits": 0, "semantic_hits": 0, "misses": 0})
+        counts[counter] += 1
+
+    @staticmethod
+    def _key(namespace: str, prompt: str, context: Optional[Dict[str, Any]]) -> str:
+        payload = json.dumps([namespace, prompt, bucket_profile(context)], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
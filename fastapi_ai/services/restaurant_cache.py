@@ -0,0 +1,189 @@
+"""
+Tile and place-details cache for nearby restaurant searches.
+
+Searches are snapped to geohash tiles (see ``geo.covering_tiles``); each
+tile's Google Places results are cached with ``MAPS_TILE_TTL`` and place
+details are cached by ``place_id`` with the longer ``MAPS_DETAILS_TTL``.
+Tier 1 is in-process; tier 2 is the ``restaurants`` table, which keeps
+every place seen with its geohash so a tile can be rebuilt from MySQL.
+"""
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from .. import config
+from ..db import Database
+from .cache import SingleFlight, TTLCache
+from .geo import geohash_encode
+
+logger = logging.getLogger(__name__)
+
+# Geohash precision stored per place; any coarser tile is a prefix of it
+PLACE_GEOHASH_PRECISION = 9
+
+TileLoader = Callable[[str], Awaitable[List[Dict[str, Any]]]]
+
+
+class RestaurantCache:
+    """LRU + MySQL cache for restaurant tiles and place details."""
+
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        tile_ttl: float = config.MAPS_TILE_TTL,
+        details_ttl: float = config.MAPS_DETAILS_TTL,
+        max_tiles: int = config.MAPS_TILE_CACHE_MAX_ENTRIES,
+        max_details: int = config.MAPS_DETAILS_CACHE_MAX_ENTRIES,
+    ):
+        self.db = db
+        self.tile_ttl = tile_ttl
+        self.details_ttl = details_ttl
+        self.tiles = TTLCache(max_entries=max_tiles, ttl=tile_ttl)
+        self.details = TTLCache(max_entries=max_details, ttl=details_ttl)
+        self.single_flight = SingleFlight()
+        self.counters = {"tile_hits": 0, "tile_misses": 0, "details_hits": 0, "details_misses": 0}
+
+    async def get_tile(self, tile: str, loader: TileLoader) -> List[Dict[str, Any]]:
+        """
+        Restaurants inside ``tile``, calling ``loader`` on a miss.
+
+        Concurrent misses for the same tile share one ``loader`` call.
+        """
+        entry = self.tiles.get(tile)
+        if entry is not None:
+            self.counters["tile_hits"] += 1
+            return entry[0]
+
+        async def load() -> List[Dict[str, Any]]:
+            stored = await self._db_tile(tile)
+            if stored:
+                self.counters["tile_hits"] += 1
+                self.tiles.set(tile, stored)
+                return stored
+            self.counters["tile_misses"] += 1
+            places = await loader(tile)
+            self.tiles.set(tile, places)
+            await self._db_save_places(places)
+            return places
+
+        places, _ = await self.single_flight.do(tile, load)
+        return places
+
+    async def get_details(self, place_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached details for whichever of ``place_ids`` are known."""
+        found = {}
+        missing = []
+        for place_id in place_ids:
+            entry = self.details.get(place_id)
+            if entry is not None:
+                found[place_id] = entry[0]
+            else:
+                missing.append(place_id)
+        if missing:
+            stored = await self._db_details(missing)
+            for place_id, (details, cached_at) in stored.items():
+                self.details.set(place_id, details, cached_at=cached_at)
+                found[place_id] = details
+        self.counters["details_hits"] += len(found)
+        return found
+
+    async def set_details(self, place_id: str, details: Dict[str, Any]) -> None:
+        cached_at = time.time()
+        self.counters["details_misses"] += 1
+        self.details.set(place_id, details, cached_at=cached_at)
+        if self.db is None:
+            return
+        try:
+            await self.db.execute(
+                "UPDATE restaurants SET details = %s, details_cached_at = %s WHERE place_id = %s",
+                (json.dumps(details), cached_at, place_id),
+            )
+        except Exception as e:
+            logger.warning("Failed to persist place details for %s: %s", place_id, e)
+
+    def stats(self) -> Dict[str, Any]:
+        tile_lookups = self.counters["tile_hits"] + self.counters["tile_misses"]
+        details_lookups = self.counters["details_hits"] + self.counters["details_misses"]
+        return dict(
+            self.counters,
+            tile_hit_ratio=self.counters["tile_hits"] / tile_lookups if tile_lookups else 0.0,
+            details_hit_ratio=(
+                self.counters["details_hits"] / details_lookups if details_lookups else 0.0
+            ),
+            tiles=len(self.tiles),
+            details=len(self.details),
+        )
+
+    async def _db_tile(self, tile: str) -> List[Dict[str, Any]]:
+        if self.db is None:
+            return []
+        try:
+            rows = await self.db.fetchall(
+                "SELECT place_id, name, location, data FROM restaurants "
+                "WHERE geohash LIKE %s AND fetched_at > %s",
+                (tile + "%", time.time() - self.tile_ttl),
+            )
+        except Exception as e:
+            logger.warning("Restaurant tile lookup failed for %s: %s", tile, e)
+            return []
+        places = []
+        for row in rows:
+            place = _load_json(row["data"]) or {}
+            place.update(
+                place_id=row["place_id"],
+                name=row["name"],
+                location=_load_json(row["location"]),
+            )
+            places.append(place)
+        return places
+
+    async def _db_save_places(self, places: List[Dict[str, Any]]) -> None:
+        if self.db is None or not places:
+            return
+        fetched_at = time.time()
+        rows = []
+        for place in places:
+            location = place["location"]
+            data = {key: place.get(key) for key in ("rating", "price_level", "address", "types")}
+            rows.append((
+                place["place_id"],
+                place["name"],
+                json.dumps(location),
+                geohash_encode(location["latitude"], location["longitude"], PLACE_GEOHASH_PRECISION),
+                json.dumps(data),
+                fetched_at,
+            ))
+        try:
+            await self.db.executemany(
+                "INSERT INTO restaurants "
+                "(place_id, name, location, geohash, data, fetched_at, created_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, UTC_TIMESTAMP()) "
+                "ON DUPLICATE KEY UPDATE name = VALUES(name), location = VALUES(location), "
+                "geohash = VALUES(geohash), data = VALUES(data), fetched_at = VALUES(fetched_at)",
+                rows,
+            )
+        except Exception as e:
+            logger.warning("Failed to persist %d restaurants: %s", len(rows), e)
+
+    async def _db_details(self, place_ids: List[str]) -> Dict[str, Any]:
+        if self.db is None:
+            return {}
+        try:
+            rows = await self.db.fetchall(
+                "SELECT place_id, details, details_cached_at FROM restaurants "
+                f"WHERE place_id IN ({', '.join(['%s'] * len(place_ids))}) "
+                "AND details_cached_at > %s",
+                (*place_ids, time.time() - self.details_ttl),
+            )
+        except Exception as e:
+            logger.warning("Place details lookup failed: %s", e)
+            return {}
+        return {
+            row["place_id"]: (_load_json(row["details"]), row["details_cached_at"])
+            for row in rows
+        }
+
+
+def _load_json(value: Any) -> Any:
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
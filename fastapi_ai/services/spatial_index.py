@@ -0,0 +1,223 @@
+"""
+In-process spatial index over stored restaurants.
+
+Places are bucketed into a uniform latitude/longitude grid so radius and
+k-nearest queries only look at nearby cells. The index is filled from the
+``restaurants`` table (incrementally, by ``fetched_at``) and from upstream
+search results as they arrive, so "what's near me" can be answered without
+calling Google Places.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .. import config
+from ..db import Database
+from .geo import METERS_PER_DEGREE_LAT, haversine_m
+
+logger = logging.getLogger(__name__)
+
+# Fields kept per place; per-request fields (details, distance) are dropped
+PLACE_FIELDS = ("place_id", "name", "location", "rating", "price_level", "address", "types")
+
+Cell = Tuple[int, int]
+
+
+class SpatialIndex:
+    """Grid index of places supporting radius and k-nearest queries."""
+
+    def __init__(self, cell_degrees: float = config.RESTAURANT_INDEX_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._places: Dict[str, Dict[str, Any]] = {}
+        self._cell_of: Dict[str, Cell] = {}
+        self._cells: Dict[Cell, Dict[str, Dict[str, Any]]] = {}
+        # Grown-only extent of populated cells: [min_row, max_row, min_col, max_col]
+        self._extent: Optional[List[int]] = None
+        # Keyset watermark for incremental refreshes: (fetched_at, id)
+        self._watermark: Tuple[float, int] = (0.0, 0)
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def upsert(self, place: Dict[str, Any]) -> None:
+        """Add or move a place (needs ``place_id`` and ``location``)."""
+        place_id = place.get("place_id")
+        location = place.get("location")
+        if not place_id or not location:
+            return
+        place = {field: place.get(field) for field in PLACE_FIELDS}
+        cell = self._cell(location["latitude"], location["longitude"])
+        previous = self._cell_of.get(place_id)
+        if previous is not None and previous != cell:
+            self._discard(place_id, previous)
+        self._places[place_id] = place
+        self._cell_of[place_id] = cell
+        self._cells.setdefault(cell, {})[place_id] = place
+        if self._extent is None:
+            self._extent = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            extent = self._extent
+            extent[0], extent[1] = min(extent[0], cell[0]), max(extent[1], cell[0])
+            extent[2], extent[3] = min(extent[2], cell[1]), max(extent[3], cell[1])
+
+    def upsert_many(self, places: Iterable[Dict[str, Any]]) -> None:
+        for place in places:
+            self.upsert(place)
+
+    def remove(self, place_id: str) -> bool:
+        cell = self._cell_of.pop(place_id, None)
+        if cell is None:
+            return False
+        self._discard(place_id, cell)
+        del self._places[place_id]
+        return True
+
+    def within(self, lat: float, lng: float, radius_m: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """Places within ``radius_m`` as ``(distance_m, place)``, nearest first."""
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlng = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        low = self._cell(lat - dlat, lng - dlng)
+        high = self._cell(lat + dlat, lng + dlng)
+        results = []
+        for place in self._places_in(low, high):
+            distance = _distance(lat, lng, place)
+            if distance <= radius_m:
+                results.append((distance, place))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int,
+        max_distance_m: float = math.inf,
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        The ``k`` places nearest to a point (within ``max_distance_m``).
+
+        Scans rings of cells outwards from the query cell and stops once no
+        unscanned cell can hold anything closer than the current k-th result.
+        """
+        if not self._cells or k <= 0:
+            return []
+        center = self._cell(lat, lng)
+        # Rings needed to reach every populated cell
+        min_row, max_row, min_col, max_col = self._extent
+        max_ring = max(
+            center[0] - min_row, max_row - center[0], center[1] - min_col, max_col - center[1], 0
+        )
+        # Smallest cell side in meters, bounding how close ring r can be
+        cell_m = self.cell_degrees * METERS_PER_DEGREE_LAT * max(
+            math.cos(math.radians(min(abs(lat) + self.cell_degrees * (max_ring + 1), 89.9))), 0.01
+        )
+        best: List[Tuple[float, str, Dict[str, Any]]] = []  # max-heap via negated distance
+        for ring in range(max_ring + 1):
+            ring_distance = max(ring - 1, 0) * cell_m
+            if ring_distance > max_distance_m:
+                break
+            if len(best) == k and ring_distance > -best[0][0]:
+                break
+            for cell in _ring_cells(center, ring):
+                for place_id, place in self._cells.get(cell, {}).items():
+                    distance = _distance(lat, lng, place)
+                    if distance > max_distance_m:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, place_id, place))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, place_id, place))
+        return sorted(((-negated, place) for negated, _, place in best), key=lambda r: r[0])
+
+    async def refresh(self, db: Database, batch_size: int = 5000) -> int:
+        """Load rows written to ``restaurants`` since the last refresh; returns the count."""
+        loaded = 0
+        while True:
+            fetched_at, last_id = self._watermark
+            rows = await db.fetchall(
+                "SELECT id, place_id, name, lat, lng, data, fetched_at FROM restaurants "
+                "WHERE place_id IS NOT NULL AND lat IS NOT NULL AND lng IS NOT NULL "
+                "AND (fetched_at > %s OR (fetched_at = %s AND id > %s)) "
+                "ORDER BY fetched_at, id LIMIT %s",
+                (fetched_at, fetched_at, last_id, batch_size),
+            )
+            for row in rows:
+                data = row["data"]
+                place = json.loads(data) if isinstance(data, (str, bytes)) else dict(data or {})
+                place.update(
+                    place_id=row["place_id"],
+                    name=row["name"],
+                    location={"latitude": row["lat"], "longitude": row["lng"]},
+                )
+                self.upsert(place)
+            loaded += len(rows)
+            if rows:
+                self._watermark = (rows[-1]["fetched_at"], rows[-1]["id"])
+            if len(rows) < batch_size:
+                return loaded
+
+    async def refresh_periodically(self, db: Database, interval: float) -> None:
+        """Keep refreshing from MySQL every ``interval`` seconds (run as a task)."""
+        while True:
+            try:
+                loaded = await self.refresh(db)
+                if loaded:
+                    logger.info("Restaurant index loaded %d places (%d total)", loaded, len(self))
+            except Exception as e:
+                logger.warning("Restaurant index refresh failed: %s", e)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "places": len(self._places),
+            "cells": len(self._cells),
+            "cell_degrees": self.cell_degrees,
+            "watermark": self._watermark[0],
+        }
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def _discard(self, place_id: str, cell: Cell) -> None:
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(place_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _places_in(self, low: Cell, high: Cell) -> Iterator[Dict[str, Any]]:
+        rows = high[0] - low[0] + 1
+        cols = high[1] - low[1] + 1
+        if rows * cols > len(self._cells):
+            # Sparse index: cheaper to walk the populated cells
+            for (row, col), bucket in self._cells.items():
+                if low[0] <= row <= high[0] and low[1] <= col <= high[1]:
+                    yield from bucket.values()
+            return
+        for row in range(low[0], high[0] + 1):
+            for col in range(low[1], high[1] + 1):
+                bucket = self._cells.get((row, col))
+                if bucket:
+                    yield from bucket.values()
+
+
+def _ring_cells(center: Cell, ring: int) -> Iterator[Cell]:
+    """Cells at Chebyshev distance ``ring`` from ``center``."""
+    row, col = center
+    if ring == 0:
+        yield center
+        return
+    for dcol in range(-ring, ring + 1):
+        yield row - ring, col + dcol
+        yield row + ring, col + dcol
+    for drow in range(-ring + 1, ring):
+        yield row + drow, col - ring
+        yield row + drow, col + ring
+
+
+def _distance(lat: float, lng: float, place: Dict[str, Any]) -> float:
+    location = place["location"]
+    return haversine_m(lat, lng, location["latitude"], location["longitude"])
@@ -0,0 +1,203 @@
+"""
+OpenAI token and cost accounting with per-user and global budgets.
+
+Every completion's ``usage`` block is recorded per user, endpoint and
+model, aggregated in memory and flushed to the ``openai_usage`` table in
+batches. Before each call the caller asks ``route`` which model to use:
+once a user (or the service as a whole) has spent its daily budget,
+requests are downgraded to ``OPENAI_BUDGET_MODEL`` instead of rejected.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timezone
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from .. import config
+from ..db import Database
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens: (prompt, completion). Unknown models are billed at DEFAULT_PRICE.
+MODEL_PRICES = {
+    "gpt-4-turbo-preview": (10.0, 30.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (5.0, 15.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+DEFAULT_PRICE = (10.0, 30.0)
+
+# user_id stored for calls without a known user
+ANONYMOUS = 0
+
+# (day, user_id, endpoint, model)
+UsageKey = Tuple[date, int, str, str]
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, DEFAULT_PRICE)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for streams that report no usage."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class ModelChoice(NamedTuple):
+    model: str
+    downgraded: bool
+    reason: Optional[str]
+
+
+class UsageTracker:
+    """In-memory usage aggregation with budget checks and batched MySQL flushes."""
+
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        user_daily_budget: float = config.OPENAI_USER_DAILY_BUDGET_USD,
+        global_daily_budget: float = config.OPENAI_GLOBAL_DAILY_BUDGET_USD,
+        budget_model: str = config.OPENAI_BUDGET_MODEL,
+    ):
+        self.db = db
+        self.user_daily_budget = user_daily_budget
+        self.global_daily_budget = global_daily_budget
+        self.budget_model = budget_model
+        self._day = _today()
+        # Spend so far today, including flushed usage
+        self._user_spend: Dict[int, float] = {}
+        self._global_spend = 0.0
+        # Not yet flushed: key -> [calls, prompt_tokens, completion_tokens, cost_usd]
+        self._pending: Dict[UsageKey, list] = {}
+        self.counters = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "downgraded": 0}
+
+    def route(self, user_id: Optional[int], model: str) -> ModelChoice:
+        """The model to call for ``user_id``: ``model`` or, over budget, the budget model."""
+        self._roll_day()
+        reason = None
+        if self.global_daily_budget and self._global_spend >= self.global_daily_budget:
+            reason = "global_budget"
+        elif (
+            self.user_daily_budget
+            and user_id is not None
+            and self._user_spend.get(user_id, 0.0) >= self.user_daily_budget
+        ):
+            reason = "user_budget"
+        if reason is None or model == self.budget_model:
+            return ModelChoice(model, False, None)
+        self.counters["downgraded"] += 1
+        return ModelChoice(self.budget_model, True, reason)
+
+    def record(
+        self,
+        user_id: Optional[int],
+        endpoint: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+    ) -> float:
+        """Account for one call; returns its cost in USD."""
+        self._roll_day()
+        cost = cost_usd(model, prompt_tokens, completion_tokens)
+        user = ANONYMOUS if user_id is None else user_id
+        entry = self._pending.setdefault((self._day, user, endpoint, model), [0, 0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += prompt_tokens
+        entry[2] += completion_tokens
+        entry[3] += cost
+        if user_id is not None:
+            self._user_spend[user_id] = self._user_spend.get(user_id, 0.0) + cost
+        self._global_spend += cost
+        self.counters["calls"] += 1
+        self.counters["prompt_tokens"] += prompt_tokens
+        self.counters["completion_tokens"] += completion_tokens
+        return cost
+
+    def spend(self, user_id: Optional[int] = None) -> float:
+        """USD spent today by ``user_id``, or by everyone when None."""
+        self._roll_day()
+        if user_id is None:
+            return self._global_spend
+        return self._user_spend.get(user_id, 0.0)
+
+    async def load_today(self) -> None:
+        """Seed today's spend from MySQL so budgets survive restarts."""
+        if self.db is None:
+            return
+        try:
+            rows = await self.db.fetchall(
+                "SELECT user_id, SUM(cost_usd) AS cost FROM openai_usage "
+                "WHERE day = %s GROUP BY user_id",
+                (self._day,),
+            )
+        except Exception as e:
+            logger.warning("Failed to load today's OpenAI usage: %s", e)
+            return
+        for row in rows:
+            cost = float(row["cost"] or 0)
+            if row["user_id"] != ANONYMOUS:
+                self._user_spend[row["user_id"]] = self._user_spend.get(row["user_id"], 0.0) + cost
+            self._global_spend += cost
+
+    async def flush(self) -> int:
+        """Write pending aggregates to MySQL; returns the number of rows written."""
+        if self.db is None or not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        rows = [
+            (day, user_id, endpoint, model, calls, prompt, completion, cost)
+            for (day, user_id, endpoint, model), (calls, prompt, completion, cost) in pending.items()
+        ]
+        try:
+            await self.db.executemany(
+                "INSERT INTO openai_usage "
+                "(day, user_id, endpoint, model, calls, prompt_tokens, completion_tokens, cost_usd) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE calls = calls + VALUES(calls), "
+                "prompt_tokens = prompt_tokens + VALUES(prompt_tokens), "
+                "completion_tokens = completion_tokens + VALUES(completion_tokens), "
+                "cost_usd = cost_usd + VALUES(cost_usd)",
+                rows,
+            )
+        except Exception as e:
+            logger.warning("Failed to flush %d OpenAI usage rows: %s", len(rows), e)
+            # Keep the usage for the next flush
+            for key, values in pending.items():
+                entry = self._pending.setdefault(key, [0, 0, 0, 0.0])
+                for i, value in enumerate(values):
+                    entry[i] += value
+            return 0
+        return len(rows)
+
+    async def flush_periodically(self, interval: float) -> None:
+        """Flush every ``interval`` seconds (run as a task)."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        self._roll_day()
+        return dict(
+            self.counters,
+            spend_today_usd=round(self._global_spend, 4),
+            global_daily_budget_usd=self.global_daily_budget or None,
+            user_daily_budget_usd=self.user_daily_budget or None,
+            users_over_budget=sum(
+                1 for spend in self._user_spend.values()
+                if self.user_daily_budget and spend >= self.user_daily_budget
+            ),
+            pending_rows=len(self._pending),
+        )
+
+    def _roll_day(self) -> None:
+        today = _today()
+        if today != self._day:
+            self._day = today
+            self._user_spend.clear()
+            self._global_spend = 0.0
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
@@ -27,6 +27,19 @@ def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
+    assert "response_cache" in response.json()
+    assert "upstreams" in response.json()
+
+
+def test_metrics_endpoint_reports_route_latency():
+    """Test /metrics exposes per-route request metrics in Prometheus format."""
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/health",status="200"}' in response.text
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/health"}' in response.text
+    assert "cache_hit_ratio" in response.text
 
 
 @patch('fastapi_ai.routes.chatbot.OpenAIService')
@@ -108,3 +121,187 @@ def test_nearby_restaurants(mock_maps_service):
     assert response.status_code == 200
     assert "restaurants" in response.json()
     assert len(response.json()["restaurants"]) > 0
+
+
+@patch('fastapi_ai.routes.restaurant.MapsService')
+def test_nearby_restaurants_without_details(mock_maps_service):
+    """Test the include_details flag is forwarded to the maps service."""
+    mock_service_instance = mock_maps_service.return_value
+    mock_service_instance.find_healthy_restaurants = AsyncMock(return_value=[])
+    
+    response = client.get(
+        "/restaurant/nearby",
+        params={"latitude": 40.7128, "longitude": -74.0060, "include_details": "false"}
+    )
+    
+    assert response.status_code == 200
+    kwargs = mock_service_instance.find_healthy_restaurants.call_args.kwargs
+    assert kwargs["include_details"] is False
+
+
+
+@patch('fastapi_ai.config.ADMIN_API_TOKEN', 'secret')
+def test_nutrition_cache_admin_requires_token():
+    """Test admin cache endpoints reject missing or wrong tokens."""
+    assert client.delete("/food/cache/banana").status_code == 401
+    assert client.delete(
+        "/food/cache/banana", headers={"X-Admin-Token": "wrong"}
+    ).status_code == 401
+    
+    response = client.delete("/food/cache/banana", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json() == {"name": "banana", "removed": False}
+
+
+@patch('fastapi_ai.routes.food.NutritionService')
+def test_analyze_food_batch(mock_nutrition_service):
+    """Test batch food analysis returns per-item results and errors."""
+    mock_service_instance = mock_nutrition_service.return_value
+    mock_service_instance.analyze_batch = AsyncMock(return_value=[
+        {"name": "Banana", "quantity": 2, "calories": 178, "nutrients": {"carbs": 45.6}},
+        {"name": "", "quantity": 1, "error": "Food name is required"},
+    ])
+    
+    response = client.post(
+        "/food/analyze/batch",
+        json={"items": [{"name": "Banana", "quantity": 2}, {"name": ""}]}
+    )
+    
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["calories"] == 178
+    assert results[1]["error"] == "Food name is required"
+
+
+@patch('fastapi_ai.routes.food.NutritionService')
+def test_analyze_food_batch_rejects_non_positive_quantities(mock_nutrition_service):
+    """Test zero, negative and null quantities are rejected before any lookup."""
+    for quantity in (0, -2, None):
+        response = client.post(
+            "/food/analyze/batch",
+            json={"items": [{"name": "Banana", "quantity": quantity}]}
+        )
+        assert response.status_code == 422
+    mock_nutrition_service.return_value.analyze_batch.assert_not_called()
+
+
+def _token_stream(*tokens):
+    async def stream(query, user_context=None, user_id=None, user_tier=None):
+        for token in tokens:
+            yield token
+    return stream
+
+
+@patch('fastapi_ai.routes.chatbot.OpenAIService')
+def test_chatbot_query_stream(mock_openai_service):
+    """Test streamed chatbot responses are sent as Server-Sent Events."""
+    mock_service_instance = mock_openai_service.return_value
+    mock_service_instance.chat_completion_stream = _token_stream("Eat ", "more ", "vegetables!")
+    
+    response = client.post(
+        "/chatbot/query",
+        params={"stream": "true"},
+        json={"query": "What should I eat for breakfast?"}
+    )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert 'data: {"token": "Eat "}' in response.text
+    assert response.text.endswith("event: done\ndata: {}\n\n")
+
+
+@patch('fastapi_ai.routes.chatbot.OpenAIService')
+def test_chatbot_websocket(mock_openai_service):
+    """Test chatbot answers are streamed over the WebSocket."""
+    mock_service_instance = mock_openai_service.return_value
+    mock_service_instance.chat_completion_stream = _token_stream("Oats ", "and fruit")
+    
+    with client.websocket_connect("/chatbot/ws") as websocket:
+        websocket.send_json({"query": "Breakfast ideas?"})
+        messages = [websocket.receive_json() for _ in range(3)]
+    
+    assert [m["type"] for m in messages] == ["token", "token", "done"]
+    assert "".join(m.get("content", "") for m in messages) == "Oats and fruit"
+
+
+@patch('fastapi_ai.routes.diet.OpenAIService')
+def test_generate_diet_plan_without_workout(mock_openai_service):
+    """Test include_workout=false is forwarded to the OpenAI service."""
+    mock_service_instance = mock_openai_service.return_value
+    mock_service_instance.generate_diet_plan = AsyncMock(return_value={"weekly_plan": {}})
+    
+    response = client.post(
+        "/diet/generate",
+        params={"include_workout": "false"},
+        json={"age": 30, "weight": 80}
+    )
+    
+    assert response.status_code == 200
+    assert mock_service_instance.generate_diet_plan.call_args.kwargs["include_workout"] is False
+
+
+@patch('fastapi_ai.routes.diet.OpenAIService')
+def test_generate_diet_plan_fast_mode_skips_openai(mock_openai_service):
+    """Test mode=fast returns a locally planned diet without calling OpenAI."""
+    response = client.post(
+        "/diet/generate",
+        params={"mode": "fast"},
+        json={"age": 30, "gender": "female", "height": 165, "weight": 60}
+    )
+    
+    assert response.status_code == 200
+    plan = response.json()["plan"]
+    assert plan["generated_by"] == "planner"
+    assert plan["daily_calorie_target"] > 0 and len(plan["weekly_plan"]) == 7
+    mock_openai_service.assert_not_called()
+
+
+@patch('fastapi_ai.services.openai_service.client')
+def test_regenerate_workout_failure_keeps_stored_plan(mock_client):
+    """Test plan edits need X-User-Id and a failed workout generation saves nothing."""
+    from fastapi_ai.dependencies import get_diet_plan_repository
+    
+    plans = AsyncMock()
+    plans.get = AsyncMock(return_value={"id": 3, "user_id": 7, "plan": {"weekly_plan": {}}})
+    mock_client.chat.completions.create = AsyncMock(side_effect=RuntimeError("upstream down"))
+    app.dependency_overrides[get_diet_plan_repository] = lambda: plans
+    try:
+        anonymous = client.post("/diet/plans/3/regenerate", json={"section": "workout"})
+        failed = client.post(
+            "/diet/plans/3/regenerate", json={"section": "workout"}, headers={"X-User-Id": "7"}
+        )
+    finally:
+        app.dependency_overrides.pop(get_diet_plan_repository, None)
+    
+    assert anonymous.status_code == 401
+    assert failed.status_code == 500
+    plans.get.assert_awaited_once_with(3, user_id=7)
+    plans.update_plan.assert_not_awaited()
+
+
+def test_diet_plan_job_submit_and_poll():
+    """Test diet plan jobs are queued and polled through the jobs endpoints."""
+    from fastapi_ai.dependencies import get_diet_jobs
+    from fastapi_ai.services.diet_jobs import DietJob, DietJobQueue
+    
+    job = DietJob.new(7, {"age": 30}, True)
+    jobs = DietJobQueue(AsyncMock())
+    jobs.submit = AsyncMock(return_value=(job, False))
+    jobs.wait = AsyncMock(return_value=job)
+    app.dependency_overrides[get_diet_jobs] = lambda: jobs
+    try:
+        submitted = client.post(
+            "/diet/jobs", json={"age": 30, "user_id": 8}, headers={"X-User-Id": "7", "X-User-Tier": "free"}
+        )
+        job.status = "succeeded"
+        job.result = {"weekly_plan": {}}
+        polled = client.get(f"/diet/jobs/{job.id}", params={"wait": 5})
+    finally:
+        app.dependency_overrides.pop(get_diet_jobs, None)
+    
+    assert submitted.status_code == 202
+    assert submitted.json()["status"] == "queued"
+    # The body cannot pick the user the plan is saved for
+    assert jobs.submit.call_args.kwargs["user_id"] == 7
+    assert jobs.submit.call_args.kwargs["user_tier"] == "free"
+    assert polled.json()["plan"] == {"weekly_plan": {}}
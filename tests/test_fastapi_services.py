@@ -0,0 +1,1142 @@
+"""
+Unit tests for FastAPI services.
+"""
+import asyncio
+import json
+import time
+from contextlib import suppress
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import httpx
+
+from fastapi_ai import metrics
+from fastapi_ai.db import Database, PoolTimeout
+from fastapi_ai.http_clients import HTTPClients, NUTRITIONIX, GOOGLE_PLACES
+from fastapi_ai.resilience import CircuitBreaker, CircuitOpenError, Upstream, hedged
+from fastapi_ai.schema import SCHEMA, TableSchema, ensure_schema
+from fastapi_ai.repositories import ProfileRepository
+from fastapi_ai.services.diet_jobs import DietJob, DietJobQueue, InMemoryJobBackend
+from fastapi_ai.services.diet_plan_edits import DAYS, PlanEditError
+from fastapi_ai.services.health_scoring import HealthScorer, LexiconTerm
+from fastapi_ai.services.geo import covering_tiles, geohash_encode
+from fastapi_ai.services.food_db import FoodCompositionDB, FoodRecord
+from fastapi_ai.services.maps_service import MapsService
+from fastapi_ai.services.meal_planner import MealPlanner, nutrition_targets
+from fastapi_ai.services.model_router import ModelRouter, classify_intent, load_default
+from fastapi_ai.services.nutrition_cache import NutritionCache, normalize_food_name
+from fastapi_ai.services.nutrition_service import NutritionService
+from fastapi_ai.services.openai_service import OpenAIService
+from fastapi_ai.services.plan_parsing import parse_diet_plan
+from fastapi_ai.services.response_cache import ResponseCache
+from fastapi_ai.services.restaurant_cache import RestaurantCache
+from fastapi_ai.services.spatial_index import SpatialIndex
+from fastapi_ai.services.usage import UsageTracker
+
+
+def test_http_clients_are_shared_per_upstream():
+    """Test pooled HTTP clients are reused across service instances."""
+    http_clients = HTTPClients()
+    first = NutritionService(http_clients=http_clients).http_clients.get(NUTRITIONIX)
+    second = NutritionService(http_clients=http_clients).http_clients.get(NUTRITIONIX)
+    places = MapsService(http_clients=http_clients).http_clients.get(GOOGLE_PLACES)
+    
+    assert first is second
+    assert places is not first
+
+
+def test_place_details_deadline_returns_partial_results():
+    """Test slow place-details lookups are dropped once the deadline passes."""
+    async def fake_details(place_id):
+        if place_id == "slow":
+            await asyncio.sleep(5)
+        return {"website": f"https://{place_id}.example"}
+    
+    maps_service = MapsService()
+    maps_service.details_deadline = 0.1
+    maps_service._get_place_details = fake_details
+    restaurants = [{"place_id": "fast"}, {"place_id": "slow"}]
+    
+    asyncio.run(maps_service._attach_place_details(restaurants))
+    
+    assert restaurants[0]["website"] == "https://fast.example"
+    assert restaurants[0]["details_loaded"] is True
+    assert "website" not in restaurants[1]
+    assert restaurants[1]["details_loaded"] is False
+
+
+def test_nutrition_cache_hit_after_miss():
+    """Test a cached analysis is served from memory with hit metadata."""
+    cache = NutritionCache(db=None)
+    loader = AsyncMock(return_value={"name": "banana", "calories": 89})
+    
+    async def lookup_twice():
+        first = await cache.get_or_load("Banana", loader)
+        second = await cache.get_or_load("  banana ", loader)
+        return first, second
+    
+    (_, miss), (value, hit) = asyncio.run(lookup_twice())
+    
+    assert miss["status"] == "miss"
+    assert hit["status"] == "hit"
+    assert hit["tier"] == "memory"
+    assert value["calories"] == 89
+    assert loader.await_count == 1
+
+
+def test_nutrition_cache_coalesces_concurrent_misses():
+    """Test concurrent misses for the same food make one upstream call."""
+    cache = NutritionCache(db=None)
+    calls = []
+    
+    async def loader(name):
+        calls.append(name)
+        await asyncio.sleep(0.05)
+        return {"name": name, "calories": 231}
+    
+    async def lookup_concurrently():
+        return await asyncio.gather(
+            *(cache.get_or_load("Chicken Breast", loader) for _ in range(5))
+        )
+    
+    results = asyncio.run(lookup_concurrently())
+    
+    assert len(calls) == 1
+    assert sum(meta["coalesced"] for _, meta in results) == 4
+
+
+def test_analyze_food_does_not_cache_estimates():
+    """Test estimated nutrition is returned but not stored in the cache."""
+    cache = NutritionCache(db=None)
+    nutrition_service = NutritionService(cache=cache)
+    nutrition_service.nutritionix_app_id = None
+    nutrition_service.edamam_app_id = None
+    
+    analysis = asyncio.run(nutrition_service.analyze_food("mystery stew"))
+    
+    assert analysis["cache"]["status"] == "miss"
+    assert analysis["serving_size"] == "100g (estimated)"
+    assert normalize_food_name("mystery stew") not in cache.memory
+
+
+def _food_db():
+    return FoodCompositionDB([
+        FoodRecord("Chicken breast, grilled", "protein", 165, 31, 0, 3.6, 0, 0),
+        FoodRecord("Milk chocolate", "snack", 535, 7.7, 59.4, 29.7, 3.4, 51.5),
+        FoodRecord("Banana", "fruit", 89, 1.1, 22.8, 0.3, 2.6, 12.2),
+        FoodRecord("Egg, boiled", "protein", 155, 12.6, 1.1, 10.6, 0, 1.1),
+        FoodRecord("Milk, whole", "dairy", 61, 3.2, 4.8, 3.3, 0, 5.1),
+        FoodRecord("Strawberries", "fruit", 32, 0.7, 7.7, 0.3, 2, 4.9),
+        FoodRecord("Brown rice, cooked", "grain", 123, 2.7, 25.6, 1, 1.6, 0.2),
+    ])
+
+
+def test_food_db_exact_match_understands_comma_names_and_plurals():
+    """Test "Head, modifier" names exactly match the modifier-first wording."""
+    record, score = _food_db().search("Grilled Chicken Breasts")
+    
+    assert record.name == "Chicken breast, grilled"
+    assert score == 1.0
+
+
+def test_food_db_fuzzy_match_tolerates_typos():
+    """Test trigram search resolves misspelled foods."""
+    food_db = _food_db()
+    record, score = food_db.search("strawbery")
+    
+    assert record.name == "Strawberries"
+    assert 0.5 < score < 1.0
+    assert food_db.search("xyz") is None
+
+
+def test_food_db_word_order_matters():
+    """Test reordered words do not match a different food."""
+    food_db = _food_db()
+    
+    assert food_db.search("milk chocolate")[1] == 1.0
+    assert food_db.analyze("chocolate milk", 0.8) is None
+    assert food_db.search("chocolate milk")[0].name == "Milk, whole"
+
+
+def test_food_db_scales_grams_and_leaves_other_amounts_to_apis():
+    """Test gram amounts scale per-100g values and other amounts are not answered locally."""
+    cache = NutritionCache(db=None)
+    nutrition_service = NutritionService(cache=cache, food_db=_food_db())
+    nutrition_service._analyze_with_apis = AsyncMock(
+        return_value={"name": "banana", "calories": 105, "nutrients": {}, "serving_size": "1 medium"}
+    )
+    
+    chicken = asyncio.run(nutrition_service.analyze_food("grilled chicken breast 200g"))
+    banana = asyncio.run(nutrition_service.analyze_food("1 banana"))
+    
+    assert (chicken["calories"], chicken["nutrients"]["protein"], chicken["serving_size"]) == (330, 62, "200g")
+    assert banana["calories"] == 105
+    nutrition_service._analyze_with_apis.assert_awaited_once_with("1 banana")
+
+
+def test_estimates_without_apis_strip_amounts_and_respect_word_order():
+    """Test amounts are approximated rather than falling back to generic values when no API is configured."""
+    nutrition_service = NutritionService(food_db=_food_db())
+    nutrition_service.nutritionix_app_id = None
+    nutrition_service.edamam_app_id = None
+    
+    def estimate(name):
+        analysis = asyncio.run(nutrition_service.analyze_food(name))
+        return analysis["calories"], analysis["serving_size"]
+    
+    assert estimate("1 banana") == (89, "100g (estimated)")
+    assert estimate("2 eggs") == (155, "100g (estimated)")
+    assert estimate("1 cup brown rice") == (295.2, "240g (estimated)")
+    assert estimate("2 oz milk chocolate") == (303.35, "56.7g (estimated)")
+    # Milk is the head noun, so chocolate milk is closer to milk than to milk chocolate
+    assert estimate("chocolate milk") == (61, "100g (estimated)")
+
+
+def test_analyze_food_answers_from_local_db_first():
+    """Test confident local matches skip the cache and the paid APIs."""
+    cache = NutritionCache(db=None)
+    nutrition_service = NutritionService(cache=cache, food_db=_food_db())
+    nutrition_service._analyze_with_apis = AsyncMock()
+    
+    analysis = asyncio.run(nutrition_service.analyze_food("brown rice, cooked"))
+    
+    assert analysis["calories"] == 123
+    assert analysis["nutrients"]["carbs"] == 25.6
+    nutrition_service._analyze_with_apis.assert_not_awaited()
+
+
+def test_analyze_batch_dedupes_and_queries_nutritionix_once():
+    """Test batch misses are resolved with a single Nutritionix query."""
+    cache = NutritionCache(db=None)
+    nutrition_service = NutritionService(cache=cache, food_db=_food_db())
+    nutrition_service.nutritionix_app_id = "app"
+    nutrition_service.nutritionix_api_key = "key"
+    nutrition_service._query_nutritionix = AsyncMock(return_value=[
+        {"name": "pho", "calories": 350, "nutrients": {"protein": 20}, "serving_size": "bowl"},
+        {"name": "bibimbap", "calories": 560, "nutrients": {"protein": 25}, "serving_size": "bowl"},
+    ])
+    
+    results = asyncio.run(nutrition_service.analyze_batch([
+        {"name": "Pho"},
+        {"name": "bibimbap", "quantity": 2},
+        {"name": "pho "},
+        {"name": "Strawberries"},
+    ]))
+    
+    nutrition_service._query_nutritionix.assert_awaited_once_with("Pho\nbibimbap")
+    assert [r["calories"] for r in results] == [350, 1120, 350, 32]
+    assert results[1]["nutrients"]["protein"] == 50
+    assert normalize_food_name("pho") in cache.memory
+
+
+def test_chat_stream_closes_upstream_when_abandoned():
+    """Test abandoning a chatbot stream closes the upstream OpenAI response."""
+    class FakeStream:
+        def __init__(self):
+            self.response = SimpleNamespace(aclose=AsyncMock())
+        
+        async def __aiter__(self):
+            for text in ("one ", "two ", "three"):
+                delta = SimpleNamespace(content=text)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+    
+    fake_stream = FakeStream()
+    
+    async def consume_first_token():
+        stream = OpenAIService().chat_completion_stream("hi")
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+    
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = AsyncMock(return_value=fake_stream)
+        first = asyncio.run(consume_first_token())
+    
+    assert first == "one "
+    fake_stream.response.aclose.assert_awaited_once()
+
+
+def _completion(content):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+_WEEK_PLAN = {
+    "daily_calorie_target": 2000,
+    "macros": {"protein_grams": 120, "carbs_grams": 220, "fats_grams": 60},
+    "weekly_plan": {
+        day: [{"meal": "breakfast", "name": "Oats", "calories": 400, "nutrients": {"protein": 15, "carbs": 60, "fats": 8}}]
+        for day in DAYS
+    },
+}
+
+
+def test_diet_and_workout_plans_generate_concurrently():
+    """Test the diet and workout completions overlap instead of running back to back."""
+    async def slow_completion(**kwargs):
+        await asyncio.sleep(0.2)
+        return _completion('{"weekly_schedule": {}}' if kwargs["max_tokens"] == 2000 else json.dumps(_WEEK_PLAN))
+    
+    async def generate():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        plan = await OpenAIService().generate_diet_plan({"age": 30})
+        return plan, loop.time() - started
+    
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = slow_completion
+        plan, elapsed = asyncio.run(generate())
+    
+    assert plan["workout_plan"] == {"weekly_schedule": {}}
+    assert elapsed < 0.35
+
+
+def test_diet_plan_failure_cancels_workout_generation():
+    """Test a failed diet completion cancels the in-flight workout completion."""
+    workout_cancelled = asyncio.Event()
+    
+    async def completion(**kwargs):
+        if kwargs["max_tokens"] == 2000:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                workout_cancelled.set()
+                raise
+        await asyncio.sleep(0.05)
+        return _completion("not json")
+    
+    async def generate():
+        try:
+            await OpenAIService().generate_diet_plan({"age": 30})
+        except Exception as e:
+            # The workout task has finished cancelling by the time the error surfaces
+            return str(e), workout_cancelled.is_set()
+    
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = completion
+        error = asyncio.run(generate())
+    
+    assert error == ("Failed to parse AI-generated diet plan", True)
+
+
+def test_diet_plan_with_placeholder_workout_is_not_cached():
+    """Test a plan carrying the fallback workout is returned but not shared through the cache."""
+    workout_calls = []
+
+    async def completion(**kwargs):
+        if kwargs["max_tokens"] == 2000:
+            workout_calls.append(kwargs)
+            if len(workout_calls) == 1:
+                raise RuntimeError("upstream down")
+            return _completion('{"weekly_schedule": {"monday": [{"exercise": "Squats", "sets": 3}]}}')
+        return _completion(json.dumps(_WEEK_PLAN))
+
+    async def generate_three_times():
+        openai_service = OpenAIService(response_cache=ResponseCache())
+        return [await openai_service.generate_diet_plan({"age": 30}) for _ in range(3)]
+
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = completion
+        first, second, third = asyncio.run(generate_three_times())
+
+    assert first["workout_plan"]["fallback"] is True
+    assert "fallback" not in second["workout_plan"]
+    # The second plan was generated again, then served from the cache
+    assert len(workout_calls) == 2
+    assert third == second
+
+
+def test_workout_plan_api_errors_are_not_counted_as_parse_failures():
+    """Test a failed workout call is counted as ``api_error`` and an unusable reply as ``failed``."""
+    async def broken(**kwargs):
+        raise RuntimeError("upstream down")
+
+    async def garbled(**kwargs):
+        return _completion("not json")
+
+    def count(outcome):
+        return metrics.registry.get_sample_value(
+            "plan_parse_total", {"kind": "workout_plan", "outcome": outcome}
+        ) or 0
+
+    before = (count("api_error"), count("failed"))
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = broken
+        fallback = asyncio.run(OpenAIService()._generate_workout_plan({"age": 30}))
+    assert (count("api_error"), count("failed")) == (before[0] + 1, before[1])
+
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = garbled
+        asyncio.run(OpenAIService()._generate_workout_plan({"age": 30}))
+    assert (count("api_error"), count("failed")) == (before[0] + 1, before[1] + 1)
+    assert fallback["difficulty"] == "intermediate"
+
+
+def test_diet_plan_day_keys_are_normalized_and_non_weekdays_dropped():
+    """Test padded or capitalized weekday keys are kept and keys like "day 1" are dropped."""
+    meals = _WEEK_PLAN["weekly_plan"]["monday"]
+    weekly_plan = {"Monday ": meals, "TUESDAY": meals, "day 1": meals, "Day 2": meals}
+    weekly_plan.update({day: meals for day in DAYS[2:6]})
+    
+    parsed = parse_diet_plan(json.dumps(dict(_WEEK_PLAN, weekly_plan=weekly_plan)))
+    
+    assert list(parsed.plan["weekly_plan"]) == list(DAYS[:6])
+    assert parsed.missing == ["sunday"]
+    assert parsed.repaired
+
+
+def test_truncated_diet_plan_is_repaired_and_missing_days_requested_once():
+    """Test truncated output is salvaged and only the missing days go to a second-chance call."""
+    meals = [
+        {"meal": "breakfast", "name": "Oats", "calories": "400 kcal", "nutrients": {"protein": "15g", "carbs": 60, "fats": 8}},
+        {"meal": "lunch", "name": "", "calories": 700},
+    ]
+    week = dict(_WEEK_PLAN, weekly_plan={day: meals for day in DAYS[:5]})
+    truncated = json.dumps(week)[:-60]
+    calls = []
+    
+    async def completion(**kwargs):
+        calls.append(kwargs)
+        if kwargs["max_tokens"] == 2000:
+            return _completion('{"weekly_schedule": {"monday": [{"exercise": "Squats", "sets": "3"}, {"sets": 2}]}}')
+        if kwargs["max_tokens"] == 3000:
+            return _completion(truncated)
+        response = _completion(json.dumps({"weekly_plan": {
+            "Saturday": meals, "sunday": [{"name": "Soup"}],
+        }}))
+        response.usage = SimpleNamespace(prompt_tokens=300, completion_tokens=500)
+        return response
+    
+    def count(name, **labels):
+        return metrics.registry.get_sample_value(name, labels) or 0
+    
+    before = (
+        count("plan_parse_total", kind="diet_plan", outcome="second_chance"),
+        count("plan_retry_tokens_total", kind="diet_plan"),
+    )
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = completion
+        plan = asyncio.run(OpenAIService().generate_diet_plan({"age": 30}))
+    
+    repair = [call for call in calls if call["max_tokens"] not in (2000, 3000)]
+    assert len(calls) == 3 and len(repair) == 1 and repair[0]["max_tokens"] == 2 * 450
+    # Friday survives the truncation (its cut-off lunch is dropped)
+    assert repair[0]["messages"][1]["content"].endswith("Create meals for: saturday, sunday.")
+    assert list(plan["weekly_plan"]) == list(DAYS[:6])
+    assert plan["missing_days"] == ["sunday"]
+    assert plan["weekly_plan"]["monday"] == [
+        {"meal": "breakfast", "name": "Oats", "calories": 400.0, "nutrients": {"protein": 15.0, "carbs": 60.0, "fats": 8.0}},
+    ]
+    assert plan["daily_totals"]["saturday"]["calories"] == 400.0
+    assert plan["workout_plan"]["weekly_schedule"]["monday"] == [{"exercise": "Squats", "sets": 3}]
+    assert count("plan_parse_total", kind="diet_plan", outcome="second_chance") == before[0] + 1
+    assert count("plan_retry_tokens_total", kind="diet_plan") == before[1] + 800
+
+
+def test_response_cache_shares_answers_within_profile_bucket():
+    """Test a repeated question from a user in the same profile bucket is served from cache."""
+    cache = ResponseCache()
+    create = AsyncMock(return_value=_completion("Oatmeal with berries."))
+    
+    async def ask(query, context):
+        return await OpenAIService(response_cache=cache).chat_completion(query, context)
+    
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = create
+        first = asyncio.run(ask("Healthy breakfast?", {"age": 31, "weight": 70}))
+        second = asyncio.run(ask("  healthy BREAKFAST ", {"age": 33, "weight": 71}))
+        asyncio.run(ask("Healthy breakfast?", {"age": 45, "weight": 70}))
+    
+    assert first == second == "Oatmeal with berries."
+    assert create.await_count == 2
+    assert cache.stats()["namespaces"]["chatbot"]["exact_hits"] == 1
+
+
+def test_response_cache_semantic_tier_uses_similarity_threshold():
+    """Test similar questions hit the semantic tier and dissimilar ones miss."""
+    vectors = {
+        "what should i eat for breakfast": [1.0, 0.0, 0.0],
+        "what is a good breakfast": [0.95, 0.1, 0.0],
+        "how many rest days per week": [0.0, 0.0, 1.0],
+    }
+    
+    async def embedder(text):
+        return vectors[text]
+    
+    cache = ResponseCache(similarity_threshold=0.9, embedder=embedder)
+    
+    async def run():
+        miss = await cache.lookup("chatbot", "What should I eat for breakfast?")
+        cache.store(miss, "Eggs and fruit.")
+        similar = await cache.lookup("chatbot", "What is a good breakfast?")
+        unrelated = await cache.lookup("chatbot", "How many rest days per week?")
+        return similar, unrelated
+    
+    similar, unrelated = asyncio.run(run())
+    
+    assert similar.tier == "semantic"
+    assert similar.value == "Eggs and fruit."
+    assert not unrelated.hit
+
+
+def test_diet_job_queue_dedupes_and_saves_plan():
+    """Test identical in-flight jobs are shared and the finished plan is saved to diet_plans."""
+    db = SimpleNamespace(insert=AsyncMock(return_value=42))
+    generate = AsyncMock()
+    
+    async def slow_plan(profile, include_workout=True, user_id=None, user_tier=None):
+        await asyncio.sleep(0.05)
+        return {"weekly_plan": {}}
+    
+    generate.side_effect = slow_plan
+    
+    async def run():
+        queue = DietJobQueue(generate, db=db, workers=2)
+        await queue.start()
+        first, first_deduped = await queue.submit({"age": 30}, user_id=7)
+        second, second_deduped = await queue.submit({"age": 30}, user_id=7)
+        other, _ = await queue.submit({"age": 30}, user_id=8)
+        finished = await queue.wait(first.id, timeout=1)
+        await queue.wait(other.id, timeout=1)
+        await queue.stop()
+        return first, first_deduped, second, second_deduped, other, finished
+    
+    first, first_deduped, second, second_deduped, other, finished = asyncio.run(run())
+    
+    assert not first_deduped and second_deduped
+    assert second.id == first.id and other.id != first.id
+    assert finished.status == "succeeded"
+    assert finished.result == {"weekly_plan": {}}
+    assert finished.diet_plan_id == 42
+    assert generate.await_count == 2
+    assert db.insert.await_args_list[0].args[1][0] == 7
+
+
+def test_diet_job_queue_recovers_jobs_left_running_by_a_dead_worker():
+    """Test a running job without heartbeat is not deduplicated onto and is run again."""
+    generate = AsyncMock(return_value={"weekly_plan": {}})
+    backend = InMemoryJobBackend()
+    
+    async def run():
+        stale = DietJob.new(7, {"age": 30}, True)
+        stale.status = "running"
+        stale.updated_at = time.time() - 600
+        await backend.create(stale)
+        live = DietJob.new(8, {"age": 30}, True)
+        live.status = "running"
+        await backend.create(live)
+        
+        queue = DietJobQueue(generate, backend=backend, workers=1, stale_after=60)
+        deduped = (await queue.submit({"age": 30}, user_id=8))[1]
+        await queue.start()
+        finished = await queue.wait(stale.id, timeout=1)
+        await queue.stop()
+        return stale, finished, deduped
+    
+    stale, finished, deduped = asyncio.run(run())
+    
+    assert finished.status == "succeeded"
+    assert deduped
+    generate.assert_awaited_once_with({"age": 30}, include_workout=True, user_id=7, user_tier=None)
+
+
+def test_diet_job_queue_forgets_waiters_of_jobs_that_never_finish_here():
+    """Test timed-out and cancelled waiters leave no completion event behind."""
+    async def run():
+        # Workers are not started, as if another process ran the job
+        queue = DietJobQueue(AsyncMock())
+        job, _ = await queue.submit({"age": 30})
+        timed_out, early = await asyncio.gather(
+            queue.wait(job.id, timeout=0.05),
+            queue.wait(job.id, timeout=0.01),
+        )
+        waiter = asyncio.create_task(queue.wait(job.id, timeout=5))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with suppress(asyncio.CancelledError):
+            await waiter
+        return timed_out, early, queue
+    
+    timed_out, early, queue = asyncio.run(run())
+    
+    assert timed_out.status == early.status == "queued"
+    assert queue._events == {} and queue._waiters == {}
+
+
+def test_diet_job_queue_records_failures():
+    """Test a failed generation marks the job failed with the error."""
+    async def run():
+        queue = DietJobQueue(AsyncMock(side_effect=Exception("OpenAI API error: boom")))
+        await queue.start()
+        job, _ = await queue.submit({"age": 30})
+        finished = await queue.wait(job.id, timeout=1)
+        await queue.stop()
+        return finished
+    
+    finished = asyncio.run(run())
+    
+    assert finished.status == "failed"
+    assert "boom" in finished.error
+    assert finished.diet_plan_id is None
+
+
+def test_covering_tiles_are_shared_by_nearby_searches():
+    """Test searches a few hundred meters apart snap to the same tiles."""
+    first = covering_tiles(40.7128, -74.0060, 2000)
+    second = covering_tiles(40.7140, -74.0075, 2000)
+    
+    assert set(first) & set(second)
+    assert all(len(tile) == len(first[0]) for tile in first + second)
+    assert geohash_encode(40.7128, -74.0060, len(first[0])) in first
+
+
+def test_nearby_search_is_served_from_cached_tiles():
+    """Test a repeated nearby search reuses cached tiles and place details."""
+    places = [
+        {"place_id": "near", "name": "Near", "location": {"latitude": 40.7130, "longitude": -74.0060}},
+        {"place_id": "far", "name": "Far", "location": {"latitude": 40.7500, "longitude": -74.0060}},
+    ]
+    
+    async def fake_search(latitude, longitude, radius, include_details=True):
+        tile_places = []
+        for place in places:
+            location = place["location"]
+            if geohash_encode(location["latitude"], location["longitude"], 5) == geohash_encode(latitude, longitude, 5):
+                tile_places.append(dict(place))
+        return tile_places
+    
+    cache = RestaurantCache()
+    search = AsyncMock(side_effect=fake_search)
+    details = AsyncMock(return_value={"website": "https://near.example"})
+    
+    async def find():
+        maps_service = MapsService(cache=cache)
+        maps_service.google_maps_api_key = "test"
+        maps_service._search_restaurants = search
+        maps_service._get_place_details = details
+        return await maps_service.find_healthy_restaurants(40.7128, -74.0060, radius=1000)
+    
+    first = asyncio.run(find())
+    upstream_calls = search.await_count
+    second = asyncio.run(find())
+    
+    assert [r["place_id"] for r in first] == ["near"]
+    assert first[0]["distance_m"] < 100
+    assert second[0]["website"] == "https://near.example"
+    assert search.await_count == upstream_calls
+    details.assert_awaited_once()
+    cached_places = [place for tile in covering_tiles(40.7128, -74.0060, 1000) for place in cache.tiles.get(tile)[0]]
+    assert cached_places and all("website" not in place for place in cached_places)
+
+
+def test_cold_tile_cache_makes_at_most_four_places_searches():
+    """Test a search on a cold tile cache sends one Places search per covering tile, at most four."""
+    async def find(latitude, longitude, radius):
+        maps_service = MapsService(cache=RestaurantCache())
+        maps_service.google_maps_api_key = "test"
+        maps_service._search_restaurants = AsyncMock(return_value=[])
+        await maps_service.find_healthy_restaurants(latitude, longitude, radius=radius, include_details=False)
+        return maps_service._search_restaurants.await_count
+    
+    for latitude, longitude in ((40.7128, -74.0060), (51.5074, -0.1278), (-33.8688, 151.2093)):
+        for radius in (500, 1000, 5000, 20000):
+            calls = asyncio.run(find(latitude, longitude, radius))
+            assert 1 <= calls <= 4
+            assert calls == len(covering_tiles(latitude, longitude, radius))
+
+
+def _place(place_id, latitude, longitude):
+    return {"place_id": place_id, "name": place_id, "location": {"latitude": latitude, "longitude": longitude}}
+
+
+def test_spatial_index_radius_and_nearest_queries():
+    """Test radius and k-nearest queries return the closest places in order."""
+    index = SpatialIndex(cell_degrees=0.01)
+    index.upsert_many([
+        _place("a", 40.7130, -74.0060),
+        _place("b", 40.7200, -74.0060),
+        _place("c", 40.7500, -74.0060),
+        _place("d", 41.5000, -74.0060),
+    ])
+    index.upsert(_place("b", 40.7140, -74.0060))  # moved
+    
+    within = index.within(40.7128, -74.0060, 1000)
+    nearest = index.nearest(40.7128, -74.0060, 3)
+    
+    assert [place["place_id"] for _, place in within] == ["a", "b"]
+    assert [place["place_id"] for _, place in nearest] == ["a", "b", "c"]
+    assert index.nearest(40.7128, -74.0060, 3, max_distance_m=1000)[-1][1]["place_id"] == "b"
+
+
+def test_nearby_search_answers_locally_when_coverage_is_sufficient():
+    """Test the spatial index serves nearby searches and thin coverage falls back upstream."""
+    index = SpatialIndex()
+    index.upsert_many(_place(f"p{i}", 40.7128 + i * 0.001, -74.0060) for i in range(5))
+    upstream = AsyncMock(return_value=[_place("remote", 40.9, -74.0)])
+    
+    async def find(latitude, radius):
+        maps_service = MapsService(index=index)
+        maps_service.google_maps_api_key = "test"
+        maps_service._search_restaurants = upstream
+        return await maps_service.find_healthy_restaurants(latitude, -74.0060, radius=radius, include_details=False)
+    
+    local = asyncio.run(find(40.7128, 1000))
+    fallback = asyncio.run(find(40.9, 500))
+    
+    assert [r["place_id"] for r in local] == ["p0", "p1", "p2", "p3", "p4"]
+    assert local[0]["distance_m"] == 0
+    upstream.assert_awaited_once()
+    assert fallback[0]["place_id"] == "remote"
+    assert len(index) == 6
+
+
+def test_k_nearest_search_keeps_nearer_restaurants_over_healthier_ones():
+    """Test ``k`` picks the nearest healthy restaurants, not the highest scoring."""
+    scorer = HealthScorer([LexiconTerm("salad", 2.0, "Salads"), LexiconTerm("cafe", 1.0, "")])
+    places = [
+        _place("Salad far", 40.7228, -74.0060),
+        _place("Cafe near", 40.7138, -74.0060),
+        _place("Cafe nearest", 40.7128, -74.0060),
+    ]
+
+    async def find(k):
+        maps_service = MapsService(scorer=scorer)
+        maps_service.google_maps_api_key = "test"
+        maps_service._search_restaurants = AsyncMock(return_value=places)
+        return await maps_service.find_healthy_restaurants(40.7128, -74.0060, radius=2000, include_details=False, k=k)
+
+    nearest = asyncio.run(find(2))
+    ranked = asyncio.run(find(None))
+
+    assert [r["name"] for r in nearest] == ["Cafe nearest", "Cafe near"]
+    assert nearest[0]["distance_m"] == 0
+    assert [r["name"] for r in ranked] == ["Salad far", "Cafe nearest", "Cafe near"]
+    assert "distance_m" not in places[0]
+
+
+def test_health_scorer_ranks_restaurants_in_one_pass():
+    """Test restaurants are scored from names, types and menus and ranked by score."""
+    scorer = HealthScorer([
+        LexiconTerm("salad", 2.0, "Salads"),
+        LexiconTerm("plant based", 2.0, "Plant-Based Dishes"),
+        LexiconTerm("juice bar", 1.5, "Fresh Juices"),
+        LexiconTerm("bar", -0.8, ""),
+        LexiconTerm("fried chicken", -2.5, ""),
+    ])
+    restaurants = [
+        {"name": "Corner Bar", "types": ["bar"]},
+        {"name": "Leaf & Juice Bar", "menu": "Kale SALAD, Caesar salad"},
+        {"name": "Crispy Fried Chicken", "types": ["meal_takeaway"]},
+        {"name": "Roots", "types": ["plant_based_restaurant"], "description": "Salads"},
+    ]
+    
+    scores = scorer.score_all(restaurants)
+    ranked = scorer.rank(restaurants, min_score=0)
+    
+    assert scores[1].score == 3.5
+    assert scores[1].healthy_options == ["Salads", "Fresh Juices"]
+    assert scores[2].score == -2.5
+    assert [r["name"] for r in ranked] == ["Leaf & Juice Bar", "Roots"]
+    assert ranked[1]["health_score"] == 2.0
+    assert ranked[1]["healthy_options"] == ["Plant-Based Dishes"]
+
+
+def test_circuit_breaker_opens_and_probes_after_recovery_timeout():
+    """Test the breaker fails fast when open and closes after a successful probe."""
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_cancelled_half_open_probe_frees_its_slot():
+    """Test a probe cancelled mid-call does not leave the breaker rejecting every call."""
+    upstream = Upstream("test")
+    upstream.breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.01)
+    upstream.breaker.record_failure()
+    time.sleep(0.02)
+    
+    async def scenario():
+        probe = asyncio.create_task(upstream.call(lambda: asyncio.sleep(5)))
+        await asyncio.sleep(0.01)
+        assert upstream.breaker.state == "half_open"
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+        return await upstream.call(AsyncMock(return_value="ok"))
+    
+    assert asyncio.run(scenario()) == "ok"
+    assert upstream.breaker.state == "closed"
+
+
+def test_upstream_retries_transient_errors_within_budget():
+    """Test transient errors are retried, client errors are not, and open circuits fail fast."""
+    upstream = Upstream("test", max_retries=2, backoff_base=0.001)
+    upstream.breaker.failure_threshold = 3
+    calls = []
+    
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("refused")
+        return "ok"
+    
+    async def bad_request():
+        calls.append(1)
+        request = httpx.Request("GET", "https://example.com")
+        raise httpx.HTTPStatusError(
+            "bad", request=request, response=httpx.Response(400, request=request)
+        )
+    
+    async def down():
+        raise httpx.ConnectTimeout("timeout")
+    
+    async def scenario():
+        assert await upstream.call(flaky) == "ok"
+        assert len(calls) == 3
+        
+        calls.clear()
+        try:
+            await upstream.call(bad_request)
+        except httpx.HTTPStatusError:
+            pass
+        assert len(calls) == 1
+        
+        try:
+            await upstream.call(down)
+        except httpx.ConnectTimeout:
+            pass
+        try:
+            await upstream.call(down)
+        except CircuitOpenError as e:
+            return e
+    
+    error = asyncio.run(scenario())
+    assert error is not None and error.upstream == "test"
+    assert upstream.stats()["circuit"]["state"] == "open"
+
+
+def test_hedged_request_fires_backup_when_primary_is_slow():
+    """Test the backup answers when the primary is slower than the hedge delay."""
+    primary_cancelled = asyncio.Event()
+    
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            primary_cancelled.set()
+            raise
+    
+    async def fast():
+        return "backup"
+    
+    async def failing():
+        raise ValueError("no data")
+    
+    async def scenario():
+        assert await hedged(fast, slow, delay=0.5) == "backup"
+        assert await hedged(slow, fast, delay=0.01) == "backup"
+        await asyncio.sleep(0)
+        assert primary_cancelled.is_set()
+        # A primary that fails fast falls straight through to the backup
+        return await hedged(failing, fast, delay=1)
+    
+    assert asyncio.run(scenario()) == "backup"
+
+
+def test_hedged_request_cancelled_before_the_hedge_cancels_the_primary():
+    """Test cancelling the caller while waiting on the primary leaves no upstream call running."""
+    primary_cancelled = asyncio.Event()
+    backup = AsyncMock()
+    
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            primary_cancelled.set()
+            raise
+    
+    async def scenario():
+        caller = asyncio.create_task(hedged(slow, backup, delay=1))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        try:
+            await caller
+        except asyncio.CancelledError:
+            pass
+        # Already set when the caller finishes, without yielding to the loop
+        return primary_cancelled.is_set()
+    
+    assert asyncio.run(scenario())
+    backup.assert_not_called()
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.last_usage = 0.0
+        self.pings = 0
+    
+    async def ping(self, reconnect=True):
+        self.pings += 1
+
+
+class _FakePool:
+    """One-connection stand-in for an aiomysql pool."""
+    minsize = 1
+    maxsize = 1
+    size = 1
+    
+    def __init__(self):
+        self.conn = _FakeConnection()
+        self.free = asyncio.Queue()
+        self.free.put_nowait(self.conn)
+    
+    @property
+    def freesize(self):
+        return self.free.qsize()
+    
+    async def acquire(self):
+        return await self.free.get()
+    
+    def release(self, conn):
+        self.free.put_nowait(conn)
+
+
+def test_database_pool_acquire_timeout_and_health_check():
+    """Test idle connections are pinged and waiting for a busy pool times out."""
+    pool = _FakePool()
+    db = Database(pool, acquire_timeout=0.05, health_check_interval=30)
+    
+    async def scenario():
+        async with db.acquire() as conn:
+            # Idle since the loop started, so it is pinged before use
+            assert conn.pings == 1
+            assert db.stats()["in_use"] == 1
+            try:
+                async with db.acquire():
+                    pass
+            except PoolTimeout:
+                return db.stats()
+    
+    stats = asyncio.run(scenario())
+    assert stats["acquire_timeouts"] == 1
+    assert stats["acquired"] == 1
+    assert pool.freesize == 1
+
+
+def test_ensure_schema_adds_only_missing_columns_and_indexes():
+    """Test startup schema checks alter existing tables once and skip missing ones."""
+    db = AsyncMock()
+    db.fetchall = AsyncMock(side_effect=[
+        [{"name": name} for name in ("id", "name", "location", "place_id", "geohash", "data", "fetched_at")],
+        [{"name": "PRIMARY"}, {"name": "uniq_place_id"}],
+        [],
+    ])
+    schema = SCHEMA[:1] + (TableSchema("absent", columns=(("x", "INT NULL"),)),)
+    
+    altered = asyncio.run(ensure_schema(db, schema))
+    
+    assert altered == ["restaurants"]
+    statement = db.execute.await_args.args[0]
+    assert statement.startswith("ALTER TABLE restaurants ADD COLUMN details JSON NULL, ")
+    assert "ADD COLUMN lat " in statement and "ADD SPATIAL INDEX idx_coords (coords)" in statement
+    assert "place_id VARCHAR" not in statement and "uniq_place_id" not in statement
+    db.execute.assert_awaited_once()
+
+
+def test_profile_repository_decodes_goals():
+    """Test stored profiles come back with JSON columns decoded."""
+    db = AsyncMock()
+    db.fetchone.return_value = {
+        "age": 30, "gender": "female", "height": 165.0, "weight": 60.0,
+        "goals": '{"weight_loss": true}',
+    }
+    
+    profile = asyncio.run(ProfileRepository(db).get(7))
+    
+    assert profile["goals"] == {"weight_loss": True}
+    assert db.fetchone.await_args.args[1] == (7,)
+    assert asyncio.run(ProfileRepository(None).get(7)) is None
+
+
+def test_usage_over_budget_downgrades_model_and_flushes_in_batches():
+    """Test spend is recorded per user and endpoint, over-budget users get the cheaper model."""
+    db = SimpleNamespace(executemany=AsyncMock(return_value=2))
+    usage = UsageTracker(
+        db=db, user_daily_budget=0.01, global_daily_budget=0, budget_model="gpt-3.5-turbo"
+    )
+    models = []
+    
+    async def completion(**kwargs):
+        models.append(kwargs["model"])
+        response = _completion("Eat more vegetables!")
+        response.usage = SimpleNamespace(prompt_tokens=600, completion_tokens=200)
+        return response
+    
+    async def scenario():
+        service = OpenAIService(usage=usage)
+        await service.chat_completion("Breakfast?", user_id=7)
+        await service.chat_completion("Lunch?", user_id=7)
+        await service.chat_completion("Lunch?", user_id=8)
+        return await usage.flush()
+    
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = completion
+        written = asyncio.run(scenario())
+    
+    # 600 prompt + 200 completion tokens on gpt-4-turbo cost $0.012, over user 7's budget
+    assert models == ["gpt-4-turbo-preview", "gpt-3.5-turbo", "gpt-4-turbo-preview"]
+    assert usage.spend(7) > 0.01 and usage.stats()["downgraded"] == 1
+    assert written == 3
+    rows = db.executemany.await_args.args[1]
+    assert {(row[1], row[2], row[3], row[4]) for row in rows} == {
+        (7, "chatbot", "gpt-4-turbo-preview", 1),
+        (7, "chatbot", "gpt-3.5-turbo", 1),
+        (8, "chatbot", "gpt-4-turbo-preview", 1),
+    }
+    assert usage.stats()["pending_rows"] == 0
+
+
+def test_model_router_rules_and_ab_split():
+    """Test short factual questions go to the fast model and experiments split by user."""
+    router = load_default()
+    factual = router.route("chatbot", "How many calories in a banana?")
+    assert (factual.route, factual.model, factual.max_tokens) == ("chatbot_factual", "gpt-3.5-turbo", 300)
+    assert classify_intent("Can you make me a weekly meal plan?") == "plan"
+    advice = router.route("chatbot", "Why am I always hungry after lunch?")
+    assert (advice.model, advice.max_tokens) == ("gpt-4-turbo-preview", 1000)
+    assert router.route("diet_plan", tier="free").model == "gpt-3.5-turbo"
+    assert router.route("workout_plan").max_tokens == 2000
+    
+    split = ModelRouter(
+        [{"name": "chatbot", "when": {"endpoint": "chatbot"}}],
+        [{"route": "chatbot", "model": "gpt-4o-mini", "fraction": 0.5}],
+    )
+    decisions = [split.route("chatbot", "Lunch?", user_id=user_id) for user_id in range(200)]
+    variants = {decision.variant for decision in decisions}
+    assert variants == {"a", "b"}
+    assert all(split.route("chatbot", "Dinner?", user_id=7).variant == decisions[7].variant for _ in range(5))
+    assert {d.model for d in decisions if d.variant == "b"} == {"gpt-4o-mini"}
+    
+    for decision in decisions[:4]:
+        split.record(decision, 0.5, 100, 50)
+    stats = split.stats()["routes"]["chatbot"]
+    assert sum(entry["calls"] for entry in stats) == 4
+    assert all(entry["avg_latency_ms"] == 500 and entry["avg_completion_tokens"] == 50 for entry in stats)
+
+
+def test_regenerate_meal_patches_plan_and_recomputes_totals():
+    """Test a single meal is regenerated with a small prompt and the totals are recomputed locally."""
+    plan = {
+        "daily_calorie_target": 2000,
+        "weekly_plan": {
+            "monday": [
+                {"meal": "breakfast", "name": "Oats", "calories": 400, "nutrients": {"protein": 15, "carbs": 60, "fats": 8}},
+                {"meal": "lunch", "name": "Pasta", "calories": 700, "nutrients": {"protein": 20, "carbs": 110, "fats": 15}},
+            ],
+            "tuesday": [
+                {"meal": "breakfast", "name": "Eggs", "calories": "350 kcal", "nutrients": {"protein_grams": "24g"}},
+            ],
+        },
+        "workout_plan": {"rest_days": ["sunday"]},
+    }
+    calls = []
+    
+    async def completion(**kwargs):
+        calls.append(kwargs)
+        return _completion(
+            '{"meal": {"name": "Chicken salad", "calories": 550, "nutrients": {"protein": 40, "carbs": 30, "fats": 20}}}'
+        )
+    
+    async def scenario():
+        service = OpenAIService()
+        patched = await service.regenerate_meal(plan, {"age": 30}, "Monday", "lunch")
+        try:
+            await service.regenerate_meal(plan, {"age": 30}, "monday", "dinner")
+        except PlanEditError as e:
+            return patched, str(e)
+    
+    with patch('fastapi_ai.services.openai_service.client') as mock_client:
+        mock_client.chat.completions.create = completion
+        patched, error = asyncio.run(scenario())
+    
+    assert len(calls) == 1 and calls[0]["max_tokens"] == 250
+    assert sum(len(m["content"]) for m in calls[0]["messages"]) < 800
+    assert patched["weekly_plan"]["monday"][1] == {
+        "meal": "lunch", "name": "Chicken salad", "calories": 550,
+        "nutrients": {"protein": 40, "carbs": 30, "fats": 20},
+    }
+    assert patched["weekly_plan"]["tuesday"] == plan["weekly_plan"]["tuesday"]
+    assert patched["workout_plan"] == plan["workout_plan"]
+    assert patched["daily_totals"]["monday"] == {"calories": 950.0, "protein": 55.0, "carbs": 90.0, "fats": 28.0}
+    assert patched["daily_totals"]["tuesday"]["protein"] == 24.0
+    assert "daily_totals" not in plan
+    assert error == "No dinner on monday"
+
+
+def test_meal_planner_hits_targets_deterministically():
+    """Test the local planner meets the calorie target every day, varies meals and repeats exactly."""
+    from fastapi_ai.services.food_db import load_default
+    
+    profile = {"age": 30, "gender": "male", "height": 175, "weight": 80, "goals": {"weight_loss": True}}
+    targets = nutrition_targets(profile)
+    # Mifflin-St Jeor: 10*80 + 6.25*175 - 5*30 + 5 = 1749; x1.375 light activity, -500 for weight loss
+    assert (targets.bmr, targets.tdee, targets.calories) == (1749, 2405, 1905)
+    
+    planner = MealPlanner(load_default())
+    started = time.perf_counter()
+    plan = planner.plan(profile)
+    elapsed = time.perf_counter() - started
+    
+    assert plan["within_tolerance"]
+    for totals in plan["daily_totals"].values():
+        assert abs(totals["calories"] - targets.calories) <= 0.1 * targets.calories
+        assert abs(totals["protein"] - targets.protein) <= 0.15 * targets.protein
+    assert len(plan["weekly_plan"]) == 7 and len(plan["weekly_plan"]["monday"]) == 5
+    assert plan["weekly_plan"]["monday"][1]["name"] != plan["weekly_plan"]["tuesday"][1]["name"]
+    assert planner.plan(profile) == plan
+    assert elapsed < 1.0
+
+
+def test_meal_planner_limits_combinations_on_large_food_databases():
+    """Test a food database the size of an FDC import is cut down before enumerating combinations."""
+    import random
+    
+    rng = random.Random(0)
+    categories = ["protein", "legume", "grain", "vegetable", "fruit", "dairy", "nut_seed"]
+    food_db = FoodCompositionDB([
+        FoodRecord(f"Food {i}", categories[i % len(categories)], rng.uniform(20, 500),
+                   rng.uniform(0, 30), rng.uniform(0, 70), rng.uniform(0, 30), rng.uniform(0, 10), 0)
+        for i in range(8000)
+    ])
+    
+    started = time.perf_counter()
+    planner = MealPlanner(food_db, pool_size=30, max_combos=20000)
+    plan = planner.plan({"age": 30, "weight": 70})
+    
+    assert time.perf_counter() - started < 5.0
+    assert all(len(indices) <= 30 for indices in planner._by_category.values())
+    assert all(len(candidates.combos) <= 20000 for candidates in planner._candidates.values())
+    # The densest proteins are kept
+    proteins = sorted((r for r in food_db.records if r.category == "protein"),
+                      key=lambda r: -(r.protein + r.fiber) / r.calories)
+    assert {planner.foods[i] for i in planner._by_category["protein"]} == set(proteins[:30])
+    assert len(plan["weekly_plan"]) == 7